@@ -0,0 +1,150 @@
+"""
+Timing harness for the benchmark suite.
+
+Every case is run a fixed number of times and summarized by its median wall
+time. Results are written as JSON so that revisions can be compared with
+compare_results.
+"""
+import json
+import platform
+import subprocess
+from statistics import median
+from time import perf_counter, strftime
+
+import numpy as np
+
+
+class BenchmarkResult:
+    def __init__(self, name, group, params, times, pairs=None, value=None, reference=None, closed_form=None):
+        self.name = name
+        self.group = group
+        self.params = params
+        self.times = times
+        self.pairs = pairs
+        self.value = value
+        self.reference = reference
+        self.closed_form = closed_form # exact value, when the reference is itself computed
+
+    @property
+    def median(self):
+        return median(self.times)
+
+    @property
+    def pairs_per_second(self):
+        if self.pairs is None:
+            return None
+        return self.pairs / self.median
+
+    @property
+    def error(self):
+        if self.value is None or self.reference is None:
+            return None
+        return abs(self.value - self.reference)
+
+    @property
+    def closed_form_error(self):
+        if self.value is None or self.closed_form is None:
+            return None
+        return abs(self.value - self.closed_form)
+
+    def to_dict(self):
+        return {
+            "name" : self.name,
+            "group" : self.group,
+            "params" : self.params,
+            "repeat" : len(self.times),
+            "times_s" : self.times,
+            "median_s" : self.median,
+            "min_s" : min(self.times),
+            "pairs" : self.pairs,
+            "pairs_per_s" : self.pairs_per_second,
+            "value" : self.value,
+            "reference" : self.reference,
+            "abs_error" : self.error,
+            "closed_form" : self.closed_form,
+            "closed_form_error" : self.closed_form_error,
+        }
+
+    def __str__(self):
+        line = f"{self.name:<48} {self.median:>11.6f} s"
+        if self.pairs_per_second is not None:
+            line += f" {self.pairs_per_second:>12.1f} pairs/s"
+        if self.error is not None:
+            line += f"  err {self.error:.3e}"
+        if self.closed_form_error is not None:
+            line += f"  exact err {self.closed_form_error:.3e}"
+        return line
+
+
+def time_case(func, repeat, warmup=1):
+    """
+    Args:
+        func (callable): Runs the case once and returns its value (or None).
+        repeat (int): Number of timed runs.
+        warmup (int): Number of untimed runs made first.
+
+    Returns:
+        (list, object): The wall time of every run and the last value returned.
+    """
+    value = None
+    for _ in range(warmup):
+        value = func()
+
+    times = []
+    for _ in range(repeat):
+        begin = perf_counter()
+        value = func()
+        times.append(perf_counter() - begin)
+    return times, value
+
+
+def git_revision():
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import scipy
+    return {
+        "timestamp" : strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision" : git_revision(),
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+        "scipy" : scipy.__version__,
+        "machine" : platform.machine(),
+        "processor" : platform.processor(),
+    }
+
+
+def write_results(path, results):
+    document = {
+        "environment" : environment(),
+        "results" : [result.to_dict() for result in results],
+    }
+    with open(path, "w") as json_file:
+        json.dump(document, json_file, indent=2)
+
+
+def load_results(path):
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def compare_results(baseline, current):
+    """
+    Returns:
+        list: (name, baseline median, current median, speedup) of the cases
+            present in both documents.
+    """
+    baseline_medians = {result["name"] : result["median_s"] for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        name = result["name"]
+        if name in baseline_medians:
+            before = baseline_medians[name]
+            after = result["median_s"]
+            rows.append((name, before, after, before / after))
+    return rows
@@ -0,0 +1,339 @@
+"""
+Benchmark suite for the view factor kernels, quadrature construction, Problem
+assembly, Gebhart solves and the error of the reduced precision policies.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json --output new.json
+
+Supersedes the old tritri.py, triquad.py and quadquad.py timing scripts, whose
+geometries are reproduced by the pair kernel cases below.
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from harness import BenchmarkResult, time_case, write_results, load_results, compare_results
+from thermal_radiation.gebhart import ThermalNetwork
+from thermal_radiation.geometry import (
+    Quadrilateral, Triangle, adaptive_triangle_view_factor, get_fixed_element_view_factor,
+    get_fixed_triangle_view_factor
+)
+from thermal_radiation.assembly import PairKernel
+from thermal_radiation.hemicube import HemicubeEngine
+from thermal_radiation.instrumentation import instrument
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.precision import DOUBLE, MIXED, SINGLE
+from thermal_radiation.problem_domain import Problem, Surface, TriangleElement
+from thermal_radiation.quadrature_1d import GaussLegendre1D
+from thermal_radiation.quadrature_2d import (
+    QuadrilateralGaussLegendre2D, TriangleSymmetricalGauss2D, TriangleTensorProductGaussLegendre2D
+)
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
+
+
+def triangles(vertices):
+    return [Triangle(*corners) for corners in vertices]
+
+
+# Geometries of the old timing scripts -----------------------------------------
+
+def tritri_geometry():
+    """Two unit right triangles, one above the other. No closed form."""
+    lower = Triangle([0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+    upper = Triangle([0.0, 0.0, 1.0], [0.0, 1.0, 1.0], [1.0, 0.0, 1.0])
+    return [lower], [upper], None
+
+
+def triquad_geometry():
+    """A unit right triangle and an offset 2 x 2 square. No closed form."""
+    lower = Triangle([0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+    square = triangles(rectangle_triangles([0.0, 5.0, 1.0], [0.0, 2.0, 0.0], [2.0, 0.0, 0.0], 1, 1))
+    return [lower], square, None
+
+
+def quadquad_geometry():
+    """Two coaxial 2 x 2 squares a unit distance apart."""
+    lower = triangles(rectangle_triangles([0.0, 5.0, 0.0], [2.0, 0.0, 0.0], [0.0, 2.0, 0.0], 1, 1))
+    upper = triangles(rectangle_triangles([0.0, 5.0, 1.0], [0.0, 2.0, 0.0], [2.0, 0.0, 0.0], 1, 1))
+    return lower, upper, two_coaxial_parallel_plates(2.0, 2.0, 1.0)
+
+
+def far_plates_geometry():
+    """
+    Two coaxial unit squares 20 apart, beyond the far field distance of MIXED
+    so that its pairs take the float32 path.
+    """
+    lower = triangles(rectangle_triangles([0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], 1, 1))
+    upper = triangles(rectangle_triangles([0.0, 0.0, 20.0], [0.0, 1.0, 0.0], [1.0, 0.0, 0.0], 1, 1))
+    return lower, upper, two_coaxial_parallel_plates(1.0, 1.0, 20.0)
+
+
+def surface_view_factor(view_factor_function, from_triangles, to_triangles):
+    """
+    The area weighted view factor from one group of triangles to another, one
+    pair kernel call per triangle pair.
+    """
+    from_area = sum(triangle.area for triangle in from_triangles)
+    total = 0.0
+    for from_triangle in from_triangles:
+        for to_triangle in to_triangles:
+            total += from_triangle.area * view_factor_function(from_triangle, to_triangle)
+    return total / from_area
+
+
+def pair_kernel_cases(quick):
+    tensor_order = 10 if quick else 30
+    symmetric_order = 13
+    engines = [
+        ("adaptive", lambda x, y: adaptive_triangle_view_factor(x, y, epsabs=1.0e-16, epsrel=1.0e-10, limit=1000)),
+        (f"tensor{tensor_order}", get_fixed_triangle_view_factor(TriangleTensorProductGaussLegendre2D(tensor_order, tensor_order))),
+        (f"symmetric{symmetric_order}", get_fixed_triangle_view_factor(TriangleSymmetricalGauss2D(symmetric_order))),
+    ]
+    geometries = [
+        ("tritri", tritri_geometry),
+        ("triquad", triquad_geometry),
+        ("quadquad", quadquad_geometry),
+    ]
+
+    for geometry_name, geometry in geometries:
+        from_triangles, to_triangles, reference = geometry()
+        for engine_name, view_factor_function in engines:
+            if quick and engine_name == "adaptive" and geometry_name != "tritri":
+                continue
+            yield {
+                "name" : f"pair/{geometry_name}/{engine_name}",
+                "group" : "pair",
+                "params" : {"geometry" : geometry_name, "engine" : engine_name},
+                "func" : lambda f=view_factor_function, a=from_triangles, b=to_triangles: surface_view_factor(f, a, b),
+                "pairs" : len(from_triangles) * len(to_triangles),
+                "reference" : reference,
+                "repeat" : 1 if engine_name == "adaptive" else None,
+            }
+
+    # the quadquad squares as native quadrilaterals, one pair instead of four
+    lower = Quadrilateral([0.0, 5.0, 0.0], [2.0, 5.0, 0.0], [2.0, 7.0, 0.0], [0.0, 7.0, 0.0])
+    upper = Quadrilateral([0.0, 5.0, 1.0], [0.0, 7.0, 1.0], [2.0, 7.0, 1.0], [2.0, 5.0, 1.0])
+    for order in (6, 10):
+        quad_rule = QuadrilateralGaussLegendre2D(order, order)
+        yield {
+            "name" : f"pair/quadquad/native{order}",
+            "group" : "pair",
+            "params" : {"geometry" : "quadquad", "engine" : f"native{order}"},
+            "func" : lambda f=get_fixed_element_view_factor(quad_rule, quad_rule): f(lower, upper),
+            "pairs" : 1,
+            "reference" : two_coaxial_parallel_plates(2.0, 2.0, 1.0),
+            "repeat" : None,
+        }
+
+
+def quadrature_cases(quick):
+    for order in (5, 20) if quick else (5, 20, 40):
+        yield {
+            "name" : f"quadrature/gauss_legendre_1d/{order}",
+            "group" : "quadrature",
+            "params" : {"rule" : "GaussLegendre1D", "order" : order},
+            "func" : lambda order=order: GaussLegendre1D(order),
+        }
+        yield {
+            "name" : f"quadrature/tensor/{order}",
+            "group" : "quadrature",
+            "params" : {"rule" : "TriangleTensorProductGaussLegendre2D", "order" : order},
+            "func" : lambda order=order: TriangleTensorProductGaussLegendre2D(order, order),
+        }
+    yield {
+        "name" : "quadrature/symmetric/13",
+        "group" : "quadrature",
+        "params" : {"rule" : "TriangleSymmetricalGauss2D", "order" : 13},
+        "func" : lambda: TriangleSymmetricalGauss2D(13),
+    }
+
+
+def coaxial_plates_problem(n_div, quadrature, side=1.0, distance=1.0):
+    lower = Surface("lower")
+    for corners in rectangle_triangles([0.0, 0.0, 0.0], [side, 0.0, 0.0], [0.0, side, 0.0], n_div, n_div):
+        lower.add_element(TriangleElement(*corners, quadrature))
+    upper = Surface("upper")
+    for corners in rectangle_triangles([0.0, 0.0, distance], [0.0, side, 0.0], [side, 0.0, 0.0], n_div, n_div):
+        upper.add_element(TriangleElement(*corners, quadrature))
+    return Problem([lower, upper])
+
+
+def assembled_plate_view_factor(n_div, quadrature):
+    problem = coaxial_plates_problem(n_div, quadrature)
+    problem.aggregate_elements()
+    problem.calculate_view_factors()
+
+    lower_elements = problem.surfaces[0].elements
+    upper_elements = set(problem.surfaces[1].elements)
+    total = 0.0
+    for element in lower_elements:
+        for to_element, view_factor in element.view_factors.items():
+            if to_element in upper_elements:
+                total += element.area * view_factor
+    return total / sum(element.area for element in lower_elements)
+
+
+def assembly_cases(quick):
+    quadrature = TriangleSymmetricalGauss2D(4)
+    reference = two_coaxial_parallel_plates(1.0, 1.0, 1.0)
+    for n_div in (1, 2) if quick else (1, 2, 4):
+        n = 4 * n_div * n_div
+        yield {
+            "name" : f"assembly/coaxial_plates/{n}",
+            "group" : "assembly",
+            "params" : {"elements" : n, "quadrature" : "symmetric4"},
+            "func" : lambda n_div=n_div: assembled_plate_view_factor(n_div, quadrature),
+            "pairs" : n * (n - 1) // 2,
+            "reference" : reference,
+        }
+
+
+def uniform_enclosure(n_surfaces, eps=0.5):
+    """Identical surfaces which all see each other equally."""
+    tn = ThermalNetwork()
+    for i in range(n_surfaces):
+        tn.add_surface(f"surf{i}", 1.0, eps)
+    view_factor = 1.0 / (n_surfaces - 1)
+    for i in range(n_surfaces):
+        for j in range(i + 1, n_surfaces):
+            tn.add_rad_connections(f"surf{i}", f"surf{j}", ff12=view_factor)
+    return tn
+
+
+def gebhart_solve(tn):
+    """Returns the worst deviation from unity of the grey body factor row sums."""
+    gbf_map = tn.get_grey_body_factors()
+    return max(abs(1.0 - sum(factors.values())) for factors in gbf_map.values())
+
+
+def gebhart_cases(quick):
+    for n_surfaces in (5, 20) if quick else (5, 20, 40):
+        tn = uniform_enclosure(n_surfaces)
+        yield {
+            "name" : f"gebhart/uniform_enclosure/{n_surfaces}",
+            "group" : "gebhart",
+            "params" : {"surfaces" : n_surfaces},
+            "func" : lambda tn=tn: gebhart_solve(tn),
+            "pairs" : n_surfaces * n_surfaces,
+            "reference" : 0.0,
+        }
+
+
+def vectorized_view_factor(from_triangles, to_triangles, quadrature, precision):
+    """
+    The area weighted view factor between two groups of triangles with the
+    vectorized pair kernel.
+    """
+    mesh = TriangleMesh.from_triangles(from_triangles + to_triangles)
+    n_from = len(from_triangles)
+    rows, cols = np.meshgrid(np.arange(n_from), np.arange(n_from, len(mesh)), indexing="ij")
+    view_factors = PairKernel(mesh, quadrature, precision)(rows.ravel(), cols.ravel())
+    from_areas = mesh.areas[rows.ravel()]
+    return float(from_areas @ view_factors / mesh.areas[:n_from].sum())
+
+
+def hemicube_plate_view_factor(mesh, n_from, resolution, precision):
+    view_factors = HemicubeEngine(mesh, resolution, precision).compute(rows=np.arange(n_from))
+    row_sums = np.asarray(view_factors[:n_from, n_from:].sum(axis=1)).ravel()
+    return float(mesh.areas[:n_from] @ row_sums / mesh.areas[:n_from].sum())
+
+
+def precision_cases(quick):
+    """
+    Every precision policy against float64 on the old script geometries. The
+    value's reference is the float64 result; the closed form, where there is
+    one, gives the closed_form_error as well.
+    """
+    quadrature = TriangleSymmetricalGauss2D(13)
+    geometries = [
+        ("tritri", tritri_geometry),
+        ("triquad", triquad_geometry),
+        ("quadquad", quadquad_geometry),
+        ("far_plates", far_plates_geometry),
+    ]
+    for geometry_name, geometry in geometries:
+        from_triangles, to_triangles, closed_form = geometry()
+        reference = vectorized_view_factor(from_triangles, to_triangles, quadrature, DOUBLE)
+        if geometry_name == "far_plates":
+            with instrument() as report:
+                vectorized_view_factor(from_triangles, to_triangles, quadrature, MIXED)
+            assert report.counters.get("pairs/far_field", 0) > 0, "far_plates does not exercise the far field"
+        for policy in (DOUBLE, MIXED, SINGLE):
+            yield {
+                "name" : f"precision/{geometry_name}/symmetric13/{policy}",
+                "group" : "precision",
+                "params" : {"geometry" : geometry_name, "engine" : "symmetric13", "precision" : str(policy)},
+                "func" : lambda a=from_triangles, b=to_triangles, p=policy: vectorized_view_factor(a, b, quadrature, p),
+                "pairs" : len(from_triangles) * len(to_triangles),
+                "reference" : reference,
+                "closed_form" : closed_form,
+            }
+
+    n_div = 4 if quick else 8
+    lower = rectangle_triangles([0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], n_div, n_div)
+    upper = rectangle_triangles([0.0, 0.0, 1.0], [0.0, 1.0, 0.0], [1.0, 0.0, 0.0], n_div, n_div)
+    mesh = TriangleMesh(np.concatenate((lower, upper)))
+    resolution = 64
+    reference = hemicube_plate_view_factor(mesh, len(lower), resolution, DOUBLE)
+    for policy in (DOUBLE, SINGLE):
+        yield {
+            "name" : f"precision/coaxial_plates/hemicube{resolution}/{policy}",
+            "group" : "precision",
+            "params" : {"geometry" : "coaxial_plates", "engine" : f"hemicube{resolution}", "precision" : str(policy)},
+            "func" : lambda p=policy: hemicube_plate_view_factor(mesh, len(lower), resolution, p),
+            "pairs" : len(lower) * len(mesh),
+            "reference" : reference,
+            "closed_form" : two_coaxial_parallel_plates(1.0, 1.0, 1.0),
+        }
+
+
+CASE_GENERATORS = [pair_kernel_cases, quadrature_cases, assembly_cases, gebhart_cases, precision_cases]
+
+
+def run(repeat, quick=False, selected=None, loud=True):
+    results = []
+    for generator in CASE_GENERATORS:
+        for case in generator(quick):
+            if selected and not any(pattern in case["name"] for pattern in selected):
+                continue
+            times, value = time_case(case["func"], case.get("repeat") or repeat)
+            result = BenchmarkResult(
+                case["name"], case["group"], case["params"], times,
+                pairs=case.get("pairs"),
+                value=value if isinstance(value, float) else None,
+                reference=case.get("reference"),
+                closed_form=case.get("closed_form"))
+            if loud:
+                print(result, flush=True)
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--quick", action="store_true", help="smaller problem sizes")
+    parser.add_argument("--select", action="append", help="only run cases whose name contains this")
+    args = parser.parse_args()
+
+    results = run(args.repeat, quick=args.quick, selected=args.select)
+
+    if args.output:
+        write_results(args.output, results)
+
+    if args.compare:
+        current = {"results" : [result.to_dict() for result in results]}
+        print()
+        print(f"{'case':<48} {'before':>11} {'after':>11} {'speedup':>8}")
+        for name, before, after, speedup in compare_results(load_results(args.compare), current):
+            print(f"{name:<48} {before:>11.6f} {after:>11.6f} {speedup:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
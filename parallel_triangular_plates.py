@@ -1,58 +1,62 @@
-import pickle
+import argparse
 import numpy as np
-from time import time
 from math import tan, radians
-from thermal_radiation.quadrature_2d import TriangleTensorProductGaussLegendre2D, TriangleSymmetricalGauss2D
-from thermal_radiation.geometry import Triangle, get_fixed_triangle_view_factor
-
-tensor_quad = TriangleTensorProductGaussLegendre2D(20, 20)
-tensor_triangle_view_factor = get_fixed_triangle_view_factor(tensor_quad)
-
-def apprx_parallel_directly_opposed_triangles(normalized_distance, theta, use_adaptive=False):
+from thermal_radiation.assembly import PairKernel, reference_points
+from thermal_radiation.mesh import TriangleMesh
+from thermal_radiation.quadrature_2d import TriangleTensorProductGaussLegendre2D
+from thermal_radiation.sweep import run_sweep
+
+tensor_order = 20
+tensor_rule = reference_points(TriangleTensorProductGaussLegendre2D(tensor_order, tensor_order))
+
+def apprx_parallel_directly_opposed_triangles(normalized_distance, theta, aspect_ratio=1.0):
+    """
+    View factor between two directly opposed right triangles with a unit base
+    and an angle of theta degrees. aspect_ratio scales the second triangle.
+    """
     base = 1.0
     distance = base * normalized_distance
     height = tan(radians(theta)) * base
 
-    triangle1 = Triangle(
-        [0.0,  0.0, 0.0   ], # a
-        [0.0,  0.0, height], # b
-        [base, 0.0, 0.0   ]  # c
-    )
-
-    triangle2 = Triangle(
-        [0.0,  distance, 0.0   ], # a
-        [base, distance, 0.0   ], # b
-        [0.0,  distance, height]  # c
-    )
-
-    if use_adaptive:
-        return adaptive_triangle_view_factor(triangle1, triangle2)
-    else:
-        return tensor_triangle_view_factor(triangle1, triangle2)
-
-
-def pickle_data(file_name, data):
-    with open(file_name, mode="wb") as pckl_file:
-        pickle.dump(data, pckl_file)
-
-relative_distaces = np.linspace(0.1, 10.0, 50)
-angle = 45.0
-
-rds = []
-times = []
-angle_view_factors = []
-for relative_distace in relative_distaces:
-    print(angle, relative_distace, end=" : \n")
-    begin = time()
-    view_factor = apprx_parallel_directly_opposed_triangles(relative_distace, angle)
-    angle_view_factors.append(view_factor)
-    end = time()
-    total = end - begin
-    times.append(total)
-    rds.append(relative_distace)
-    print(f"\t{view_factor:.10f} {total:.3f}")
-
-angle_posfix = f"{angle:2.0f}.pkl"
-pickle_data("view_factors_" + angle_posfix, angle_view_factors)
-pickle_data("times_" + angle_posfix, times)
-pickle_data("relative_dists_" + angle_posfix, rds)
+    mesh = TriangleMesh([
+        [
+            [0.0,  0.0, 0.0   ], # a
+            [0.0,  0.0, height], # b
+            [base, 0.0, 0.0   ]  # c
+        ],
+        [
+            [0.0,                 distance, 0.0                  ], # a
+            [aspect_ratio * base, distance, 0.0                  ], # b
+            [0.0,                 distance, aspect_ratio * height]  # c
+        ],
+    ])
+    return PairKernel(mesh, tensor_rule)([0], [1])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="View factor sweep of directly opposed triangles.")
+    parser.add_argument("--output", default="triangular_plates.npz")
+    parser.add_argument("--checkpoint", default="triangular_plates.jsonl")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--angles", type=float, nargs="+", default=[15.0, 30.0, 45.0, 60.0, 75.0])
+    parser.add_argument("--aspect-ratios", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--n-distances", type=int, default=50)
+    args = parser.parse_args()
+
+    axes = {
+        "theta" : args.angles,
+        "aspect_ratio" : args.aspect_ratios,
+        "normalized_distance" : np.linspace(0.1, 10.0, args.n_distances),
+    }
+    metadata = {"engine" : "fixed", "quadrature" : "TriangleTensorProductGaussLegendre2D", "order" : tensor_order}
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", flush=True)
+
+    run_sweep(apprx_parallel_directly_opposed_triangles, axes, args.output, jobs=args.jobs,
+              checkpoint=args.checkpoint, metadata=metadata, progress=progress)
+    print()
+
+
+if __name__ == '__main__':
+    main()
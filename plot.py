@@ -1,16 +1,14 @@
-import pickle
+import numpy as np
 import matplotlib.pyplot as plt
 
-def unpickle_data(file_name):
-    with open(file_name, mode="rb") as pckl_file:
-        return pickle.load(pckl_file)
-
-angles = [15.0, 30.0, 45.0, 60.0, 75.0]
+results = np.load("triangular_plates.npz")
+angles = np.unique(results["theta"])
 
 for angle in angles:
-    relative_dists = unpickle_data(f"relative_dists_{angle:.0f}.pkl")
-    times = unpickle_data(f"times_{angle:.0f}.pkl")
-    view_factors = unpickle_data(f"view_factors_{angle:.0f}.pkl")
+    selected = (results["theta"] == angle) & (results["aspect_ratio"] == 1.0)
+    order = np.argsort(results["normalized_distance"][selected])
+    relative_dists = results["normalized_distance"][selected][order]
+    view_factors = results["value"][selected][order]
     plt.plot(relative_dists, view_factors, label=f"${angle:.0f}^o$")
 
 plt.legend()
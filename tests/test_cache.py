@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.cache`."""
+
+import os
+import numpy as np
+
+from thermal_radiation.cache import ViewFactorCache, hash_key
+from thermal_radiation.problem_domain import Problem, Surface, TriangleElement
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+
+
+def make_problem(quadrature, cache):
+    bottom = Surface()
+    bottom.add_element(TriangleElement([0., 0., 0.], [1., 0., 0.], [0., 1., 0.], quadrature))
+    top = Surface()
+    top.add_element(TriangleElement([0., 0., 1.], [0., 1., 1.], [1., 0., 1.], quadrature))
+    problem = Problem([bottom, top], cache=cache)
+    problem.aggregate_elements()
+    return problem
+
+
+def test_round_trip_is_memory_mapped(tmpdir):
+    cache = ViewFactorCache(str(tmpdir))
+    key = hash_key(np.zeros((1, 3, 3)), [None])
+    assert cache.get(key) is None
+
+    cache.put(key, np.arange(4.0))
+    loaded = cache.get(key)
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, np.arange(4.0))
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith(".tmp")]
+
+
+def test_key_depends_on_quadrature():
+    vertices = np.random.rand(2, 3, 3)
+    key1 = hash_key(vertices, [TriangleSymmetricalGauss2D(2)])
+    key2 = hash_key(vertices, [TriangleSymmetricalGauss2D(5)])
+    assert key1 != key2
+    assert key1 == hash_key(vertices.copy(), [TriangleSymmetricalGauss2D(2)])
+
+
+def test_eviction_keeps_newest(tmpdir):
+    cache = ViewFactorCache(str(tmpdir), max_bytes=3000)
+    keys = [hash_key(np.full((1, 3, 3), i), [None]) for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, np.zeros(100))
+        os.utime(cache.path(key), (i, i))
+    cache.evict()
+    assert cache.size() <= 3000
+    assert keys[-1] in cache
+    assert keys[0] not in cache
+
+
+def test_put_scans_only_when_over_the_limit(tmpdir, monkeypatch):
+    cache = ViewFactorCache(str(tmpdir), max_bytes=3000)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+    keys = [hash_key(np.full((1, 3, 3), i), [None]) for i in range(5)]
+    for key in keys[:3]:
+        cache.put(key, np.zeros(100))
+    cache.put(keys[0], np.zeros(100)) # overwrites, the size is unchanged
+    assert len(scans) == 1 and cache.tracked_bytes == cache.size()
+
+    for i, key in enumerate(keys):
+        cache.put(key, np.zeros(100))
+        os.utime(cache.path(key), (i, i))
+    assert cache.size() <= 3000 and keys[-1] in cache
+    assert cache.tracked_bytes == cache.size()
+
+
+def test_problem_reuses_cached_matrix(tmpdir):
+    quadrature = TriangleSymmetricalGauss2D(4)
+    cache = ViewFactorCache(str(tmpdir))
+
+    first = make_problem(quadrature, cache)
+    first.calculate_view_factors()
+    expected = first.get_view_factor_matrix()
+    assert expected[0, 1] > 0.0
+
+    second = make_problem(quadrature, cache)
+    second.calculate_view_factor = None # a cache hit must not integrate
+    second.calculate_view_factors()
+    assert np.allclose(second.get_view_factor_matrix(), expected)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.correction`."""
+
+import numpy as np
+from scipy import sparse
+
+from thermal_radiation.correction import (
+    closure_residual, enforce_reciprocity_and_closure, reciprocity_residual
+)
+from thermal_radiation.gebhart import ThermalNetwork
+from thermal_radiation.geometry import get_fixed_triangle_view_factor
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+
+
+def unit_cube():
+    """Inward facing faces of the unit cube, two triangles per face."""
+    faces = [
+        ([0, 0, 0], [0, 1, 0], [1, 0, 0]),
+        ([0, 0, 1], [1, 0, 0], [0, 1, 0]),
+        ([0, 0, 0], [1, 0, 0], [0, 0, 1]),
+        ([0, 1, 0], [0, 0, 1], [1, 0, 0]),
+        ([0, 0, 0], [0, 0, 1], [0, 1, 0]),
+        ([1, 0, 0], [0, 1, 0], [0, 0, 1]),
+    ]
+    return TriangleMesh(np.concatenate([rectangle_triangles(*face, 1, 1) for face in faces]))
+
+
+def low_order_view_factors(mesh):
+    view_factor = get_fixed_triangle_view_factor(TriangleSymmetricalGauss2D(2))
+    n = len(mesh)
+    view_factors = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                view_factors[i, j] = view_factor(mesh[i], mesh[j])
+    return view_factors
+
+
+def test_corrects_low_order_cube():
+    mesh = unit_cube()
+    view_factors = low_order_view_factors(mesh)
+    assert np.abs(closure_residual(view_factors)).max() > 1.0E-3
+
+    corrected = enforce_reciprocity_and_closure(view_factors, mesh.areas)
+    assert np.abs(closure_residual(corrected)).max() < 1.0E-10
+    assert reciprocity_residual(corrected, mesh.areas) < 1.0E-12
+    assert np.all(corrected[view_factors == 0.0] == 0.0)
+    assert np.abs(corrected - view_factors).max() < 0.5 * np.abs(view_factors).max()
+
+    corrected_sparse = enforce_reciprocity_and_closure(sparse.csr_matrix(view_factors), mesh.areas)
+    assert sparse.issparse(corrected_sparse)
+    assert np.allclose(corrected_sparse.toarray(), corrected)
+
+
+def test_thermal_network_correction():
+    tn = ThermalNetwork()
+    tn.add_surface("surf1", 1.0, 0.5)
+    tn.add_surface("surf2", 1.0, 0.5)
+    tn.add_surface("surf3", 1.0, 0.5)
+    tn.add_rad_connections("surf1", "surf2", ff12=0.48)
+    tn.add_rad_connections("surf1", "surf3", ff12=0.5)
+    tn.add_rad_connections("surf2", "surf3", ff12=0.52)
+
+    tn.enforce_reciprocity_and_closure()
+    for sum_ in tn.get_view_factors_sums().values():
+        assert np.isclose(sum_, 1.0)
+    assert np.isclose(tn.get_view_factor("surf2", "surf3"), 0.5)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.error_estimates`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.assembly import assemble_view_factor_matrix, upper_triangle_block
+from thermal_radiation.error_estimates import (EscalatingKernel, TENSOR_LADDER, assemble_with_error_estimates,
+                                               get_estimated_triangle_view_factor)
+from thermal_radiation.geometry import Triangle
+from thermal_radiation.instrumentation import instrument
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.quadrature_2d import get_quadrature
+
+
+def make_mesh(distance):
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 3, 3)
+    upper = rectangle_triangles([0, 0, distance], [0, 1, 0], [1, 0, 0], 3, 3)
+    return TriangleMesh(np.concatenate((lower, upper)))
+
+
+@pytest.mark.parametrize("atol", [1.0E-3, 1.0E-6])
+def test_global_bound(atol):
+    mesh = make_mesh(0.3)
+    reference = assemble_view_factor_matrix(mesh, get_quadrature("tensor:14"))
+    with instrument() as report:
+        view_factors, errors, bound = assemble_with_error_estimates(mesh, atol=atol)
+
+    np.testing.assert_allclose(errors * mesh.areas[:, np.newaxis], (errors * mesh.areas[:, np.newaxis]).T)
+    assert np.abs(view_factors - reference).sum(axis=1).max() <= bound
+    assert bound <= 36 * max(atol, errors.max())
+
+    # only the pairs that need it are escalated past the third rung
+    n_pairs = len(mesh) * (len(mesh) - 1) // 2
+    evaluations = report.counters["integrand_evaluations/vectorized"]
+    assert evaluations < n_pairs * len(get_quadrature("symmetric:13").weights) ** 2
+
+
+def test_escalation():
+    mesh = make_mesh(0.3)
+    rows, cols = upper_triangle_block(len(mesh), 0, len(mesh))
+    estimated = EscalatingKernel(mesh, atol=1.0E-6)(rows, cols)
+    assert np.all(estimated.converged)
+    assert np.all(estimated.rungs >= 2)
+
+    # elements facing each other closely need higher rules than distant ones
+    separation = np.linalg.norm(mesh.centroids[rows] - mesh.centroids[cols], axis=1)
+    near, far = separation < 0.4, separation > 1.0
+    assert estimated.rungs[near].mean() > estimated.rungs[far].mean()
+
+    coarse = EscalatingKernel(mesh, TENSOR_LADDER[:3], atol=1.0E-12)(rows, cols)
+    assert not np.all(coarse.converged)
+    assert np.all(coarse.rungs == 2)
+
+
+def test_triangle_view_factor():
+    view_factor = get_estimated_triangle_view_factor(atol=1.0E-7)
+    from_triangle = Triangle([0, 0, 0], [1, 0, 0], [0, 1, 0])
+    to_triangle = Triangle([0, 0, 1], [0, 1, 1], [1, 0, 1])
+    value, error = view_factor(from_triangle, to_triangle)
+    reference = assemble_view_factor_matrix(TriangleMesh.from_triangles([from_triangle, to_triangle]),
+                                            get_quadrature("tensor:14"))[0, 1]
+    assert error <= 1.0E-7
+    assert abs(value - reference) <= error
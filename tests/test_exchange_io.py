@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.exchange_io`."""
+
+import os
+import pytest
+import numpy as np
+
+from thermal_radiation.exchange_io import (
+    ExchangeFormatError, ExchangeWriter, export_grey_body_factors, export_radks, read_exchange_matrix,
+    write_exchange_matrix
+)
+from thermal_radiation.gebhart import ThermalNetwork
+
+
+def make_network(n=9, seed=3):
+    rng = np.random.default_rng(seed)
+    exchange = rng.random((n, n))
+    exchange = exchange + exchange.T # A_i F_ij, symmetric
+    view_factors = exchange / exchange.sum(axis=1)[:, np.newaxis] # closed enclosure, rows sum to 1
+    areas = exchange.sum(axis=1)
+    names = [f"surface{i}" for i in range(n)]
+    tn = ThermalNetwork()
+    tn.add_surfaces(names, areas, rng.uniform(0.1, 0.9, n))
+    tn.add_view_factor_matrix(names, view_factors)
+    return tn
+
+
+def test_round_trip(tmpdir):
+    rng = np.random.default_rng(0)
+    matrix = rng.random((11, 11))
+    matrix[matrix < 0.6] = 0.0
+    names = [f"s{i}" for i in range(11)]
+    path = str(tmpdir.join("matrix.bin"))
+    write_exchange_matrix(path, names, matrix, kind="test", threshold=0.7, block_rows=4)
+
+    loaded = read_exchange_matrix(path)
+    assert loaded.names == names and loaded.kind == "test" and not loaded.upper
+    expected = np.where(matrix > 0.7, matrix, 0.0)
+    np.testing.assert_array_equal(loaded.to_sparse().toarray(), expected)
+    # the arrays are read-only views of the file, not copies
+    assert not loaded.matrix.data.flags.writeable and not loaded.matrix.data.flags.owndata
+    assert loaded.get("s3", "s4") == expected[3, 4]
+    np.testing.assert_array_equal(read_exchange_matrix(path, mmap=False).matrix.toarray(), expected)
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith(".tmp")]
+
+    with pytest.raises(ValueError):
+        with ExchangeWriter(str(tmpdir.join("short.bin")), names) as writer:
+            writer.write_rows(matrix[:3])
+    assert not os.path.exists(str(tmpdir.join("short.bin")))
+
+    with open(path, "r+b") as corrupt:
+        corrupt.write(b"not csr!")
+    with pytest.raises(ExchangeFormatError):
+        read_exchange_matrix(path)
+
+
+def test_network_exports(tmpdir):
+    tn = make_network()
+    grey_body_factors = tn.get_grey_body_factor_matrix()
+    radks = tn.get_radk_matrix(grey_body_factors)
+
+    path = str(tmpdir.join("gbf.bin"))
+    export_grey_body_factors(tn, path, block_rows=4)
+    loaded = read_exchange_matrix(path)
+    assert loaded.kind == "grey_body_factors" and loaded.names == list(tn.surfaces)
+    np.testing.assert_allclose(loaded.to_sparse().toarray(), grey_body_factors, rtol=1e-12, atol=1e-15)
+
+    path = str(tmpdir.join("radks.bin"))
+    export_radks(tn, path, block_rows=4)
+    loaded = read_exchange_matrix(path)
+    assert loaded.upper
+    n = len(tn.surfaces)
+    assert loaded.matrix.nnz == n * (n + 1) // 2
+    np.testing.assert_allclose(loaded.to_sparse().toarray(), np.triu(radks) + np.triu(radks, 1).T, rtol=1e-12)
+    np.testing.assert_allclose(loaded.row("surface5"), radks[5], rtol=1e-10)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.gebhart`."""
+
+import pytest
+import numpy as np
+from scipy import sparse
+
+from thermal_radiation.gebhart import ThermalNetwork
+
+NAMES = ["a", "b", "c", "d"]
+AREAS = np.array([2.0, 1.0, 2.0, 2.0])
+EPS = np.array([0.5, 0.5, 0.8, 0.3])
+VIEW_FACTORS = np.array([[1/6, 1/6, 1/3, 1/3], [1/3, 0.0, 1/3, 1/3], [1/3, 1/6, 1/6, 1/3], [1/3, 1/6, 1/3, 1/6]])
+
+
+def test_from_arrays_matches_connections(tmpdir):
+    tn = ThermalNetwork()
+    tn.add_surfaces(NAMES, AREAS, EPS)
+    for i, j in zip(*np.triu_indices(4, 1)):
+        tn.add_rad_connections(NAMES[i], NAMES[j], ff12=VIEW_FACTORS[i, j])
+    off_diagonal = VIEW_FACTORS - np.diag(np.diag(VIEW_FACTORS))
+    from_arrays = ThermalNetwork.from_arrays(NAMES, AREAS, EPS, off_diagonal)
+    np.testing.assert_allclose(from_arrays.get_grey_body_factor_matrix(), tn.get_grey_body_factor_matrix())
+
+    dense = ThermalNetwork.from_arrays(NAMES, AREAS, EPS, VIEW_FACTORS, name="dense")
+    expected = dense.get_grey_body_factor_matrix()
+    assert np.allclose(expected.sum(axis=1), 1.0)
+    assert dense.get_view_factor("b", "c") == VIEW_FACTORS[1, 2]
+
+    sparse_network = ThermalNetwork.from_arrays(NAMES, AREAS, EPS, sparse.csr_matrix(VIEW_FACTORS))
+    assert sparse.issparse(sparse_network.view_factor_matrix)
+    np.testing.assert_allclose(sparse_network.get_grey_body_factor_matrix(), expected)
+
+    path = str(tmpdir.join("F.npz"))
+    sparse.save_npz(path, sparse.csr_matrix(VIEW_FACTORS))
+    np.testing.assert_allclose(ThermalNetwork.from_arrays(NAMES, AREAS, EPS, path).get_view_factor_matrix(),
+                               VIEW_FACTORS)
+    path = str(tmpdir.join("results.npz"))
+    np.savez(path, names=np.array(NAMES), view_factors=VIEW_FACTORS)
+    np.testing.assert_allclose(ThermalNetwork.from_arrays(NAMES, AREAS, EPS, path).get_view_factor_matrix(),
+                               VIEW_FACTORS)
+
+
+@pytest.mark.parametrize("as_sparse", [False, True])
+def test_from_arrays_validation(as_sparse):
+    def build(names=NAMES, areas=AREAS, eps=EPS, view_factors=VIEW_FACTORS, **kwargs):
+        view_factors = sparse.csr_matrix(view_factors) if as_sparse else view_factors
+        return ThermalNetwork.from_arrays(names, areas, eps, view_factors, **kwargs)
+
+    with pytest.raises(ValueError, match="more than once"):
+        build(names=["a", "b", "a", "d"])
+    with pytest.raises(ValueError, match="area"):
+        build(areas=[2.0, 0.0, 2.0, 2.0])
+    with pytest.raises(ValueError, match="emissivity"):
+        build(eps=[0.5, 1.5, 0.8, 0.3])
+    with pytest.raises(ValueError, match="4x4"):
+        build(view_factors=VIEW_FACTORS[:3, :3])
+
+    negative = VIEW_FACTORS.copy()
+    negative[2, 0] = -0.1
+    with pytest.raises(ValueError, match="from c to a"):
+        build(view_factors=negative)
+
+    not_reciprocal = VIEW_FACTORS.copy()
+    not_reciprocal[1, 3] = 0.2
+    with pytest.raises(ValueError, match="b and d|d and b"):
+        build(view_factors=not_reciprocal)
+    assert build(view_factors=not_reciprocal, validate=False).get_view_factor("b", "d") == 0.2
+
+    # A F = 1e-12 one way and 0 the other is round-off, not a reciprocity error
+    tiny = np.array([[0.0, 1e-12], [0.0, 0.0]])
+    pair = dict(names=["a", "b"], areas=np.array([1.0, 2.0]), eps=np.array([0.5, 0.5]), view_factors=tiny)
+    assert build(**pair).get_view_factor("a", "b") == 1e-12
+    with pytest.raises(ValueError, match="a and b|b and a"):
+        build(reciprocity_atol=0.0, **pair)
+
+    too_much = VIEW_FACTORS * 1.1
+    with pytest.raises(ValueError, match="sum to"):
+        build(view_factors=too_much)
+
+
+def test_gebhart_reflects_with_the_receiving_surface():
+    # B_ij = F_ij eps_j + sum_k F_ik rho_k B_kj: the reflectivity is that of the surface reflecting
+    tn = ThermalNetwork.from_arrays(NAMES, AREAS, EPS, VIEW_FACTORS)
+    gbf_map = tn.get_grey_body_factors()
+    grey_body_factors = np.array([[gbf_map[i][j] for j in NAMES] for i in NAMES])
+    np.testing.assert_allclose(grey_body_factors, [
+        [0.209530048616, 0.143226562769, 0.480502017033, 0.166741371582],
+        [0.286453125539, 0.066303485846, 0.480502017033, 0.166741371582],
+        [0.300313760645, 0.150156880323, 0.374719856567, 0.174809502465],
+        [0.277902285970, 0.138951142985, 0.466158673241, 0.116987897804]], rtol=1e-10)
+    np.testing.assert_allclose(grey_body_factors.sum(axis=1), 1.0)
+    radks = (EPS * AREAS)[:, np.newaxis] * grey_body_factors
+    np.testing.assert_allclose(radks, radks.T)
+    np.testing.assert_allclose(tn.get_grey_body_factor_matrix(), grey_body_factors)
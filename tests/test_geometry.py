@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.geometry`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.geometry import (DegenerateIntersection, Line, Triangle, get_intersection_point,
+                                        line_intersections, points_in_triangles, ray_plane_intersections,
+                                        ray_triangle_intersections)
+
+
+def test_point_on():
+    triangle = Triangle([0, 0, 0], [1, 0, 0], [0, 1, 0])
+    assert triangle.point_on([0.25, 0.25, 0.0])
+    assert triangle.point_on([0.5, 0.5, 0.0]) # on the hypotenuse
+    assert triangle.point_on([1.0, 0.0, 0.0]) # a vertex
+    assert not triangle.point_on([0.75, 0.75, 0.0])
+    assert not triangle.point_on([-0.1, 0.5, 0.0])
+    assert not triangle.point_on([0.25, 0.25, 0.5])
+    assert triangle.point_on([0.25, 0.25, 0.5], project_first=True)
+    np.testing.assert_allclose(triangle.project_onto([0.3, 2.0, -4.0]), [0.3, 2.0, 0.0])
+
+
+def test_degenerate_intersection():
+    line = Line([0, 0, 1], [1, 0, 0])
+    with pytest.raises(DegenerateIntersection):
+        line.get_intersection_info(Triangle([0, 0, 0], [1, 0, 0], [0, 1, 0]))
+    with pytest.raises(DegenerateIntersection):
+        get_intersection_point(line, Line([0, 1, 1], [2, 0, 0]))
+
+
+def test_batched_predicates():
+    rng = np.random.default_rng(3)
+    n = 2000
+    a, b, c = np.array([0.0, 0.0, 0.0]), np.array([1.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0])
+    origins = rng.uniform(-0.5, 1.5, (n, 3)) + [0.0, 0.0, 1.0]
+    directions = rng.normal(size=(n, 3))
+    directions[0] = [1.0, 0.0, 0.0] # parallel to the plane
+
+    t, valid = ray_plane_intersections(origins, directions, a, np.cross(b - a, c - a))
+    assert not valid[0] and np.isinf(t[0])
+    points = origins + np.where(valid, t, 0.0)[:, np.newaxis] * directions
+    inside = valid & points_in_triangles(points, a, b, c)
+
+    hit_t, hit = ray_triangle_intersections(origins, directions, a, b, c)
+    assert np.array_equal(inside & (t > 0.0), hit)
+    np.testing.assert_allclose(hit_t[hit], t[hit])
+
+    # one triangle per ray agrees with the broadcast triangle
+    per_ray = [np.broadcast_to(vertex, (n, 3)) for vertex in (a, b, c)]
+    assert np.array_equal(ray_triangle_intersections(origins, directions, *per_ray)[1], hit)
+
+    # the scalar intersection agrees with the batched one
+    point, valid = line_intersections(np.array([[0.0, 0.0, 0.0]]), np.array([[1.0, 1.0, 0.0]]),
+                                      np.array([[1.0, 0.0, 0.0]]), np.array([[0.0, 1.0, 0.0]]))
+    expected = get_intersection_point(Line([0, 0, 0], [1, 1, 0]), Line([1, 0, 0], [0, 1, 0]))
+    assert valid[0]
+    np.testing.assert_allclose(point[0], expected)
+
+
+@pytest.mark.parametrize("offset", [[100.0, 0.0, 0.0], [1000.0, -500.0, 250.0]])
+def test_predicates_off_the_origin(offset):
+    rng = np.random.default_rng(5)
+    triangle = Triangle(*(np.array(vertex) + offset for vertex in ([0, 0, 0], [1, 0, 0.2], [0, 1, -0.3])))
+    n = 1000
+    u, v = rng.uniform(0.0, 1.0, (2, n))
+    flip = u + v > 1.0
+    u[flip], v[flip] = 1.0 - u[flip], 1.0 - v[flip]
+    targets = triangle.a + u[:, np.newaxis] * (triangle.b - triangle.a) + v[:, np.newaxis] * (triangle.c - triangle.a)
+    origins = targets + rng.normal(size=(n, 3)) * 3.0 + triangle.normalized_normal * 5.0
+    directions = targets - origins
+
+    for origin, direction in zip(origins[:100], directions[:100]):
+        _, point = Line(origin, direction).get_intersection_info(triangle)
+        assert triangle.point_on(point)
+
+    t, valid = ray_plane_intersections(origins, directions, triangle.a, triangle.normal)
+    points = origins + t[:, np.newaxis] * directions
+    assert valid.all() and points_in_triangles(points, triangle.a, triangle.b, triangle.c).all()
+    assert ray_triangle_intersections(origins, directions, triangle.a, triangle.b, triangle.c)[1].all()
+
+    # still a millionth of the triangle size off the plane is off the triangle
+    assert not triangle.point_on(triangle.centroid + 1e-6 * triangle.normalized_normal)
+    assert not triangle.point_on(triangle.a - 1e-6 * (triangle.b - triangle.a))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.hemicube`."""
+
+import numpy as np
+
+from thermal_radiation.hemicube import Hemicube, HemicubeEngine, clip_near
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
+
+
+def test_delta_form_factors():
+    hemicube = Hemicube(64)
+    assert hemicube.side.shape == (64, 32)
+    assert np.isclose(hemicube.top.sum() + 4.0 * hemicube.side.sum(), 1.0, atol=1.0E-3)
+
+
+def test_clip_near():
+    points = np.array([
+        [[0., 0., 1.], [1., 0., 1.], [0., 1., 1.]],   # in front
+        [[0., 0., -1.], [1., 0., -1.], [0., 1., -1.]], # behind
+        [[0., 0., 1.], [1., 0., -1.], [0., 1., -1.]], # one vertex in front
+        [[0., 0., -1.], [1., 0., 1.], [0., 1., 1.]],  # two vertices in front
+    ])
+    clipped, sources = clip_near(points, 0.0)
+    assert sorted(sources) == [0, 2, 3, 3]
+    assert np.all(clipped[:, :, 2] >= -1.0E-15)
+
+
+def test_parallel_plates_and_occlusion():
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 4, 4)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], 4, 4)
+    mesh = TriangleMesh(np.concatenate((lower, upper)))
+    n = len(lower)
+    view_factors = HemicubeEngine(mesh, resolution=64).compute()
+    plate_view_factor = mesh.areas[:n] @ np.asarray(view_factors[:n, n:].sum(axis=1)).ravel() / mesh.areas[:n].sum()
+    assert np.isclose(plate_view_factor, two_coaxial_parallel_plates(1.0, 1.0, 1.0), rtol=0.02)
+
+    blocker = rectangle_triangles([-1, -1, 0.5], [3, 0, 0], [0, 3, 0], 1, 1)
+    occluded = TriangleMesh(np.concatenate((lower, upper, blocker)))
+    view_factors = HemicubeEngine(occluded, resolution=32).compute(jobs=2)
+    assert view_factors[:n, n:2 * n].sum() == 0.0
+    assert view_factors[n:2 * n, 2 * n:].sum(axis=1).min() > 0.8
+
+
+def test_box_closure():
+    faces = []
+    for origin, u, v in [([0, 0, 0], [1, 0, 0], [0, 1, 0]), ([0, 0, 1], [0, 1, 0], [1, 0, 0]),
+                         ([0, 0, 0], [0, 0, 1], [1, 0, 0]), ([0, 1, 0], [1, 0, 0], [0, 0, 1]),
+                         ([0, 0, 0], [0, 1, 0], [0, 0, 1]), ([1, 0, 0], [0, 0, 1], [0, 1, 0])]:
+        faces.append(rectangle_triangles(origin, u, v, 2, 2))
+    box = TriangleMesh(np.concatenate(faces))
+    view_factors = HemicubeEngine(box, resolution=32).compute()
+    assert np.allclose(view_factors.sum(axis=1), 1.0, atol=0.01)
+    assert view_factors.diagonal().sum() == 0.0
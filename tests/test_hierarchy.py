@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.hierarchy`."""
+
+import pytest
+import numpy as np
+from scipy import sparse
+
+from thermal_radiation.hierarchy import SurfaceIndex, aggregate_view_factors, build_thermal_network
+from thermal_radiation.problem_domain import Surface
+
+
+def make_surfaces():
+    # a with own facets [4, 5] and subsurfaces a/x = [0], a/y = [2, 3]; b = [1, 6]
+    a, x, y, b = Surface("a"), Surface("x"), Surface("y"), Surface("b")
+    a.add_facets([4, 5])
+    x.add_facets([0])
+    y.add_facets([2, 3])
+    b.add_facets([1, 6])
+    a.add_subsurface(x)
+    a.add_subsurface(y)
+    return [a, b]
+
+
+def test_contiguous_ranges():
+    index = SurfaceIndex(make_surfaces())
+    assert [node.name for node in index.nodes] == ["a", "a/x", "a/y", "b"]
+    assert (index["a"].begin, index["a"].own_end, index["a"].end) == (0, 2, 5)
+    assert (index["a/y"].begin, index["a/y"].end) == (3, 5)
+    assert np.array_equal(index.order, [4, 5, 0, 2, 3, 1, 6])
+    assert index.level(0) == (["a", "b"], [(0, 5), (5, 7)])
+    assert index.level(1) == (["a", "a/x", "a/y", "b"], [(0, 2), (2, 3), (3, 5), (5, 7)])
+    assert np.array_equal(np.sort(make_surfaces()[0].aggregate_facets()), [0, 2, 3, 4, 5])
+
+
+def test_area_weighted_reduction():
+    rng = np.random.default_rng(3)
+    areas = rng.uniform(0.5, 2.0, 7)
+    view_factors = rng.uniform(0.0, 0.2, (7, 7))
+    index = SurfaceIndex(make_surfaces())
+    names, ranges = index.level(1)
+    membership = index.membership(ranges)
+
+    surface_areas, surface_view_factors = aggregate_view_factors(view_factors, areas, membership)
+    _, sparse_view_factors = aggregate_view_factors(sparse.csr_matrix(view_factors), areas, membership)
+    assert np.allclose(sparse_view_factors, surface_view_factors)
+
+    groups = [[4, 5], [0], [2, 3], [1, 6]]
+    for s, from_group in enumerate(groups):
+        assert np.isclose(surface_areas[s], areas[from_group].sum())
+        for t, to_group in enumerate(groups):
+            expected = (areas[from_group] @ view_factors[np.ix_(from_group, to_group)].sum(axis=1)) \
+                / areas[from_group].sum()
+            assert np.isclose(surface_view_factors[s, t], expected)
+
+
+def test_build_thermal_network():
+    areas = np.ones(7)
+    view_factors = np.full((7, 7), 1.0 / 6.0)
+    np.fill_diagonal(view_factors, 0.0)
+    index = SurfaceIndex(make_surfaces())
+
+    tn = build_thermal_network(index, view_factors, areas, {"a" : 0.5, "a/y" : 0.8, "b" : 0.3}, level=1)
+    assert list(tn.surfaces) == ["a", "a/x", "a/y", "b"]
+    assert [surface.eps for surface in tn.surfaces.values()] == [0.5, 0.5, 0.8, 0.3]
+    assert np.isclose(tn.get_view_factor("a/y", "b"), 2.0 / 6.0)
+    assert np.isclose(tn.get_view_factor("a/y", "a/y"), 1.0 / 6.0)
+    for sum_ in tn.get_view_factors_sums().values():
+        assert np.isclose(sum_, 1.0)
+
+    with pytest.raises(KeyError):
+        build_thermal_network(index, view_factors, areas, {"a" : 0.5})
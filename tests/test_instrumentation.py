@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.instrumentation`."""
+
+import io
+import json
+import tracemalloc
+
+from thermal_radiation import instrumentation
+from thermal_radiation.instrumentation import instrument, stage
+from thermal_radiation.problem_domain import Problem, Surface, TriangleElement
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+
+
+def make_problem():
+    quadrature = TriangleSymmetricalGauss2D(2)
+    bottom = Surface()
+    bottom.add_element(TriangleElement([0., 0., 0.], [1., 0., 0.], [0., 1., 0.], quadrature))
+    top = Surface()
+    top.add_element(TriangleElement([0., 0., 1.], [0., 1., 1.], [1., 0., 1.], quadrature))
+    problem = Problem([bottom, top])
+    problem.aggregate_elements()
+    return problem
+
+
+def test_counts_pairs_and_stages():
+    problem = make_problem()
+    with instrument(track_memory=True) as report:
+        problem.calculate_view_factors()
+
+    assert report.counters["pairs/fixed"] == 1
+    assert report.counters["integrand_evaluations/fixed"] == 9
+    assert report.stages["assembly"].calls == 1
+    assert report.peak_memory > 0
+    assert not instrumentation.ENABLED
+
+    stream = io.StringIO()
+    report.write_json_lines(stream)
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert {"type" : "counter", "name" : "pairs/fixed", "value" : 1} in records
+
+
+def test_disabled_records_nothing():
+    with instrument() as report:
+        pass
+    make_problem().calculate_view_factors()
+    with stage("ignored"):
+        pass
+    assert report.counters == {}
+    assert "ignored" not in instrumentation.get_report().stages
+
+
+def test_nested_blocks():
+    tracemalloc.start()
+    try:
+        with instrument(track_memory=True) as outer:
+            instrumentation.count("outer")
+            with instrument() as inner:
+                instrumentation.count("inner")
+            assert instrumentation.TRACK_MEMORY and tracemalloc.is_tracing()
+            instrumentation.count("outer")
+            with instrument(track_memory=True) as tracked:
+                block = bytearray(2**20)
+                del block
+        assert outer.counters == {"outer" : 2}
+        assert inner.counters == {"inner" : 1}
+        assert tracked.peak_memory >= 2**20 and outer.peak_memory >= tracked.peak_memory
+        assert inner.peak_memory is None and not instrumentation.ENABLED
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
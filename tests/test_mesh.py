@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.mesh`."""
+
+import sys
+import pytest
+import numpy as np
+
+from thermal_radiation.geometry import Triangle, get_fixed_triangle_view_factor
+from thermal_radiation.mesh import (
+    DegenerateTrianglesException, TriangleMesh, rectangle_triangles
+)
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+
+
+def deep_size(triangle):
+    attributes = triangle.__dict__
+    return (sys.getsizeof(triangle) + sys.getsizeof(attributes) +
+            sum(sys.getsizeof(value) for value in attributes.values()))
+
+
+def test_matches_triangle():
+    vertices = np.random.rand(20, 3, 3)
+    mesh = TriangleMesh(vertices)
+    for view, corners in zip(mesh, vertices):
+        triangle = Triangle(*corners)
+        assert np.isclose(view.area, triangle.area)
+        assert np.allclose(view.normal, triangle.normal)
+        assert np.allclose(view.normalized_normal, triangle.normalized_normal)
+        assert np.allclose(view.centroid, triangle.centroid)
+        assert np.allclose(view.surface_location(0.2, 0.3), triangle.surface_location(0.2, 0.3))
+
+    points = mesh.surface_locations([0.2], [0.3])
+    assert np.allclose(points[5, 0], mesh[5].surface_location(0.2, 0.3))
+
+
+def test_views_work_with_pair_kernels():
+    mesh = TriangleMesh([
+        [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+        [[0.0, 0.0, 1.0], [0.0, 1.0, 1.0], [1.0, 0.0, 1.0]],
+    ])
+    view_factor = get_fixed_triangle_view_factor(TriangleSymmetricalGauss2D(4))
+    triangles = [Triangle(*corners) for corners in mesh.vertices]
+    assert np.isclose(view_factor(mesh[0], mesh[1]), view_factor(*triangles))
+    assert mesh[1] == mesh[1] and mesh[0] != mesh[1]
+
+
+def test_bulk_degeneracy_check():
+    vertices = np.random.rand(6, 3, 3)
+    vertices[[1, 4], 2] = vertices[[1, 4], 0]
+    with pytest.raises(DegenerateTrianglesException) as info:
+        TriangleMesh(vertices)
+    assert list(info.value.indices) == [1, 4]
+
+
+def test_memory_per_facet():
+    mesh = TriangleMesh(rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 10, 10))
+    assert np.isclose(mesh.total_area, 1.0)
+    triangle = Triangle(*mesh.vertices[0])
+    assert 5 * mesh.nbytes / len(mesh) <= deep_size(triangle)
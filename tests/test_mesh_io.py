@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.mesh_io`."""
+
+import numpy as np
+
+from thermal_radiation.mesh_io import (
+    STL_RECORD, build_surfaces, read_mesh, read_obj, read_stl
+)
+
+OBJ_SOURCE = """\
+# unit square split over two groups
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+g floor
+f 1 2 3 4
+g walls/front
+f 1/1/1 5/2/2 6/3/3
+f -5 -2 -1
+"""
+
+ASCII_STL_SOURCE = """\
+solid lid
+  facet normal 0 0 1
+    outer loop
+      vertex 0 0 1
+      vertex 1 0 1
+      vertex 0 1 1
+    endloop
+  endfacet
+endsolid lid
+solid base
+  facet normal 0 0 -1
+    outer loop
+      vertex 0 0 0
+      vertex 0 1 0
+      vertex 1 0 0
+    endloop
+  endfacet
+endsolid base
+"""
+
+
+def test_obj_groups_and_polygons(tmpdir):
+    path = tmpdir.join("box.obj")
+    path.write(OBJ_SOURCE)
+    mesh = read_obj(str(path), chunk_size=2)
+
+    assert mesh.group_names == ["default", "floor", "walls/front"]
+    assert np.array_equal(mesh.faces, [[0, 1, 2], [0, 2, 3], [0, 4, 5], [1, 4, 5]])
+    assert np.array_equal(mesh.group_facets("walls/front"), [2, 3])
+    assert mesh.triangles().shape == (4, 3, 3)
+
+    floor, walls = build_surfaces(mesh)
+    assert floor.name == "floor"
+    assert np.array_equal(floor.aggregate_facets(), [0, 1])
+    assert walls.subsurfaces[0].name == "front"
+    assert np.array_equal(walls.aggregate_facets(), [2, 3])
+
+
+def test_ascii_stl(tmpdir):
+    path = tmpdir.join("lid.stl")
+    path.write(ASCII_STL_SOURCE)
+    mesh = read_mesh(str(path))
+
+    assert mesh.group_names == ["default", "lid", "base"]
+    assert np.array_equal(mesh.face_groups, [1, 2])
+    assert np.array_equal(mesh.triangles()[1, 1], [0.0, 1.0, 0.0])
+
+
+def test_binary_stl_in_chunks(tmpdir):
+    records = np.zeros(5, dtype=STL_RECORD)
+    records["vertices"] = np.random.rand(5, 3, 3)
+    path = str(tmpdir.join("random.stl"))
+    with open(path, "wb") as stl_file:
+        stl_file.write(b"solid but actually binary".ljust(80))
+        stl_file.write(np.uint32(5).tobytes())
+        records.tofile(stl_file)
+
+    mesh = read_stl(path, chunk_size=2)
+    assert np.allclose(mesh.triangles(), records["vertices"])
+
+    mesh.merge_vertices()
+    assert np.allclose(mesh.triangles(), records["vertices"])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.monte_carlo`."""
+
+import numpy as np
+
+from thermal_radiation.geometry import Triangle
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.monte_carlo import MonteCarloEngine
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
+
+
+def plates(*extra):
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 2, 2)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], 2, 2)
+    return TriangleMesh(np.concatenate((lower, upper) + extra))
+
+
+def plate_view_factor(mesh, view_factors, n):
+    areas = mesh.areas[:n]
+    return areas @ np.asarray(view_factors[:n, n:2 * n].sum(axis=1)).ravel() / areas.sum()
+
+
+def test_parallel_plates():
+    mesh = plates()
+    view_factors, errors, rays = MonteCarloEngine(mesh, seed=7).compute(rays_per_batch=5000, max_rays=20000)
+    assert np.all(rays == 20000)
+    assert np.all(errors < 0.005)
+    # 160k rays over the lower plate, the standard error is about 1e-3
+    assert abs(plate_view_factor(mesh, view_factors, 8) - two_coaxial_parallel_plates(1.0, 1.0, 1.0)) < 4.0E-3
+
+    again, _, _ = MonteCarloEngine(mesh, seed=7).compute(rays_per_batch=5000, max_rays=20000)
+    assert (again != view_factors).nnz == 0
+
+
+def test_occlusion_and_closure():
+    blocker = rectangle_triangles([-1, -1, 0.5], [3, 0, 0], [0, 3, 0], 1, 1)
+    mesh = plates(blocker)
+    view_factors, _, _ = MonteCarloEngine(mesh, seed=1).compute(rays_per_batch=500, max_rays=500)
+    assert plate_view_factor(mesh, view_factors, 8) == 0.0
+    assert np.all(view_factors[8:16, 16:].sum(axis=1) > 0.8) # the upper plate mostly sees the blocker
+
+    faces = []
+    for origin, u, v in [([0, 0, 0], [1, 0, 0], [0, 1, 0]), ([0, 0, 1], [0, 1, 0], [1, 0, 0]),
+                         ([0, 0, 0], [0, 0, 1], [1, 0, 0]), ([0, 1, 0], [1, 0, 0], [0, 0, 1]),
+                         ([0, 0, 0], [0, 1, 0], [0, 0, 1]), ([1, 0, 0], [0, 0, 1], [0, 1, 0])]:
+        faces.append(rectangle_triangles(origin, u, v, 2, 2))
+    box = TriangleMesh(np.concatenate(faces))
+    view_factors, errors, rays = MonteCarloEngine(box, seed=2).compute(
+        rays_per_batch=200, max_rays=10000, target_error=0.03)
+    assert np.allclose(view_factors.sum(axis=1), 1.0)
+    assert np.all(errors <= 0.03)
+    assert rays.max() < 10000
+
+
+def test_accepts_triangles():
+    triangles = [Triangle([0., 0., 0.], [1., 0., 0.], [0., 1., 0.]),
+                 Triangle([0., 0., 1.], [0., 1., 1.], [1., 0., 1.])]
+    view_factors, _, _ = MonteCarloEngine(triangles, seed=3).compute(rays_per_batch=50000, max_rays=50000)
+    assert view_factors.shape == (2, 2)
+    assert abs(view_factors[0, 1] - view_factors[1, 0]) < 0.01
+    assert 0.1 < view_factors[0, 1] < 0.13
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.out_of_core`."""
+
+import numpy as np
+
+from thermal_radiation.assembly import PAIR_CHUNK_BYTES, assemble_view_factor_matrix
+from thermal_radiation.hierarchy import aggregate_view_factors
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.out_of_core import OutOfCoreMatrix, assemble_out_of_core, rows_per_block
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+from scipy import sparse
+
+
+def make_mesh():
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 3, 3)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [2, 0, 0], 2, 3)
+    return TriangleMesh(np.concatenate((lower, upper)))
+
+
+def test_dense_out_of_core(tmp_path):
+    mesh = make_mesh()
+    quadrature = TriangleSymmetricalGauss2D(4)
+    reference = assemble_view_factor_matrix(mesh, quadrature)
+
+    budget = PAIR_CHUNK_BYTES + 40 * len(mesh) * 5 # blocks of 5 rows
+    assert rows_per_block(len(mesh), budget) == 5
+    matrix = assemble_out_of_core(mesh, quadrature, str(tmp_path / "F.npy"), ram_budget=budget)
+    np.testing.assert_allclose(matrix.to_array(), reference, rtol=1e-12, atol=1e-15)
+
+    reader = OutOfCoreMatrix(str(tmp_path / "F.npy"), ram_budget=8 * len(mesh) * 7)
+    assert len(list(reader.row_blocks())) > 1
+    x = np.linspace(0.0, 1.0, len(mesh))
+    np.testing.assert_allclose(reader.row_sums(), reference.sum(axis=1))
+    np.testing.assert_allclose(reader.matvec(x), reference @ x)
+    np.testing.assert_allclose(reader.as_linear_operator().rmatvec(x), reference.T @ x)
+
+    membership = sparse.csr_matrix((np.ones(len(mesh)), (np.repeat([0, 1], [18, 12]), np.arange(len(mesh)))))
+    streamed = aggregate_view_factors(reader, mesh.areas, membership)
+    in_memory = aggregate_view_factors(reference, mesh.areas, membership)
+    np.testing.assert_allclose(streamed[0], in_memory[0])
+    np.testing.assert_allclose(streamed[1], in_memory[1])
+
+
+def test_sparse_out_of_core(tmp_path):
+    mesh = make_mesh()
+    quadrature = TriangleSymmetricalGauss2D(4)
+    reference = assemble_view_factor_matrix(mesh, quadrature)
+    tolerance = 0.01
+    reference[reference < tolerance] = 0.0
+
+    budget = PAIR_CHUNK_BYTES + 40 * len(mesh) * 4
+    matrix = assemble_out_of_core(mesh, quadrature, str(tmp_path / "F"), ram_budget=budget,
+                                  drop_tolerance=tolerance, jobs=2)
+    assert matrix.is_sparse
+    assert matrix.to_sparse().nnz == np.count_nonzero(reference)
+    np.testing.assert_allclose(matrix.to_array(), reference, rtol=1e-12, atol=1e-15)
+
+    reader = OutOfCoreMatrix(str(tmp_path / "F"), ram_budget=16 * 10)
+    assert len(list(reader.row_blocks())) > 1
+    np.testing.assert_allclose(reader.row_sums(), reference.sum(axis=1))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.precision`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.assembly import assemble_view_factor_matrix
+from thermal_radiation.hemicube import HemicubeEngine
+from thermal_radiation.instrumentation import instrument
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.precision import DOUBLE, MIXED, SINGLE, PrecisionPolicy, get_policy
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+
+
+def make_mesh(n_div=4):
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], n_div, n_div)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], n_div, n_div)
+    return TriangleMesh(np.concatenate((lower, upper)))
+
+
+def test_policies():
+    assert get_policy() is DOUBLE
+    assert get_policy("single") is SINGLE
+    assert DOUBLE.is_double and not MIXED.is_double
+    assert MIXED.compute_dtype("hemicube") == np.float32
+    assert MIXED.compute_dtype("quadrature") == np.float64
+    with pytest.raises(ValueError):
+        get_policy("half")
+    with pytest.raises(ValueError):
+        PrecisionPolicy(engines={"raytracer" : np.float32})
+
+
+def test_single_and_mixed_assembly():
+    mesh = make_mesh()
+    quadrature = TriangleSymmetricalGauss2D(4)
+    reference = assemble_view_factor_matrix(mesh, quadrature)
+
+    single = assemble_view_factor_matrix(mesh, quadrature, precision=SINGLE)
+    assert single.dtype == np.float64
+    assert np.allclose(single, reference, rtol=1.0E-5, atol=1.0E-8)
+
+    far_field = PrecisionPolicy(far_field=np.float32, far_field_distance=1.0)
+    with instrument() as report:
+        mixed = assemble_view_factor_matrix(mesh, quadrature, precision=far_field)
+    assert 0 < report.counters["pairs/far_field"] < len(mesh) * (len(mesh) - 1) // 2
+    assert np.allclose(mixed, reference, rtol=1.0E-5, atol=1.0E-8)
+
+
+def test_single_hemicube():
+    mesh = make_mesh(2)
+    reference = HemicubeEngine(mesh, resolution=32).compute()
+    single = HemicubeEngine(mesh, resolution=32, precision=SINGLE).compute()
+    assert np.allclose(single.toarray(), reference.toarray(), atol=1.0E-3)
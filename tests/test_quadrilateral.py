@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.quadrilateral`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.assembly import assemble_view_factor_matrix
+from thermal_radiation.geometry import (
+    Quadrilateral, get_fixed_element_view_factor, get_fixed_triangle_view_factor
+)
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.problem_domain import Problem, QuadElement, Surface, TriangleElement
+from thermal_radiation.quadrature_2d import QuadrilateralGaussLegendre2D, TriangleSymmetricalGauss2D
+from thermal_radiation.quadrilateral import (
+    InvalidQuadrilateralsException, QuadMesh, assemble_mixed_view_factor_matrix, rectangle_quadrilaterals
+)
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
+
+
+def test_bilinear_map():
+    quad = Quadrilateral([0, 0, 0], [1, 0, 0], [1.2, 1, 0], [0, 0.8, 0])
+    lower, upper = quad.split()
+    assert np.isclose(quad.area, lower.area + upper.area)
+    assert np.allclose(quad.surface_location(-1.0, 1.0), quad.d)
+    assert np.allclose(quad.normalized_normal, [0, 0, 1])
+
+    points, weights = quad.integration_points(QuadrilateralGaussLegendre2D(2, 2))
+    assert np.isclose(weights.sum(), quad.area)
+    assert np.allclose(weights @ points / quad.area, quad.centroid)
+
+    mesh = QuadMesh(quad.vertices[np.newaxis])
+    assert np.allclose(mesh.centroids[0], quad.centroid)
+    assert np.allclose(mesh.split().areas, [lower.area, upper.area])
+
+    with pytest.raises(ValueError):
+        Quadrilateral([0, 0, 0], [1, 0, 0], [1, 1, 0.5], [0, 1, 0])
+    with pytest.raises(ValueError):
+        Quadrilateral([0, 0, 0], [1, 0, 0], [0.2, 0.2, 0], [0, 1, 0])
+    with pytest.raises(InvalidQuadrilateralsException, match="non-convex"):
+        QuadMesh([[[0, 0, 0], [1, 0, 0], [0.2, 0.2, 0], [0, 1, 0]]])
+    with pytest.raises(ValueError):
+        quad.integration_points(TriangleSymmetricalGauss2D(3))
+
+
+def test_pair_kernels():
+    lower = Quadrilateral([0, 0, 0], [2, 0, 0], [2, 2, 0], [0, 2, 0])
+    upper = Quadrilateral([0, 0, 1], [0, 2, 1], [2, 2, 1], [2, 0, 1])
+    quad_rule = QuadrilateralGaussLegendre2D(10, 10)
+    view_factor = get_fixed_element_view_factor(quad_rule, quad_rule)
+    assert np.isclose(view_factor(lower, upper), two_coaxial_parallel_plates(2.0, 2.0, 1.0), rtol=1e-6)
+
+    # the quadrilateral against the triangles it splits into
+    triangle_rule = TriangleSymmetricalGauss2D(13)
+    triangle_view_factor = get_fixed_triangle_view_factor(triangle_rule)
+    to_triangles = get_fixed_element_view_factor(quad_rule, triangle_rule)
+    from_triangles = get_fixed_element_view_factor(triangle_rule, quad_rule)
+    split = upper.split()
+    assert np.isclose(sum(to_triangles(lower, triangle) for triangle in split), view_factor(lower, upper))
+    for triangle in split:
+        assert np.isclose(from_triangles(triangle, lower) * triangle.area, to_triangles(lower, triangle) * lower.area)
+        expected = sum(triangle_view_factor(triangle, other) for other in lower.split())
+        assert np.isclose(from_triangles(triangle, lower), expected, rtol=1e-4)
+
+
+def test_mixed_assembly():
+    quads = QuadMesh(rectangle_quadrilaterals([0, 0, 0], [1, 0, 0], [0, 1, 0], 3, 2))
+    triangles = TriangleMesh(rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], 2, 2))
+    triangle_rule = TriangleSymmetricalGauss2D(7)
+    quad_rule = QuadrilateralGaussLegendre2D(4, 4)
+
+    view_factors = assemble_mixed_view_factor_matrix(triangles, triangle_rule, quads, quad_rule)
+    n_triangles = len(triangles)
+    areas = np.concatenate((triangles.areas, quads.areas))
+    np.testing.assert_allclose(view_factors * areas[:, np.newaxis], (view_factors * areas[:, np.newaxis]).T,
+                               atol=1e-15)
+    assert np.all(np.diag(view_factors) == 0.0)
+
+    # against the split quadrilaterals, with the triangle pairs integrated alike
+    split = quads.split()
+    reference = assemble_view_factor_matrix(TriangleMesh(np.concatenate((triangles.vertices, split.vertices))),
+                                            TriangleSymmetricalGauss2D(13))
+    merged = np.add.reduceat(reference[:, n_triangles:], np.arange(0, 2 * len(quads), 2), axis=1)
+    to_quads = view_factors[:n_triangles, n_triangles:]
+    np.testing.assert_allclose(to_quads, merged[:n_triangles], rtol=1e-5)
+    np.testing.assert_allclose(view_factors[:n_triangles, :n_triangles],
+                               assemble_view_factor_matrix(triangles, triangle_rule))
+
+    only_quads = assemble_mixed_view_factor_matrix(TriangleMesh(np.empty((0, 3, 3))), triangle_rule,
+                                                   quads, quad_rule)
+    np.testing.assert_allclose(only_quads, view_factors[n_triangles:, n_triangles:])
+
+
+def test_problem_with_quad_elements():
+    quad_rule = QuadrilateralGaussLegendre2D(8, 8)
+    triangle_rule = TriangleSymmetricalGauss2D(13)
+    bottom = Surface("bottom")
+    for corners in rectangle_quadrilaterals([0, 0, 0], [2, 0, 0], [0, 2, 0], 2, 2):
+        bottom.add_element(QuadElement(*corners, quad_rule))
+    top = Surface("top")
+    for corners in rectangle_triangles([0, 0, 1], [0, 2, 0], [2, 0, 0], 1, 1):
+        top.add_element(TriangleElement(*corners, triangle_rule))
+
+    problem = Problem([bottom, top])
+    problem.aggregate_elements()
+    problem.calculate_view_factors()
+    names, areas, view_factors = problem.get_surface_view_factors()
+    assert np.isclose(view_factors[0, 1], two_coaxial_parallel_plates(2.0, 2.0, 1.0), rtol=1e-5)
+    assert np.isclose(areas[0] * view_factors[0, 1], areas[1] * view_factors[1, 0])
+    assert problem.get_vertex_array().shape == (6, 4, 3)
+
+    problem.symmetry = "auto"
+    with pytest.raises(ValueError):
+        problem.get_symmetry_group()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.radiosity`."""
+
+import numpy as np
+
+from thermal_radiation.assembly import assemble_view_factor_matrix
+from thermal_radiation.gebhart import ThermalNetwork
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.out_of_core import assemble_out_of_core
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+from thermal_radiation.radiosity import KernelRows, MatrixRows, ProgressiveRadiosity
+from thermal_radiation.temperature import STEFAN_BOLTZMANN
+
+
+def make_network():
+    # a concave three surface enclosure with reciprocal, closed view factors
+    areas = np.array([1.0, 2.0, 3.0])
+    exchange = np.array([[0.2, 0.3, 0.5], [0.3, 0.7, 1.0], [0.5, 1.0, 1.5]]) # A_i F_ij
+    tn = ThermalNetwork()
+    tn.add_surfaces(["a", "b", "c"], areas, [0.9, 0.3, 0.6])
+    tn.add_view_factor_matrix(["a", "b", "c"], exchange / areas[:, np.newaxis])
+    return tn
+
+
+def test_enclosure():
+    tn = make_network()
+    temperatures = np.array([400.0, 300.0, 250.0])
+    radks = tn.get_radk_matrix()
+    emissive_powers = STEFAN_BOLTZMANN * temperatures**4
+    expected = radks.sum(axis=1) * emissive_powers - radks @ emissive_powers
+
+    solutions = list(tn.get_progressive_radiosity(temperatures).iterate(tolerance=1.0E-12, report_every=1))
+    residuals = [solution.residual for solution in solutions]
+    assert np.all(np.diff(residuals) <= 0.0)
+    assert residuals[-1] <= 1.0E-12
+    np.testing.assert_allclose(solutions[-1].heat_flows, expected, rtol=1.0E-9, atol=1.0E-9)
+    assert abs(solutions[-1].heat_flows.sum()) < 1.0E-9 * solutions[-1].emitted.sum()
+
+    # intermediate results get closer as the unshot power falls
+    errors = [np.abs(solution.heat_flows - expected).max() for solution in solutions]
+    assert errors[5] < errors[0]
+
+
+def test_lazy_element_rows(tmp_path):
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 3, 3)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], 3, 3)
+    mesh = TriangleMesh(np.concatenate((lower, upper)))
+    quadrature = TriangleSymmetricalGauss2D(4)
+    eps = np.where(np.arange(len(mesh)) < 18, 0.8, 0.4)
+    emissive_powers = np.where(np.arange(len(mesh)) < 18, 1000.0, 0.0)
+
+    rows = KernelRows(mesh, quadrature, max_cached_rows=4)
+    lazy = ProgressiveRadiosity(rows, mesh.areas, eps, emissive_powers).solve(1.0E-10)
+    assert rows.computed >= len(mesh)
+
+    view_factors = assemble_view_factor_matrix(mesh, quadrature)
+    full = ProgressiveRadiosity(MatrixRows(view_factors), mesh.areas, eps, emissive_powers).solve(1.0E-10)
+    np.testing.assert_allclose(lazy.radiosities, full.radiosities, rtol=1.0E-12)
+
+    out_of_core = assemble_out_of_core(mesh, quadrature, str(tmp_path / "F.npy"))
+    streamed = ProgressiveRadiosity(MatrixRows(out_of_core), mesh.areas, eps, emissive_powers).solve(1.0E-10)
+    np.testing.assert_allclose(streamed.radiosities, full.radiosities, rtol=1.0E-12)
+
+    early = ProgressiveRadiosity(KernelRows(mesh, quadrature), mesh.areas, eps, emissive_powers).solve(max_shots=5)
+    assert early.shots == 5
+    assert early.residual > full.residual
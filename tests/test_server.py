@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.server`."""
+
+import os
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from thermal_radiation.assembly import PairKernel
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.quadrature_2d import get_quadrature
+from thermal_radiation.server import Server, serve_socket
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_vertices():
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], 2, 2)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], 2, 2)
+    return np.concatenate((lower, upper))
+
+
+def request(request_id, method, **params):
+    return json.dumps({"id" : request_id, "method" : method, "params" : params})
+
+
+def test_batched_requests():
+    server = Server()
+    vertices = make_vertices()
+    groups = ["floor"] * 8 + ["lid"] * 8
+    loaded = json.loads(server.handle_lines([request(0, "load_mesh", vertices=vertices.tolist(), groups=groups)])[0])
+    mesh_id = loaded["result"]["mesh"]
+    assert loaded["result"]["surfaces"] == ["floor", "lid"]
+
+    lines = [request(1, "view_factors", mesh=mesh_id, pairs=[[0, 8], [1, 9]]),
+             "",
+             request(2, "view_factors", mesh=mesh_id, pairs=[[8, 0]]),
+             request(3, "view_factors", mesh="unknown", pairs=[[0, 1]]),
+             "not json",
+             request(4, "surface_view_factors", mesh=mesh_id),
+             request(5, "gebhart", mesh=mesh_id, emissivities={"floor" : 0.9}, default_eps=0.5)]
+    responses = [None if line is None else json.loads(line) for line in server.handle_lines(lines)]
+    assert responses[1] is None
+    assert server.counters["kernel_calls"] == 1 # requests 1 and 2 share one kernel call
+
+    kernel = PairKernel(TriangleMesh(vertices), get_quadrature("symmetric:4"))
+    expected = kernel(np.array([0, 1, 8]), np.array([8, 9, 0]))
+    np.testing.assert_allclose(responses[0]["result"]["view_factors"] + responses[2]["result"]["view_factors"],
+                               expected)
+    assert responses[0]["id"] == 1 and responses[2]["id"] == 2
+    assert responses[3]["error"]["type"] == "RequestError"
+    assert responses[4]["id"] is None and "error" in responses[4]
+
+    surface = responses[5]["result"]
+    assert surface["names"] == ["floor", "lid"]
+    np.testing.assert_allclose(surface["view_factors"][0][1], two_coaxial_parallel_plates(1.0, 1.0, 1.0),
+                               rtol=1e-3)
+    radks = np.array(responses[6]["result"]["radks"])
+    np.testing.assert_allclose(radks, radks.T)
+
+    arrays = json.loads(server.handle_lines([request(6, "gebhart", names=surface["names"], areas=surface["areas"],
+                                                     eps=[0.9, 0.5], view_factors=surface["view_factors"])])[0])
+    np.testing.assert_allclose(arrays["result"]["radks"], radks)
+
+
+def test_stdio_server():
+    env = dict(os.environ, PYTHONPATH=REPOSITORY + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    process = subprocess.Popen([sys.executable, "-m", "thermal_radiation.cli", "serve"], env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    lines = [request(1, "load_mesh", vertices=make_vertices().tolist()), request(2, "ping")]
+    output, _ = process.communicate("\n".join(lines).encode() + b"\n", timeout=60)
+    assert process.returncode == 0
+    responses = [json.loads(line) for line in output.decode().splitlines()]
+    assert [response["id"] for response in responses] == [1, 2]
+    assert responses[0]["result"]["elements"] == 16
+
+
+def test_socket_server(tmpdir):
+    server = Server()
+    address = str(tmpdir.join("server.sock"))
+    listening = threading.Event()
+    thread = threading.Thread(target=serve_socket, args=(server, address), kwargs={"ready" : lambda _: listening.set()})
+    thread.start()
+    assert listening.wait(10)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(address)
+        stream = client.makefile("rwb")
+        stream.write(request(1, "ping").encode() + b"\n" + request(2, "shutdown").encode() + b"\n")
+        stream.flush()
+        responses = [json.loads(stream.readline()) for _ in range(2)]
+    thread.join(10)
+    assert not thread.is_alive()
+    assert responses[0]["result"]["pid"] == os.getpid()
+    assert responses[1] == {"id" : 2, "result" : {}}
+    assert not os.path.exists(address)
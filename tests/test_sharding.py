@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.sharding`."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+import numpy as np
+from click.testing import CliRunner
+
+from thermal_radiation import cli
+from thermal_radiation.assembly import assemble_view_factor_matrix
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.mesh_io import read_mesh
+from thermal_radiation.precision import MIXED
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+from thermal_radiation.sharding import (ShardMismatchException, compute_shard, merge_shards, pairs_in_rows,
+                                        read_shard, row_costs, shard_bounds)
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_mesh(n_div=3):
+    lower = rectangle_triangles([0, 0, 0], [1, 0, 0], [0, 1, 0], n_div, n_div)
+    upper = rectangle_triangles([0, 0, 1], [0, 1, 0], [1, 0, 0], n_div, n_div)
+    return TriangleMesh(np.concatenate((lower, upper)))
+
+
+def write_obj(path, mesh):
+    with open(path, "w") as obj_file:
+        for triangle in mesh.vertices:
+            for vertex in triangle:
+                obj_file.write(f"v {vertex[0]:.17g} {vertex[1]:.17g} {vertex[2]:.17g}\n")
+        half = len(mesh) // 2
+        for group, elements in (("floor", range(half)), ("lid", range(half, len(mesh)))):
+            obj_file.write(f"g {group}\n")
+            for k in elements:
+                obj_file.write(f"f {3 * k + 1} {3 * k + 2} {3 * k + 3}\n")
+
+
+def test_shard_bounds():
+    n = 200
+    costs = (n - np.arange(n) - 1).astype(float)
+    bounds = shard_bounds(costs, 7)
+    assert bounds[0][0] == 0 and bounds[-1][1] == n
+    assert all(end == begin for (_, end), (begin, _) in zip(bounds[:-1], bounds[1:]))
+    pairs = [pairs_in_rows(n, begin, end) for begin, end in bounds]
+    assert sum(pairs) == n * (n - 1) // 2
+    assert max(pairs) - min(pairs) <= n
+
+    # far-field pairs are cheaper, so rows with many of them get more pairs
+    mesh = TriangleMesh(rectangle_triangles([0, 0, 0], [8, 0, 0], [0, 1, 0], 16, 2))
+    mixed = row_costs(mesh, MIXED)
+    assert np.all(mixed <= row_costs(mesh))
+    assert np.any(mixed < row_costs(mesh))
+    assert len(shard_bounds(np.ones(2), 4)) == 4
+
+
+def test_shards_in_separate_processes(tmpdir):
+    mesh_path = str(tmpdir.join("plates.obj"))
+    write_obj(mesh_path, make_mesh())
+    n_shards = 3
+
+    env = dict(os.environ, PYTHONPATH=REPOSITORY + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    processes = [subprocess.Popen([sys.executable, "-m", "thermal_radiation.cli", "shard", mesh_path,
+                                   "--shard", str(k), "--shards", str(n_shards), "-q", "symmetric:4",
+                                   "-o", str(tmpdir.join(f"part{k}.npz")), "--quiet"], env=env)
+                 for k in range(n_shards)]
+    assert [process.wait() for process in processes] == [cli.EXIT_OK] * n_shards
+
+    partials = [str(tmpdir.join(f"part{k}.npz")) for k in reversed(range(n_shards))]
+    output = str(tmpdir.join("elements.npy"))
+    result = CliRunner().invoke(cli.main, ["merge", *partials, "-o", output, "--quiet"])
+    assert result.exit_code == cli.EXIT_OK, result.output
+
+    mesh = TriangleMesh.from_mesh_data(read_mesh(mesh_path))
+    reference = assemble_view_factor_matrix(mesh, TriangleSymmetricalGauss2D(4))
+    np.testing.assert_allclose(np.load(output), reference, rtol=1e-12, atol=1e-15)
+
+    result = CliRunner().invoke(cli.main, ["merge", *partials[:-1], "-o", output])
+    assert result.exit_code == cli.EXIT_INPUT
+    assert "Missing shard" in result.output
+
+    results = str(tmpdir.join("plates.npz"))
+    result = CliRunner().invoke(cli.main, ["run", mesh_path, "-o", results, "--default-emissivity", "0.5",
+                                           "--element-matrix", output, "--quiet"])
+    assert result.exit_code == cli.EXIT_OK, result.output
+
+
+def test_merge_validation(tmpdir):
+    mesh = make_mesh(2)
+    quadrature = TriangleSymmetricalGauss2D(4)
+    paths = [str(tmpdir.join(f"part{k}.npz")) for k in range(2)]
+    for k, path in enumerate(paths):
+        compute_shard(mesh, quadrature, k, 2, path)
+    np.testing.assert_allclose(merge_shards(paths), assemble_view_factor_matrix(mesh, quadrature))
+    header = read_shard(paths[1], values=False)
+    assert "values" not in header
+    assert header["n_values"] == pairs_in_rows(len(mesh), header["begin"], header["end"])
+
+    with pytest.raises(ShardMismatchException):
+        merge_shards(paths + paths[:1])
+
+    other = str(tmpdir.join("other.npz"))
+    compute_shard(mesh, TriangleSymmetricalGauss2D(2), 1, 2, other)
+    with pytest.raises(ShardMismatchException, match="key"):
+        merge_shards([paths[0], other])
+
+    with pytest.raises(ValueError):
+        compute_shard(mesh, quadrature, 2, 2, other)
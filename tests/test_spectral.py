@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.spectral`."""
+
+import numpy as np
+
+from thermal_radiation.gebhart import ThermalNetwork
+from thermal_radiation.spectral import band_fractions, blackbody_fraction
+
+VIEW_FACTORS = np.array([
+    [1/6, 1/6, 1/3, 1/3], [1/3, 0.0, 1/3, 1/3], [1/3, 1/6, 1/6, 1/3], [1/3, 1/6, 1/3, 1/6]])
+AREAS = [2.0, 1.0, 2.0, 2.0]
+
+
+def make_network(eps, band_eps=None, edges=None):
+    tn = ThermalNetwork()
+    tn.add_surfaces("abcd", AREAS, eps, band_eps)
+    tn.add_view_factor_matrix(list("abcd"), VIEW_FACTORS)
+    if edges is not None:
+        tn.set_bands(edges)
+    return tn
+
+
+def test_blackbody_fraction():
+    # tabulated values, e.g. Incropera table 12.2
+    assert np.allclose(blackbody_fraction([2898.0, 5000.0, 10000.0]), [0.250108, 0.633747, 0.914199], atol=1.0E-4)
+    assert np.array_equal(blackbody_fraction([0.0, np.inf]), [0.0, 1.0])
+    fractions = band_fractions([0.0, 3.0, 8.0, np.inf], [300.0, 5800.0])
+    assert fractions.shape == (2, 3)
+    assert np.allclose(fractions.sum(axis=1), 1.0)
+    assert fractions[0, 2] > 0.8 and fractions[1, 0] > 0.9
+
+
+def test_band_solves_match_grey_networks():
+    band_eps = np.array([[0.2, 0.9], [0.5, 0.5], [0.8, 0.1], [0.3, 0.7]])
+    edges = [0.0, 4.0, np.inf]
+    tn = make_network(band_eps[:, 0], band_eps, edges)
+
+    band_radks = tn.get_band_radk_matrices()
+    for band in range(2):
+        grey = make_network(band_eps[:, band])
+        assert np.allclose(band_radks[band], grey.get_radk_matrix())
+        assert np.allclose(band_radks[band], band_radks[band].T)
+
+    fractions = band_fractions(edges, 400.0)
+    assert np.allclose(tn.get_weighted_radk_matrix(400.0),
+                       fractions[0] * band_radks[0] + fractions[1] * band_radks[1])
+    per_surface = tn.get_weighted_radk_matrix(np.full(4, 400.0), band_radks)
+    assert np.allclose(per_surface, tn.get_weighted_radk_matrix(400.0))
+
+
+def test_grey_surfaces_in_bands():
+    tn = make_network([0.2, 0.5, 0.8, 0.3], edges=[0.0, 2.0, 10.0, np.inf])
+    radks = tn.get_weighted_radk_matrix(1000.0)
+    assert np.allclose(radks, tn.get_radk_matrix())
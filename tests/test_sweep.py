@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.sweep`."""
+
+import json
+import numpy as np
+
+from thermal_radiation.sweep import parameter_grid, run_sweep
+
+
+def product_of(x, y):
+    return x * y
+
+
+def evaluate_nothing(x, y):
+    raise AssertionError("completed point evaluated again")
+
+
+def test_grid_order():
+    points = parameter_grid({"x" : [1, 2], "y" : [10, 20, 30]})
+    assert len(points) == 6
+    assert points[1] == {"x" : 1, "y" : 20}
+
+
+def test_parallel_sweep(tmpdir):
+    output = str(tmpdir.join("sweep.npz"))
+    axes = {"x" : np.linspace(0.0, 1.0, 3), "y" : [2.0, 3.0]}
+    result = run_sweep(product_of, axes, output, jobs=2, metadata={"engine" : "test"})
+
+    assert np.allclose(result["value"], result["x"] * result["y"])
+    assert np.all(result["time"] >= 0.0)
+    assert json.loads(str(result["metadata"])) == {"engine" : "test"}
+
+
+def test_resume_skips_completed_points(tmpdir):
+    output = str(tmpdir.join("sweep.npz"))
+    checkpoint = tmpdir.join("sweep.jsonl")
+    done = {"index" : 1, "params" : {"x" : 1.0, "y" : 3.0}, "value" : 42.0, "time" : 0.5}
+    checkpoint.write(json.dumps(done) + "\n" + '{"index": 0, "par')
+
+    result = run_sweep(product_of, {"x" : [1.0], "y" : [2.0, 3.0, 4.0]}, output,
+                       checkpoint=str(checkpoint))
+    assert list(result["value"]) == [2.0, 42.0, 4.0]
+    assert len(checkpoint.readlines()) == 4
+
+
+def test_checkpoint_with_numpy_axes(tmpdir):
+    output = str(tmpdir.join("sweep.npz"))
+    checkpoint = str(tmpdir.join("sweep.jsonl"))
+    axes = {"x" : np.arange(1, 3, dtype=np.int64), "y" : np.array([2.0, 3.0], dtype=np.float32)}
+    first = run_sweep(product_of, axes, output, checkpoint=checkpoint)
+    with open(checkpoint) as lines:
+        assert json.loads(next(lines))["params"] == {"x" : 1, "y" : 2.0}
+
+    # resuming finds every point already done
+    resumed = run_sweep(evaluate_nothing, axes, output, checkpoint=checkpoint)
+    np.testing.assert_array_equal(resumed["value"], first["value"])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.symmetry`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.assembly import assemble_view_factor_matrix
+from thermal_radiation.mesh import TriangleMesh, rectangle_triangles
+from thermal_radiation.problem_domain import Problem, Surface, TriangleElement
+from thermal_radiation.quadrature_2d import TriangleSymmetricalGauss2D
+from thermal_radiation.symmetry import (
+    NotASymmetryException, SymmetryAxis, SymmetryGroup, SymmetryPlane
+)
+
+
+def facing_plates(n_div, width=2.0, depth=1.0):
+    """Two facing width x depth plates, triangulated symmetrically."""
+    lower = rectangle_triangles([0, 0, 0], [width, 0, 0], [0, depth, 0], n_div, n_div, crossed=True)
+    upper = rectangle_triangles([0, 0, 1], [0, depth, 0], [width, 0, 0], n_div, n_div, crossed=True)
+    return TriangleMesh(np.concatenate((lower, upper)))
+
+
+def test_detects_octant_symmetry():
+    mesh = facing_plates(2)
+    group = SymmetryGroup.detect(mesh)
+    assert group.order == 8 # three mirror planes
+
+    rep_rows, rep_cols, orbit, swapped = group.pair_orbits()
+    n = len(mesh)
+    assert len(orbit) == n * (n - 1) // 2
+    assert len(rep_rows) < len(orbit) / 6
+
+
+def test_symmetric_assembly_matches_full():
+    mesh = facing_plates(2)
+    quadrature = TriangleSymmetricalGauss2D(4)
+    full = assemble_view_factor_matrix(mesh, quadrature)
+    reduced = assemble_view_factor_matrix(mesh, quadrature, symmetry=SymmetryGroup.detect(mesh))
+    assert np.allclose(reduced, full, rtol=1.0E-10, atol=1.0E-14)
+
+
+def test_declared_symmetry_in_problem():
+    mesh = facing_plates(1)
+    quadrature = TriangleSymmetricalGauss2D(4)
+    operations = [SymmetryPlane([1.0, 0.0, 0.0], [1.0, 0.0, 0.0]),
+                  SymmetryAxis([1.0, 0.5, 0.5], [0.0, 1.0, 0.0], 2)]
+
+    def make_problem(symmetry):
+        surface = Surface()
+        for corners in mesh.vertices:
+            surface.add_element(TriangleElement(*corners, quadrature))
+        problem = Problem([surface], symmetry=symmetry)
+        problem.aggregate_elements()
+        problem.calculate_view_factors()
+        return problem.get_view_factor_matrix()
+
+    assert np.allclose(make_problem(operations), make_problem(None), rtol=1.0E-10, atol=1.0E-14)
+
+    with pytest.raises(NotASymmetryException):
+        SymmetryGroup.from_operations(mesh, [SymmetryAxis([1.0, 0.5, 0.5], [0.0, 0.0, 1.0], 4)])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `thermal_radiation.temperature`."""
+
+import pytest
+import numpy as np
+
+from thermal_radiation.gebhart import ThermalNetwork
+from thermal_radiation.instrumentation import instrument
+from thermal_radiation.temperature import (
+    STEFAN_BOLTZMANN, NoConvergenceException, SingularNetworkException, TemperatureSolver
+)
+
+
+def shield_radks(k=0.5):
+    return np.array([[0.0, k, 0.0], [k, 0.0, k], [0.0, k, 0.0]])
+
+
+def test_grey_body_factor_matrix():
+    tn = ThermalNetwork()
+    tn.add_surfaces(["a", "b", "c", "d"], [2.0, 1.0, 2.0, 2.0], [0.5, 0.5, 0.8, 0.3])
+    tn.add_view_factor_matrix(["a", "b", "c", "d"], np.array([
+        [1/6, 1/6, 1/3, 1/3], [1/3, 0.0, 1/3, 1/3], [1/3, 1/6, 1/6, 1/3], [1/3, 1/6, 1/3, 1/6]]))
+
+    grey_body_factors = tn.get_grey_body_factor_matrix()
+    gbf_map = tn.get_grey_body_factors()
+    assert np.allclose(grey_body_factors, [[gbf_map[i][j] for j in "abcd"] for i in "abcd"])
+    assert np.allclose(grey_body_factors.sum(axis=1), 1.0)
+    radks = tn.get_radk_matrix()
+    assert np.allclose(radks, radks.T)
+
+
+def test_steady_radiation_shield():
+    solver = TemperatureSolver(shield_radks(), names=["hot", "shield", "cold"])
+    solver.set_temperature("hot", 500.0)
+    solver.set_temperature("cold", 300.0)
+    temperatures = solver.solve_steady()
+    assert np.isclose(temperatures[1], ((500.0**4 + 300.0**4) / 2.0)**0.25)
+    flows = solver.heat_flows(temperatures)
+    assert np.isclose(flows[0], -flows[2])
+    assert np.isclose(flows[1], 0.0, atol=1.0E-9)
+
+
+def test_steady_heat_load_and_conduction():
+    radks = shield_radks()
+    solver = TemperatureSolver(radks, names=["base", "plate", "sink"])
+    solver.set_temperature("base", 300.0)
+    solver.set_heat_load("plate", 100.0)
+    solver.set_heat_load("sink", 0.0)
+    temperatures = solver.solve_steady()
+    # the sink only exchanges with the plate, so it floats at its temperature
+    expected = (300.0**4 + 100.0 / (STEFAN_BOLTZMANN * 0.5))**0.25
+    assert np.allclose(temperatures, [300.0, expected, expected])
+
+    conductances = np.array([[0.0, 0.0, 2.0], [0.0, 0.0, 0.0], [2.0, 0.0, 0.0]])
+    solver = TemperatureSolver(radks, conductances=conductances)
+    solver.set_temperature(0, 300.0)
+    solver.set_heat_load(1, 100.0)
+    temperatures = solver.solve_steady()
+    assert np.allclose(solver.heat_flows(temperatures)[1:], [100.0, 0.0])
+
+    with pytest.raises(NoConvergenceException):
+        solver.solve_steady(max_iter=0)
+
+    floating = TemperatureSolver(radks)
+    with pytest.raises(SingularNetworkException):
+        floating.solve_steady()
+
+
+def test_transient_approaches_steady_state():
+    solver = TemperatureSolver(shield_radks(), capacities=[0.0, 2000.0, 0.0])
+    solver.set_temperature(0, 500.0)
+    solver.set_temperature(2, 300.0)
+    steady = solver.solve_steady()
+
+    with instrument() as report:
+        times, temperatures = solver.run_transient([500.0, 300.0, 300.0], 10.0, 200)
+    assert times[-1] == 2000.0
+    assert np.all(np.diff(temperatures[:, 1]) > 0.0)
+    assert np.isclose(temperatures[-1, 1], steady[1], rtol=1.0E-6)
+    assert report.counters["temperature/factorizations"] < 200
+
+    # one step against the explicit heat balance
+    start = temperatures[10]
+    end = solver.step(start, 10.0)
+    balance = 2000.0 * (end[1] - start[1]) / 10.0 + solver.heat_flows(end)[1]
+    assert np.isclose(balance, 0.0, atol=1.0E-8)
+
+
+def test_reradiating_surfaces_are_condensed():
+    names = ["a", "b", "c", "d"]
+    view_factors = np.array([[1/6, 1/6, 1/3, 1/3], [1/3, 0.0, 1/3, 1/3], [1/3, 1/6, 1/6, 1/3],
+                             [1/3, 1/6, 1/3, 1/6]])
+    tn = ThermalNetwork()
+    tn.add_surfaces(names, [2.0, 1.0, 2.0, 2.0], [0.5, 0.5, 0.8, 0.3])
+    tn.add_view_factor_matrix(names, view_factors)
+    tn.set_reradiating(["b", "d"])
+
+    reduced = tn.get_reduced_network()
+    assert list(reduced.surfaces) == ["a", "c"]
+    assert reduced.condensation.reradiating == ["b", "d"]
+    reduced_view_factors = reduced.get_view_factor_matrix()
+    assert np.allclose(reduced_view_factors.sum(axis=1), 1.0)
+    assert np.isclose(2.0 * reduced_view_factors[0, 1], 2.0 * reduced_view_factors[1, 0])
+
+    # the full network with adiabatic nodes gives the same heat flows and temperatures
+    full = TemperatureSolver.from_network(tn)
+    small = TemperatureSolver.from_network(reduced)
+    for solver in (full, small):
+        solver.set_temperature("a", 500.0)
+        solver.set_temperature("c", 300.0)
+    for name in ("b", "d"):
+        full.set_heat_load(name, 0.0)
+    temperatures = full.solve_steady()
+    reduced_temperatures = small.solve_steady()
+    assert np.allclose(full.heat_flows(temperatures)[[0, 2]], small.heat_flows(reduced_temperatures))
+    assert np.allclose(reduced.get_reradiating_temperatures(reduced_temperatures), temperatures[[1, 3]])
+
+    # the emissivity of a reradiating surface does not matter
+    tn.surfaces["b"].eps, tn.surfaces["b"].rho = 0.9, 0.1
+    assert np.allclose(tn.get_reduced_network().get_radk_matrix(), reduced.get_radk_matrix())
+
+    tn.set_reradiating(["a", "c"])
+    with pytest.raises(ValueError):
+        tn.get_reduced_network()
@@ -3,12 +3,16 @@
 
 """Tests for `thermal_radiation` package."""
 
+import os
 import pytest
+import numpy as np
 
 from click.testing import CliRunner
 
 from thermal_radiation import thermal_radiation
 from thermal_radiation import cli
+from thermal_radiation.exchange_io import read_exchange_matrix
+from thermal_radiation.view_factors import two_coaxial_parallel_plates
 
 
 @pytest.fixture
@@ -27,12 +31,113 @@ def test_content(response):
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
 
 
+PLATES_OBJ = """\
+# two coaxial unit squares facing each other a unit distance apart
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+g floor
+f 1 2 3 4
+g lid
+f 5 8 7 6
+"""
+
+
 def test_command_line_interface():
     """Test the CLI."""
     runner = CliRunner()
-    result = runner.invoke(cli.main)
-    assert result.exit_code == 0
-    assert 'thermal_radiation.cli.main' in result.output
     help_result = runner.invoke(cli.main, ['--help'])
     assert help_result.exit_code == 0
     assert '--help  Show this message and exit.' in help_result.output
+    assert 'run' in help_result.output
+
+
+class PlatesRun:
+    def __init__(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.mesh_path = tmpdir.join("plates.obj")
+        self.mesh_path.write(PLATES_OBJ)
+        self.output = str(tmpdir.join("plates.npz"))
+        self.args = ['run', str(self.mesh_path), '-o', self.output, '-e', 'floor=0.9', '--default-emissivity', '0.5',
+                     '-q', 'symmetric:7', '--cache-dir', str(tmpdir.join("cache")), '--quiet']
+        self.runner = CliRunner()
+
+    def __call__(self, *extra, args=None):
+        return self.runner.invoke(cli.main, (self.args if args is None else args) + list(extra))
+
+    def results(self):
+        with np.load(self.output) as results:
+            return dict(results)
+
+
+@pytest.fixture
+def plates(tmpdir):
+    return PlatesRun(tmpdir)
+
+
+EXPECTED = two_coaxial_parallel_plates(1.0, 1.0, 1.0)
+
+
+def test_run_pipeline(plates):
+    result = plates()
+    assert result.exit_code == cli.EXIT_OK, result.output
+
+    results = plates.results()
+    assert list(results["names"]) == ["floor", "lid"]
+    assert np.allclose(results["areas"], [1.0, 1.0])
+    assert np.allclose(results["view_factors"], [[0.0, EXPECTED], [EXPECTED, 0.0]], atol=1.0e-4)
+    assert np.allclose(results["eps"], [0.9, 0.5])
+    radks = results["radks"]
+    assert np.allclose(radks, radks.T)
+
+
+def test_run_out_of_core(plates):
+    assert plates().exit_code == cli.EXIT_OK
+    in_memory = plates.results()["view_factors"]
+    result = plates('--out-of-core', str(plates.tmpdir.join("F.npy")), '--ram-budget', '33')
+    assert result.exit_code == cli.EXIT_OK, result.output
+    assert np.allclose(plates.results()["view_factors"], in_memory)
+
+
+def test_run_reradiating(plates):
+    result = plates('--reradiating', 'lid')
+    assert result.exit_code == cli.EXIT_OK, result.output
+    results = plates.results()
+    assert list(results["active_names"]) == ["floor"]
+    assert np.allclose(results["reduced_view_factors"], EXPECTED**2)
+    assert results["radks"].shape == (1, 1)
+
+    result = plates('--reradiating', 'wall')
+    assert result.exit_code == cli.EXIT_INPUT
+
+
+def test_run_export_radks(plates):
+    radks_path = str(plates.tmpdir.join("radks.bin"))
+    result = plates('--export-radks', radks_path)
+    assert result.exit_code == cli.EXIT_OK, result.output
+    assert np.allclose(read_exchange_matrix(radks_path).to_sparse().toarray(), plates.results()["radks"])
+
+
+def test_run_tolerance_writes_nothing(plates):
+    result = plates('--tolerance', '0.1', '--jobs', '2')
+    assert result.exit_code == cli.EXIT_TOLERANCE
+    assert not os.path.exists(plates.output)
+
+
+def test_run_rejects_bad_emissivities(plates):
+    result = plates('-e', 'floor=dark')
+    assert result.exit_code == cli.EXIT_USAGE and 'floor=dark' in result.output
+
+    bad_properties = plates.tmpdir.join("bad.json")
+    bad_properties.write('{"emissivity": {"floor": 0.9,}}')
+    result = plates('--properties', str(bad_properties))
+    assert result.exit_code == cli.EXIT_USAGE and '--properties' in result.output
+
+    result = plates(args=['run', str(plates.mesh_path), '-o', plates.output, '--quiet'])
+    assert result.exit_code == cli.EXIT_INPUT
+    assert 'No emissivity' in result.output
@@ -0,0 +1,262 @@
+"""
+Vectorized assembly of element view factor matrices over a TriangleMesh.
+
+The pair kernel is the same fixed quadrature as
+geometry.get_fixed_triangle_view_factor, evaluated for many pairs at once with
+NumPy. Only the upper triangle is integrated, the lower triangle follows from
+reciprocity. Rows are processed in blocks which can be spread over a process
+pool.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from .cache import hash_key
+from .symmetry import expand_orbits
+from .precision import element_sizes, get_policy
+from . import instrumentation
+
+PAIR_CHUNK_BYTES = 32 * 2**20 # memory used by the kernel's temporaries
+
+
+def reference_points(quadrature):
+    """
+    Returns:
+        (array, array, array): xi, eta and weights of the quadrature rule on the
+            unit triangle. The weights sum to 1/2.
+    """
+    mapped = [quadrature.quad_domain_to_func_domain(*qp) for qp in quadrature.qps]
+    xi, eta = np.array(mapped, dtype=np.float64).reshape(-1, 2).T
+    return xi, eta, np.array(quadrature.weights, dtype=np.float64)
+
+
+def far_field_pairs(centroids, sizes, far_field_distance, from_indices, to_indices):
+    """
+    Returns:
+        array: Mask of the pairs whose centroid distance exceeds
+            far_field_distance times the sum of their element sizes.
+    """
+    separation = centroids[to_indices] - centroids[from_indices]
+    distance = np.sqrt(np.einsum("kd,kd->k", separation, separation))
+    size = sizes[from_indices] + sizes[to_indices]
+    return distance > far_field_distance * size
+
+
+class PairKernel:
+    def __init__(self, mesh, quadrature, precision=None):
+        """
+        Args:
+            mesh (TriangleMesh): The elements.
+            quadrature (Quadrature): The rule used on both elements of a pair,
+                or its reference_points.
+            precision (PrecisionPolicy): Dtypes of the kernel, DOUBLE by
+                default.
+        """
+        rule = quadrature if isinstance(quadrature, tuple) else reference_points(quadrature)
+        xi, eta, weights = rule
+        self.mesh = mesh
+        self.precision = get_policy(precision)
+        self.points = mesh.surface_locations(xi, eta) # (N, Q, 3)
+        self.weights = weights
+        self.n_qps = len(weights)
+        itemsize = self.precision.compute_dtype().itemsize
+        self.chunk = max(1, PAIR_CHUNK_BYTES // (self.n_qps * self.n_qps * itemsize * 6))
+
+        self.arrays = {} # dtype -> (points, normals, weights) in that dtype
+        self.sizes = None
+        if self.precision.far_field is not None:
+            self.sizes = element_sizes(mesh)
+
+    def get_arrays(self, dtype):
+        if dtype not in self.arrays:
+            self.arrays[dtype] = (self.points.astype(dtype, copy=False),
+                                  self.mesh.normals.astype(dtype, copy=False),
+                                  self.weights.astype(dtype, copy=False))
+        return self.arrays[dtype]
+
+    def far_field(self, from_indices, to_indices):
+        return far_field_pairs(self.mesh.centroids, self.sizes, self.precision.far_field_distance,
+                               from_indices, to_indices)
+
+    def __call__(self, from_indices, to_indices):
+        """
+        Args:
+            from_indices, to_indices (array): (K,) element indices of each pair.
+
+        Returns:
+            array: (K,) view factors from from_indices[k] to to_indices[k].
+                Pairs of an element with itself are zero.
+        """
+        from_indices = np.asarray(from_indices, dtype=np.intp)
+        to_indices = np.asarray(to_indices, dtype=np.intp)
+        view_factors = np.empty(len(from_indices), dtype=self.precision.accumulate)
+        compute = self.precision.compute_dtype()
+        for begin in range(0, len(from_indices), self.chunk):
+            end = begin + self.chunk
+            from_chunk, to_chunk = from_indices[begin:end], to_indices[begin:end]
+            if self.sizes is None:
+                view_factors[begin:end] = self._evaluate(from_chunk, to_chunk, compute)
+                continue
+            far = self.far_field(from_chunk, to_chunk)
+            near = ~far
+            chunk_view_factors = np.empty(len(from_chunk), dtype=self.precision.accumulate)
+            chunk_view_factors[near] = self._evaluate(from_chunk[near], to_chunk[near], compute)
+            chunk_view_factors[far] = self._evaluate(from_chunk[far], to_chunk[far], self.precision.far_field)
+            view_factors[begin:end] = chunk_view_factors
+            instrumentation.count("pairs/far_field", int(far.sum()))
+
+        if instrumentation.ENABLED:
+            instrumentation.count("pairs/vectorized", len(from_indices))
+            instrumentation.count("integrand_evaluations/vectorized", len(from_indices) * self.n_qps ** 2)
+        return view_factors
+
+    def _evaluate(self, from_indices, to_indices, dtype=np.float64):
+        points, normals, weights = self.get_arrays(dtype)
+        from_n = normals[from_indices]
+        to_n = normals[to_indices]
+
+        # s[k, p, q] goes from point p on the from element to point q on the to element
+        s = points[to_indices][:, np.newaxis, :, :] - points[from_indices][:, :, np.newaxis, :]
+        s_squared = np.einsum("kpqd,kpqd->kpq", s, s)
+        from_cos = np.einsum("kpqd,kd->kpq", s, from_n)
+        to_cos = np.einsum("kpqd,kd->kpq", s, to_n)
+
+        same = from_indices == to_indices
+        s_squared[same] = 1.0
+        kernel = (-1.0 / np.pi) * from_cos * to_cos / (s_squared * s_squared)
+        # sum over q in the compute dtype, over p in the accumulation dtype
+        accumulate = self.precision.accumulate
+        inner = kernel @ weights
+        integral = inner.astype(accumulate, copy=False) @ self.weights.astype(accumulate, copy=False)
+
+        view_factors = 4.0 * self.mesh.areas[to_indices] * integral
+        view_factors[same] = 0.0
+        return view_factors
+
+
+def upper_triangle_block(n, begin, end):
+    """
+    Returns:
+        (array, array): The (i, j) pairs with begin <= i < end and j > i.
+    """
+    rows, cols = [], []
+    for i in range(begin, end):
+        cols.append(np.arange(i + 1, n))
+        rows.append(np.full(n - i - 1, i))
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def row_blocks(n, n_blocks):
+    """
+    Splits the rows of the upper triangle into n_blocks contiguous blocks with
+    roughly the same number of pairs.
+    """
+    pairs_before = np.cumsum(np.arange(n - 1, -1, -1)) # pairs in rows < i + 1
+    total = pairs_before[-1] if n else 0
+    targets = np.linspace(0, total, n_blocks + 1)[1:-1]
+    bounds = np.searchsorted(pairs_before, targets, side="right") + 1
+    bounds = np.unique(np.concatenate(([0], np.minimum(bounds, n), [n])))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+_worker_kernel = None
+
+def _initialize_worker(vertices, quadrature, precision=None):
+    from .mesh import TriangleMesh
+    global _worker_kernel
+    _worker_kernel = PairKernel(TriangleMesh(vertices, validate=False), quadrature, precision)
+
+
+def _compute_block(n, begin, end):
+    rows, cols = upper_triangle_block(n, begin, end)
+    return begin, end, _worker_kernel(rows, cols)
+
+
+def assemble_symmetric_view_factor_matrix(mesh, quadrature, symmetry, progress=None, precision=None):
+    """
+    Integrates one pair per orbit of the symmetry group and scatters the
+    results to the rest of the orbit.
+    """
+    rep_rows, rep_cols, orbit, swapped = symmetry.pair_orbits(len(mesh))
+    kernel = PairKernel(mesh, quadrature, precision)
+    rep_view_factors = np.empty(len(rep_rows), dtype=kernel.precision.accumulate)
+    step = max(1, kernel.chunk)
+    for begin in range(0, len(rep_rows), step):
+        end = begin + step
+        rep_view_factors[begin:end] = kernel(rep_rows[begin:end], rep_cols[begin:end])
+        if progress is not None:
+            progress(min(end, len(rep_rows)), len(rep_rows))
+    instrumentation.count("pairs/symmetry_skipped", len(orbit) - len(rep_rows))
+
+    n = len(mesh)
+    rows, cols, values = expand_orbits(rep_view_factors, orbit, swapped, mesh.areas)
+    view_factors = np.zeros((n, n), dtype=kernel.precision.accumulate)
+    view_factors[rows, cols] = values
+    view_factors[cols, rows] = values * mesh.areas[rows] / mesh.areas[cols]
+    return view_factors
+
+
+def assemble_view_factor_matrix(mesh, quadrature, jobs=1, progress=None, cache=None,
+                                blocks_per_job=8, symmetry=None, precision=None):
+    """
+    Args:
+        mesh (TriangleMesh): The elements.
+        quadrature (Quadrature): The fixed rule used for every pair.
+        jobs (int): Number of worker processes. 1 computes in process.
+        progress (callable): Called with (pairs done, total pairs) after every
+            block.
+        cache (ViewFactorCache): Optional persistent cache of the result.
+        blocks_per_job (int): Row blocks per worker, for load balancing.
+        symmetry (SymmetryGroup): If given, only one pair per orbit is
+            integrated (in process).
+        precision (PrecisionPolicy): Dtypes of the pair kernel, DOUBLE by
+            default. The matrix is always in the accumulation dtype.
+
+    Returns:
+        array: (N, N) element view factor matrix.
+    """
+    precision = get_policy(precision)
+    key = None
+    if cache is not None:
+        tag = "assembly" if precision.is_double else f"assembly/{precision}"
+        key = hash_key(mesh.vertices, [quadrature], tag=tag)
+        cached = cache.get(key)
+        if cached is not None:
+            instrumentation.count("cache/hits")
+            return cached
+        instrumentation.count("cache/misses")
+
+    n = len(mesh)
+    total = n * (n - 1) // 2
+    view_factors = np.zeros((n, n), dtype=precision.accumulate)
+    done = 0
+
+    def scatter(begin, end, values):
+        rows, cols = upper_triangle_block(n, begin, end)
+        view_factors[rows, cols] = values
+        view_factors[cols, rows] = values * mesh.areas[rows] / mesh.areas[cols]
+        return len(values)
+
+    with instrumentation.stage("assembly"):
+        blocks = row_blocks(n, max(1, jobs * blocks_per_job))
+        if symmetry is not None and symmetry.order > 1:
+            view_factors = assemble_symmetric_view_factor_matrix(mesh, quadrature, symmetry, progress, precision)
+        elif jobs <= 1:
+            kernel = PairKernel(mesh, quadrature, precision)
+            for begin, end in blocks:
+                rows, cols = upper_triangle_block(n, begin, end)
+                done += scatter(begin, end, kernel(rows, cols))
+                if progress is not None:
+                    progress(done, total)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_initialize_worker,
+                                     initargs=(mesh.vertices, reference_points(quadrature), precision)) as executor:
+                futures = [executor.submit(_compute_block, n, begin, end) for begin, end in blocks]
+                for future in as_completed(futures):
+                    done += scatter(*future.result())
+                    if progress is not None:
+                        progress(done, total)
+
+    if cache is not None:
+        cache.put(key, view_factors)
+    return view_factors
@@ -0,0 +1,185 @@
+"""
+Content addressed, on-disk cache for assembled view factor results.
+
+Results are keyed by a hash of the element vertices and the quadrature
+configuration used to integrate them and are stored as ``.npy`` files so that
+they can be memory mapped on load. Writers go through a temporary file and an
+atomic rename so that several processes may share a cache directory.
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".npy"
+
+
+def quadrature_signature(quadrature):
+    """
+    Args:
+        quadrature (Quadrature): The quadrature rule, or None.
+
+    Returns:
+        str: A digest identifying the quadrature points and weights.
+    """
+    digest = hashlib.sha256()
+    digest.update(type(quadrature).__name__.encode())
+    if quadrature is not None:
+        digest.update(np.ascontiguousarray(quadrature.qps, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(quadrature.weights, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def hash_key(vertices, quadratures, tag=""):
+    """
+    Args:
+        vertices (array): The (N, 3, 3) array of element vertices.
+        quadratures (list): The quadrature rules used in the computation.
+        tag (str): Distinguishes different kinds of results for the same input.
+
+    Returns:
+        str: The content address of the result.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}:{tag}:{vertices.shape}".encode())
+    digest.update(vertices.tobytes())
+    for quadrature in quadratures:
+        digest.update(quadrature_signature(quadrature).encode())
+    return digest.hexdigest()
+
+
+class ViewFactorCache:
+    def __init__(self, directory, max_bytes=None):
+        """
+        Args:
+            directory (str): Where the cached arrays are stored. Created if it
+                does not exist.
+            max_bytes (int): The size the cache is trimmed to once a write
+                takes it over the limit. The least recently used entries are
+                evicted first. None disables eviction.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tracked_bytes = None # size of the directory as of the last scan plus our writes since
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        Returns:
+            array: A read-only memory map of the cached array or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path) # mark as recently used for eviction
+        except OSError:
+            pass
+        return array
+
+    def put(self, key, array):
+        """
+        Stores the array under key. The directory is only scanned for eviction
+        when the running size total crosses max_bytes, not on every write;
+        entries written by other processes are counted at the next scan.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        path = self.path(key)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                np.save(tmp_file, np.asarray(array))
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+                size = tmp_file.tell()
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.max_bytes is None:
+            return
+        if self.tracked_bytes is None:
+            self.tracked_bytes = self.size()
+        else:
+            self.tracked_bytes += size - replaced
+        if self.tracked_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """
+        Returns:
+            list: (mtime, size, path) of every entry, oldest first.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(CACHE_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError: # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Removes the least recently used entries until the cache holds at most
+        max_bytes, self.max_bytes by default.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.tracked_bytes = total
+
+    def clear(self):
+        self.evict(max_bytes=0)
+
+
+def cached_view_factor_function(view_factor_function, cache, quadrature=None):
+    """
+    Wraps a pair view factor function, e.g. the one returned by
+    get_fixed_triangle_view_factor, so that its results are persisted in cache.
+    """
+    tag = getattr(view_factor_function, "__name__", "pair")
+
+    def view_factor(from_triangle, to_triangle):
+        vertices = [[from_triangle.a, from_triangle.b, from_triangle.c],
+                    [to_triangle.a, to_triangle.b, to_triangle.c]]
+        key = hash_key(vertices, [quadrature], tag=tag)
+        cached = cache.get(key)
+        if cached is not None:
+            return float(cached)
+        result = view_factor_function(from_triangle, to_triangle)
+        cache.put(key, np.float64(result))
+        return result
+
+    return view_factor
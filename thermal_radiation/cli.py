@@ -2,15 +2,367 @@
 
 """Console script for thermal_radiation."""
 
+import os
+import sys
+import json
+
 import click
+import numpy as np
+
+from .assembly import assemble_view_factor_matrix
+from .cache import ViewFactorCache
+from .exchange_io import write_exchange_matrix
+from .hierarchy import SurfaceIndex, build_thermal_network, lookup_emissivity
+from .mesh import TriangleMesh, DegenerateTrianglesException
+from .mesh_io import MeshFormatError, build_surfaces, read_mesh
+from .out_of_core import OutOfCoreMatrix, assemble_out_of_core
+from .server import Server, serve_socket, serve_stdio
+from .sharding import ShardMismatchException, compute_shard, merge_shards
+from .quadrature_2d import get_quadrature
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2 # click's code for bad command line arguments
+EXIT_INPUT = 3 # the mesh or properties could not be used
+EXIT_TOLERANCE = 4 # view factors failed the closure tolerance
+
+
+class InputError(Exception):
+    pass
+
+
+def parse_quadrature(spec):
+    """
+    Args:
+        spec (str): "<rule>:<order>", e.g. "symmetric:7" or "tensor:6".
+    """
+    try:
+        return get_quadrature(spec)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc))
+
+
+def parse_emissivities(pairs, properties_path):
+    emissivities = {}
+    if properties_path is not None:
+        try:
+            with open(properties_path) as properties_file:
+                properties = json.load(properties_file)
+            for name, value in properties.get("emissivity", {}).items():
+                emissivities[name] = float(value)
+        except (ValueError, TypeError, AttributeError) as exc: # JSONDecodeError is a ValueError
+            raise click.BadParameter(f"{properties_path} is not a JSON object with an \"emissivity\" "
+                                     f"object of numbers: {exc}", param_hint="--properties")
+    for pair in pairs:
+        name, _, value = pair.rpartition("=")
+        if not name:
+            raise click.BadParameter(f"expected NAME=EPS, got \"{pair}\"", param_hint="--emissivity")
+        try:
+            emissivities[name] = float(value)
+        except ValueError:
+            raise click.BadParameter(f"expected a number after \"=\", got \"{pair}\"", param_hint="--emissivity")
+    return emissivities
+
+
+class Progress:
+    def __init__(self, label, enabled):
+        self.bar = None
+        self.label = label
+        self.enabled = enabled
+        self.done = 0
+
+    def __call__(self, done, total):
+        if not self.enabled:
+            return
+        if self.bar is None:
+            self.bar = click.progressbar(length=total, label=self.label, show_eta=True,
+                                         show_percent=True, file=sys.stderr)
+            self.bar.__enter__()
+        self.bar.update(done - self.done)
+        self.done = done
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.__exit__(None, None, None)
+
+
+def log(message, quiet):
+    if not quiet:
+        click.echo(message, err=True)
+
+
+def run_pipeline(mesh_path, output, quadrature, emissivities, default_eps, jobs,
+                 cache_dir, cache_size, tolerance, save_elements, quiet, level=0, precision=None,
+                 out_of_core=None, ram_budget=None, drop_tolerance=None, element_matrix=None, reradiating=(),
+                 export_radks=None, export_grey_body_factors=None, export_threshold=0.0):
+    try:
+        mesh_data = read_mesh(mesh_path)
+        mesh = TriangleMesh.from_mesh_data(mesh_data)
+    except (MeshFormatError, DegenerateTrianglesException, OSError) as exc:
+        raise InputError(str(exc))
+    index = SurfaceIndex(build_surfaces(mesh_data))
+    names, _ = index.level(level)
+    log(f"{len(mesh)} elements in {len(names)} surfaces", quiet)
+
+    unknown = [name for name in reradiating if name not in names]
+    if unknown:
+        raise InputError(f"No surface(s) {', '.join(unknown)} to make reradiating")
+    # the emissivity of a reradiating surface does not enter the result
+    emissivities = dict(emissivities, **{name : 1.0 for name in reradiating if name not in emissivities})
 
+    missing = []
+    for name in names:
+        try:
+            lookup_emissivity(emissivities, name, default_eps)
+        except KeyError:
+            missing.append(name)
+    if missing:
+        raise InputError(f"No emissivity given for surface(s): {', '.join(missing)}")
 
-@click.command()
+    cache = None
+    if cache_dir is not None:
+        max_bytes = None if cache_size is None else int(cache_size * 2**20)
+        cache = ViewFactorCache(cache_dir, max_bytes=max_bytes)
+
+    progress = Progress("view factors", not quiet)
+    try:
+        if element_matrix is not None:
+            element_view_factors = OutOfCoreMatrix(element_matrix)
+            if element_view_factors.shape != (len(mesh), len(mesh)):
+                raise InputError(f"{element_matrix} is {element_view_factors.shape[0]}x"
+                                 f"{element_view_factors.shape[1]}, the mesh has {len(mesh)} elements")
+        elif out_of_core is not None:
+            element_view_factors = assemble_out_of_core(mesh, quadrature, out_of_core,
+                                                        ram_budget=int(ram_budget * 2**20),
+                                                        drop_tolerance=drop_tolerance, jobs=jobs,
+                                                        precision=precision, progress=progress)
+        else:
+            element_view_factors = assemble_view_factor_matrix(mesh, quadrature, jobs=jobs,
+                                                               progress=progress, cache=cache, precision=precision)
+    finally:
+        progress.close()
+
+    tn = build_thermal_network(index, element_view_factors, mesh.areas, emissivities, level=level,
+                               default_eps=default_eps, name=os.path.basename(mesh_path))
+    areas = tn.get_areas()
+    eps = np.array([surface.eps for surface in tn.surfaces.values()])
+    view_factors = tn.get_view_factor_matrix()
+    if tolerance is not None: # checked before anything is written
+        closure = np.abs(1.0 - view_factors.sum(axis=1))
+        worst = int(np.argmax(closure)) if len(closure) else 0
+        if len(closure) and closure[worst] > tolerance:
+            log(f"view factors from {names[worst]} sum to {1.0 - closure[worst]:.6g}, "
+                f"outside the tolerance {tolerance:g}, no results written", False)
+            return EXIT_TOLERANCE
+
+    outputs = {
+        "names" : np.array(names),
+        "areas" : areas,
+        "eps" : eps,
+        "view_factors" : view_factors,
+    }
+    if reradiating:
+        tn.set_reradiating(reradiating)
+        reduced = tn.get_reduced_network()
+        outputs["active_names"] = np.array(reduced.condensation.active)
+        outputs["reradiating_names"] = np.array(reduced.condensation.reradiating)
+        outputs["reradiating_weights"] = reduced.condensation.weights
+        outputs["reduced_view_factors"] = reduced.get_view_factor_matrix()
+        tn = reduced
+    grey_body_factors = tn.get_grey_body_factor_matrix()
+    outputs["grey_body_factors"] = grey_body_factors
+    outputs["radks"] = tn.get_radk_matrix(grey_body_factors)
+    if save_elements and out_of_core is None and element_matrix is None:
+        outputs["element_view_factors"] = element_view_factors
+    np.savez_compressed(output, **outputs)
+    log(f"wrote {output}", quiet)
+    exported = list(tn.surfaces)
+    if export_radks is not None:
+        write_exchange_matrix(export_radks, exported, outputs["radks"], "radks", export_threshold, upper=True)
+        log(f"wrote {export_radks}", quiet)
+    if export_grey_body_factors is not None:
+        write_exchange_matrix(export_grey_body_factors, exported, grey_body_factors, "grey_body_factors",
+                              export_threshold)
+        log(f"wrote {export_grey_body_factors}", quiet)
+    return EXIT_OK
+
+
+@click.group()
 def main(args=None):
     """Console script for thermal_radiation."""
-    click.echo("Replace this message by putting your code into "
-               "thermal_radiation.cli.main")
-    click.echo("See click documentation at http://click.pocoo.org/")
+
+
+@main.command()
+@click.argument("mesh", type=click.Path(exists=True, dir_okay=False))
+@click.option("-o", "--output", default=None, type=click.Path(dir_okay=False),
+              help="Output .npz file. Defaults to the mesh name with an .npz suffix.")
+@click.option("-e", "--emissivity", "emissivities", multiple=True, metavar="NAME=EPS",
+              help="Emissivity of a surface group. May be repeated.")
+@click.option("--default-emissivity", type=float, default=None,
+              help="Emissivity of surfaces not given by --emissivity.")
+@click.option("--properties", type=click.Path(exists=True, dir_okay=False),
+              help="JSON file with an \"emissivity\" object mapping surface names to values.")
+@click.option("-q", "--quadrature", default="symmetric:4", show_default=True,
+              help="Fixed quadrature rule, symmetric:<order> or tensor:<order>.")
+@click.option("--precision", default="double", show_default=True,
+              type=click.Choice(["double", "mixed", "single"]),
+              help="Precision policy of the view factor kernel.")
+@click.option("-j", "--jobs", default=1, show_default=True, type=click.IntRange(1),
+              help="Worker processes used for the view factor assembly.")
+@click.option("--cache-dir", type=click.Path(file_okay=False),
+              help="Directory of the persistent view factor cache.")
+@click.option("--cache-size", type=float, default=None,
+              help="Maximum cache size in MiB.")
+@click.option("--tolerance", type=float, default=None,
+              help="Fail with exit code 4 if a surface's view factors do not sum to 1 within this.")
+@click.option("--level", default=0, show_default=True, type=click.IntRange(0),
+              help="Depth of the group hierarchy (\"/\" separated group names) to report surfaces at.")
+@click.option("--save-elements", is_flag=True,
+              help="Also store the element view factor matrix.")
+@click.option("--out-of-core", type=click.Path(),
+              help="Assemble the element view factors in row blocks into this .npy file (or directory "
+                   "with --drop-tolerance) instead of memory. Bypasses the cache.")
+@click.option("--ram-budget", type=float, default=256.0, show_default=True,
+              help="Memory in MiB the out-of-core assembly may use.")
+@click.option("--drop-tolerance", type=float, default=None,
+              help="Store the out-of-core matrix sparse, without view factors below this.")
+@click.option("--element-matrix", type=click.Path(exists=True),
+              help="Use this element view factor matrix, e.g. from merge or --out-of-core, instead of "
+                   "assembling one.")
+@click.option("--reradiating", multiple=True, metavar="NAME",
+              help="Insulated surface to eliminate; grey body factors and radks are then those of the "
+                   "active surfaces only. May be repeated.")
+@click.option("--export-radks", type=click.Path(dir_okay=False),
+              help="Also write the radks as a binary sparse upper triangle, see exchange_io.")
+@click.option("--export-gbf", "export_grey_body_factors", type=click.Path(dir_okay=False),
+              help="Also write the grey body factors as a binary sparse matrix.")
+@click.option("--export-threshold", type=float, default=0.0, show_default=True,
+              help="Entries of the exported matrices at or below this are dropped.")
+@click.option("--quiet", is_flag=True, help="No progress output.")
+def run(mesh, output, emissivities, default_emissivity, properties, quadrature, precision, jobs,
+        cache_dir, cache_size, tolerance, level, save_elements, out_of_core, ram_budget, drop_tolerance,
+        element_matrix, reradiating, export_radks, export_grey_body_factors, export_threshold, quiet):
+    """
+    Computes view factors, grey body factors and radks for the surface groups
+    of an STL or OBJ MESH.
+
+    Exit codes: 0 success, 1 unexpected failure, 2 bad arguments, 3 unusable
+    input, 4 closure tolerance exceeded.
+    """
+    quadrature_rule = parse_quadrature(quadrature)
+    emissivity_map = parse_emissivities(emissivities, properties)
+    output = output if output is not None else os.path.splitext(mesh)[0] + ".npz"
+
+    try:
+        code = run_pipeline(mesh, output, quadrature_rule, emissivity_map, default_emissivity,
+                            jobs, cache_dir, cache_size, tolerance, save_elements, quiet, level,
+                            precision, out_of_core, ram_budget, drop_tolerance, element_matrix, reradiating,
+                            export_radks, export_grey_body_factors, export_threshold)
+    except InputError as exc:
+        click.echo(f"Error: {exc}", err=True)
+        sys.exit(EXIT_INPUT)
+    except Exception as exc:
+        click.echo(f"Error: {exc}", err=True)
+        sys.exit(EXIT_FAILURE)
+    sys.exit(code)
+
+
+@main.command()
+@click.argument("mesh", type=click.Path(exists=True, dir_okay=False))
+@click.option("--shard", "shard_index", required=True, type=click.IntRange(0),
+              help="Index of the shard to compute, from 0.")
+@click.option("--shards", "n_shards", required=True, type=click.IntRange(1),
+              help="Total number of shards.")
+@click.option("-o", "--output", default=None, type=click.Path(dir_okay=False),
+              help="Output partial. Defaults to the mesh name with a .shard<K>of<S>.npz suffix.")
+@click.option("-q", "--quadrature", default="symmetric:4", show_default=True,
+              help="Fixed quadrature rule, symmetric:<order> or tensor:<order>.")
+@click.option("--precision", default="double", show_default=True,
+              type=click.Choice(["double", "mixed", "single"]),
+              help="Precision policy of the view factor kernel.")
+@click.option("-j", "--jobs", default=1, show_default=True, type=click.IntRange(1),
+              help="Worker processes of this shard.")
+@click.option("--quiet", is_flag=True, help="No progress output.")
+def shard(mesh, shard_index, n_shards, output, quadrature, precision, jobs, quiet):
+    """
+    Computes one shard of the element view factors of MESH for a batch
+    cluster. Every shard of the same mesh, rule and precision computes a
+    disjoint range of element pairs of about the same cost; combine them with
+    the merge command.
+    """
+    quadrature_rule = parse_quadrature(quadrature)
+    if shard_index >= n_shards:
+        raise click.BadParameter(f"must be below --shards {n_shards}", param_hint="--shard")
+    output = output if output is not None else \
+        f"{os.path.splitext(mesh)[0]}.shard{shard_index}of{n_shards}.npz"
+
+    progress = Progress(f"shard {shard_index}/{n_shards}", not quiet)
+    try:
+        mesh_data = read_mesh(mesh)
+        elements = TriangleMesh.from_mesh_data(mesh_data)
+        begin, end = compute_shard(elements, quadrature_rule, shard_index, n_shards, output, jobs=jobs,
+                                   precision=precision, progress=progress)
+    except (MeshFormatError, DegenerateTrianglesException, OSError) as exc:
+        click.echo(f"Error: {exc}", err=True)
+        sys.exit(EXIT_INPUT)
+    finally:
+        progress.close()
+    log(f"rows {begin} to {end} of {len(elements)}, wrote {output}", quiet)
+    sys.exit(EXIT_OK)
+
+
+@main.command()
+@click.argument("partials", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("-o", "--output", required=True, type=click.Path(dir_okay=False),
+              help="Output .npy element view factor matrix, memory-mapped while merging.")
+@click.option("--quiet", is_flag=True, help="No progress output.")
+def merge(partials, output, quiet):
+    """
+    Validates the PARTIALS written by the shard command and combines them
+    into the element view factor matrix, for run --element-matrix.
+    """
+    try:
+        view_factors = merge_shards(list(partials), output)
+    except (ShardMismatchException, ValueError, OSError) as exc:
+        click.echo(f"Error: {exc}", err=True)
+        sys.exit(EXIT_INPUT)
+    log(f"merged {len(partials)} shard(s) of a {len(view_factors)}x{len(view_factors)} matrix into {output}",
+        quiet)
+    sys.exit(EXIT_OK)
+
+
+@main.command()
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              help="Listen on this Unix socket instead of stdin/stdout.")
+@click.option("--port", type=click.IntRange(0, 65535), default=None,
+              help="Listen on this loopback TCP port instead of stdin/stdout.")
+@click.option("--warm", multiple=True, default=["symmetric:4"], show_default=True,
+              help="Quadrature rule to construct at startup. May be repeated.")
+@click.option("--cache-dir", type=click.Path(file_okay=False),
+              help="Directory of the persistent view factor cache.")
+@click.option("--max-meshes", default=8, show_default=True, type=click.IntRange(1),
+              help="Meshes kept loaded.")
+def serve(socket_path, port, warm, cache_dir, max_meshes):
+    """
+    Runs a long-lived worker answering JSON line requests (view factors,
+    surface view factors, Gebhart factors) with warm quadrature rules, meshes
+    and kernels. See thermal_radiation.server for the protocol.
+    """
+    if socket_path is not None and port is not None:
+        raise click.UsageError("--socket and --port are exclusive")
+    for spec in warm:
+        parse_quadrature(spec)
+    cache = ViewFactorCache(cache_dir) if cache_dir is not None else None
+    server = Server(warm=warm, max_meshes=max_meshes, cache=cache)
+
+    if socket_path is not None:
+        serve_socket(server, socket_path, ready=lambda address: log(f"listening on {address}", False))
+    elif port is not None:
+        serve_socket(server, ("127.0.0.1", port), ready=lambda address: log(f"listening on {address}", False))
+    else:
+        serve_stdio(server)
+    sys.exit(EXIT_OK)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Post-correction of view factor matrices so that they satisfy reciprocity,
+
+    A_i F_ij = A_j F_ji,
+
+and, for enclosures, closure,
+
+    sum_j F_ij = 1.
+
+Low order quadrature rules violate both. The correction works on the exchange
+area matrix S_ij = A_i F_ij. It is first symmetrized, which is the least
+squares closest reciprocal matrix, then the smallest weighted least squares
+symmetric perturbation D restoring closure is found,
+
+    minimize   sum_ij D_ij^2 / S_ij
+    subject to sum_j (S_ij + D_ij) = A_i,  D_ij = D_ji.
+
+The stationarity conditions give D_ij = S_ij (l_i + l_j) for Lagrange
+multipliers l, so zero entries stay zero and the relative change of every
+entry is l_i + l_j. When that exceeds max_relative_change the entry is clamped
+at the bound and the remaining entries are re-solved.
+"""
+import warnings
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve, lsqr
+from . import instrumentation
+
+CLOSURE_TOL = 1.0E-10
+
+
+def reciprocity_residual(view_factors, areas):
+    """
+    Returns:
+        float: max |A_i F_ij - A_j F_ji| / max(A_i).
+    """
+    areas = np.asarray(areas, dtype=np.float64)
+    exchange = sparse.diags(areas) @ view_factors
+    difference = exchange - exchange.T
+    difference = difference.toarray() if sparse.issparse(difference) else difference
+    return np.abs(difference).max() / areas.max()
+
+
+def closure_residual(view_factors):
+    """
+    Returns:
+        array: 1 - sum_j F_ij for every row.
+    """
+    return 1.0 - np.asarray(view_factors.sum(axis=1)).reshape(-1)
+
+
+def solve_multipliers(rows, cols, weights, residual, n):
+    diagonal = np.bincount(rows, weights=weights, minlength=n)
+    isolated = diagonal <= 0.0 # rows with nothing left to adjust
+    diagonal[isolated] = 1.0
+    residual = np.where(isolated, 0.0, residual)
+
+    system = sparse.csr_matrix((weights, (rows, cols)), shape=(n, n))
+    system = (system + sparse.diags(diagonal)).tocsc()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error") # singular systems only warn
+        try:
+            multipliers = spsolve(system, residual)
+            if np.all(np.isfinite(multipliers)):
+                return multipliers
+        except Exception:
+            pass
+    return lsqr(system, residual, atol=1.0E-14, btol=1.0E-14)[0]
+
+
+def enforce_reciprocity_and_closure(view_factors, areas, closure=True,
+                                    max_relative_change=0.5, max_iter=50):
+    """
+    Args:
+        view_factors (array or sparse matrix): (N, N) element or surface view
+            factors, F[i, j] being the view factor from i to j.
+        areas (array): (N,) areas.
+        closure (bool): Also enforce that every row sums to one. Only valid
+            for enclosures.
+        max_relative_change (float): Bound on |D_ij| / S_ij. None for no bound.
+        max_iter (int): Maximum number of clamp and re-solve passes.
+
+    Returns:
+        array or sparse matrix: The corrected view factors, of the same kind as
+            the input.
+    """
+    with instrumentation.stage("correction"):
+        return _enforce_reciprocity_and_closure(view_factors, areas, closure,
+                                                max_relative_change, max_iter)
+
+
+def _enforce_reciprocity_and_closure(view_factors, areas, closure, max_relative_change, max_iter):
+    is_sparse = sparse.issparse(view_factors)
+    areas = np.asarray(areas, dtype=np.float64)
+    n = len(areas)
+
+    exchange = sparse.coo_matrix(sparse.diags(areas) @ sparse.csr_matrix(view_factors))
+    exchange = sparse.coo_matrix(0.5 * (exchange + exchange.T))
+    exchange.sum_duplicates()
+    rows, cols, values = exchange.row, exchange.col, exchange.data
+
+    if closure:
+        weights = np.abs(values)
+        free = weights > 0.0
+        perturbation = np.zeros_like(values)
+        bound = np.inf if max_relative_change is None else max_relative_change
+
+        for _ in range(max_iter):
+            fixed_sums = np.bincount(rows, weights=values + perturbation * ~free, minlength=n)
+            residual = areas - fixed_sums
+            free_weights = np.where(free, weights, 0.0)
+            multipliers = solve_multipliers(rows, cols, free_weights, residual, n)
+            relative = multipliers[rows] + multipliers[cols]
+
+            over = free & (np.abs(relative) > bound)
+            if not over.any():
+                perturbation = np.where(free, free_weights * relative, perturbation)
+                break
+
+            perturbation[over] = np.sign(relative[over]) * bound * weights[over]
+            free &= ~over
+        else:
+            perturbation = np.where(free, free_weights * relative, perturbation)
+
+        values = values + perturbation
+
+    corrected = sparse.csr_matrix((values / areas[rows], (rows, cols)), shape=(n, n))
+
+    if closure:
+        worst = np.abs(closure_residual(corrected)).max() if n else 0.0
+        if worst > CLOSURE_TOL:
+            warnings.warn(f"Closure could only be enforced to {worst:.3e} within the perturbation bound.")
+
+    return corrected if is_sparse else corrected.toarray()
@@ -0,0 +1,156 @@
+"""
+A posteriori error estimates of fixed quadrature view factors.
+
+A pair is evaluated with consecutive rules of a ladder, e.g. Dunavant degree
+n and n + 2 or tensor Gauss-Legendre n and n + 1. The difference between
+two rungs estimates the error of the lower one and, conservatively, of the
+higher one, which is the value reported. Two rules can agree by chance
+before they are in their asymptotic regime, so the estimate is the larger
+of the last two differences, and a pair is only accepted from the third rung
+on. Pairs whose estimate is within
+
+    max(atol, rtol |F_ij|)
+
+stop there. Only the remaining pairs are escalated to the next rung, whose
+comparison reuses the evaluation of the current one, so every rung costs one
+new evaluation of the still active pairs.
+
+For an assembly, the per-pair estimates form an error map E with the same
+reciprocity as F, E_ji = E_ij A_i / A_j. Its largest row sum bounds the
+error of every row sum of F (the closure) and the infinity norm of the
+error of F, as far as the estimates hold.
+"""
+import numpy as np
+from .assembly import PairKernel, row_blocks, upper_triangle_block
+from .mesh import as_mesh
+from .quadrature_2d import get_quadrature
+from . import instrumentation
+
+SYMMETRIC_LADDER = ("symmetric:1", "symmetric:3", "symmetric:5", "symmetric:7", "symmetric:9", "symmetric:11",
+                    "symmetric:13")
+TENSOR_LADDER = tuple(f"tensor:{order}" for order in range(1, 13))
+DEFAULT_ATOL = 1.0E-6
+
+
+class EstimatedViewFactors:
+    def __init__(self, view_factors, errors, rungs, converged):
+        """
+        Args:
+            view_factors (array): (K,) the value of the last rung evaluated.
+            errors (array): (K,) estimated absolute errors.
+            rungs (array): (K,) index into the ladder of the reported value.
+            converged (array): (K,) mask of pairs within the tolerance.
+        """
+        self.view_factors = view_factors
+        self.errors = errors
+        self.rungs = rungs
+        self.converged = converged
+
+
+class EscalatingKernel:
+    def __init__(self, mesh, ladder=SYMMETRIC_LADDER, atol=DEFAULT_ATOL, rtol=0.0, precision=None):
+        """
+        Args:
+            mesh (TriangleMesh): The elements.
+            ladder (list): Quadrature specs (see quadrature_2d.get_quadrature)
+                or Quadratures of increasing order, at least two.
+            atol, rtol (float): A pair is accepted once its estimated error
+                is within max(atol, rtol |F_ij|).
+        """
+        if len(ladder) < 2:
+            raise ValueError("An error estimate needs a ladder of at least two rules")
+        self.mesh = mesh
+        self.ladder = [get_quadrature(rule) if isinstance(rule, str) else rule for rule in ladder]
+        self.atol = atol
+        self.rtol = rtol
+        self.precision = precision
+        self.kernels = {} # rung -> PairKernel, built when first needed
+
+    def get_kernel(self, rung):
+        if rung not in self.kernels:
+            self.kernels[rung] = PairKernel(self.mesh, self.ladder[rung], self.precision)
+        return self.kernels[rung]
+
+    def __call__(self, from_indices, to_indices):
+        """
+        Returns:
+            EstimatedViewFactors
+        """
+        from_indices = np.asarray(from_indices, dtype=np.intp)
+        to_indices = np.asarray(to_indices, dtype=np.intp)
+        n_pairs = len(from_indices)
+        current = self.get_kernel(0)(from_indices, to_indices)
+        view_factors = current.astype(np.float64)
+        errors = np.full(n_pairs, np.inf)
+        rungs = np.zeros(n_pairs, dtype=np.intp)
+        converged = np.zeros(n_pairs, dtype=bool)
+
+        active = np.arange(n_pairs)
+        previous = np.zeros(n_pairs) # difference of the previous two rungs
+        for rung in range(1, len(self.ladder)):
+            if not len(active):
+                break
+            finer = self.get_kernel(rung)(from_indices[active], to_indices[active])
+            difference = np.abs(finer - current)
+            estimate = np.maximum(difference, previous) if rung > 1 else difference
+            view_factors[active] = finer
+            errors[active] = estimate
+            rungs[active] = rung
+            accepted = estimate <= np.maximum(self.atol, self.rtol * np.abs(finer))
+            if rung == 1 and len(self.ladder) > 2:
+                accepted[:] = False
+            converged[active[accepted]] = True
+            instrumentation.count("pairs/escalated", int((~accepted).sum()))
+            active, current, previous = active[~accepted], finer[~accepted], difference[~accepted]
+        return EstimatedViewFactors(view_factors, errors, rungs, converged)
+
+
+def assemble_with_error_estimates(mesh, ladder=SYMMETRIC_LADDER, atol=DEFAULT_ATOL, rtol=0.0, precision=None,
+                                  progress=None, blocks=16):
+    """
+    Assembles the element view factors, escalating only the pairs whose
+    estimated error exceeds the tolerance.
+
+    Returns:
+        (array, array, float): (N, N) view factors, (N, N) error map and the
+            global bound max_i sum_j E_ij.
+    """
+    n = len(mesh)
+    kernel = EscalatingKernel(mesh, ladder, atol, rtol, precision)
+    view_factors = np.zeros((n, n))
+    errors = np.zeros((n, n))
+    unconverged = 0
+    done = 0
+    total = n * (n - 1) // 2
+
+    with instrumentation.stage("assembly_estimated"):
+        for begin, end in row_blocks(n, blocks):
+            rows, cols = upper_triangle_block(n, begin, end)
+            estimated = kernel(rows, cols)
+            ratio = mesh.areas[rows] / mesh.areas[cols]
+            view_factors[rows, cols] = estimated.view_factors
+            view_factors[cols, rows] = estimated.view_factors * ratio
+            errors[rows, cols] = estimated.errors
+            errors[cols, rows] = estimated.errors * ratio
+            unconverged += int((~estimated.converged).sum())
+            done += len(rows)
+            if progress is not None:
+                progress(done, total)
+    instrumentation.count("pairs/unconverged", unconverged)
+    return view_factors, errors, float(errors.sum(axis=1).max()) if n else 0.0
+
+
+def get_estimated_triangle_view_factor(ladder=SYMMETRIC_LADDER, atol=DEFAULT_ATOL, rtol=0.0):
+    """
+    The counterpart of geometry.get_fixed_triangle_view_factor with an error
+    estimate.
+
+    Returns:
+        callable: (from_triangle, to_triangle) -> (view factor, estimated
+            error).
+    """
+    def triangle_view_factor(from_triangle, to_triangle):
+        kernel = EscalatingKernel(as_mesh([from_triangle, to_triangle]), ladder, atol, rtol)
+        estimated = kernel([0], [1])
+        return float(estimated.view_factors[0]), float(estimated.errors[0])
+    return triangle_view_factor
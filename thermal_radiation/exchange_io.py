@@ -0,0 +1,290 @@
+"""
+Compact binary storage of surface exchange matrices (radks and grey body
+factors) for downstream solvers.
+
+A matrix is written as a thresholded CSR in a single file:
+
+    magic | data (float64, nnz) | indices (nnz) | indptr (n + 1) | metadata | footer
+
+The index arrays are int32, or int64 when the matrix is too large. The
+metadata is JSON with the surface names (the row and column order) and the
+kind of matrix. The fixed size footer at the end holds the offsets of the
+sections, so rows can be streamed into the file without knowing the number of
+entries in advance: the values go straight to the file, the column indices to
+a spill file that is appended when the writer is closed. Every section starts
+on an 8 byte boundary, so read_exchange_matrix maps the arrays without
+copying them.
+
+Radks are symmetric, so they can be stored as their upper triangle only,
+diagonal included.
+"""
+import os
+import json
+import struct
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from . import instrumentation
+
+EXCHANGE_MAGIC = b"TRXCSR01"
+EXCHANGE_VERSION = 1
+FOOTER = struct.Struct("<7Q2I8s") # n, nnz, 5 section offsets/lengths, version, flags, magic
+FLAG_UPPER = 1 # only the upper triangle is stored
+FLAG_INT64 = 2 # int64 index arrays
+DEFAULT_EXPORT_BLOCK_ROWS = 256
+SPILL_CHUNK = 2**20 # column indices converted per write when the writer is closed
+
+
+class ExchangeFormatError(Exception):
+    def __init__(self, path, reason):
+        self.path = path
+        Exception.__init__(self, f"{path}: {reason}")
+
+
+def _pad(outfile):
+    remainder = outfile.tell() % 8
+    if remainder:
+        outfile.write(b"\0" * (8 - remainder))
+
+
+class ExchangeWriter:
+    def __init__(self, path, names, kind="radks", threshold=0.0, upper=False):
+        """
+        Streams the rows of an exchange matrix to a file, in order.
+
+        Args:
+            path (str): The file to write.
+            names (list): The surface of every row and column.
+            kind (str): What the matrix holds, e.g. "radks" or
+                "grey_body_factors".
+            threshold (float): Entries whose magnitude is at or below this are
+                dropped.
+            upper (bool): Store only the entries j >= i of a symmetric matrix.
+        """
+        self.path = path
+        self.names = [str(name) for name in names]
+        self.kind = kind
+        self.threshold = float(threshold)
+        self.upper = upper
+        self.n = len(self.names)
+        self.row = 0
+        self.nnz = 0
+        self.row_counts = np.zeros(self.n, dtype=np.int64)
+        self.outfile = open(path, "wb")
+        self.outfile.write(EXCHANGE_MAGIC)
+        self.spill_path = path + ".indices.tmp"
+        self.spill = open(self.spill_path, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_rows(self, rows):
+        """
+        Args:
+            rows (array or sparse matrix): (K, N) the next K rows.
+        """
+        rows = sparse.csr_matrix(rows, dtype=np.float64)
+        if rows.shape[1] != self.n or self.row + rows.shape[0] > self.n:
+            raise ValueError(f"Rows of shape {rows.shape} do not fit an {self.n}x{self.n} matrix at row {self.row}")
+        rows.sum_duplicates()
+        rows.sort_indices()
+        row_numbers = np.repeat(np.arange(self.row, self.row + rows.shape[0]), np.diff(rows.indptr))
+        keep = np.abs(rows.data) > self.threshold
+        if self.upper:
+            keep &= rows.indices >= row_numbers
+        self.outfile.write(rows.data[keep].tobytes())
+        self.spill.write(rows.indices[keep].astype(np.int64).tobytes())
+        counts = np.bincount(row_numbers[keep] - self.row, minlength=rows.shape[0])
+        self.row_counts[self.row:self.row + rows.shape[0]] = counts
+        self.nnz += int(keep.sum())
+        self.row += rows.shape[0]
+
+    def close(self):
+        if self.row != self.n:
+            self.abort()
+            raise ValueError(f"Only {self.row} of {self.n} rows were written")
+        index_dtype = np.int64 if max(self.nnz, self.n) >= 2**31 else np.int32
+        flags = (FLAG_UPPER if self.upper else 0) | (FLAG_INT64 if index_dtype == np.int64 else 0)
+        self.spill.close()
+
+        outfile = self.outfile
+        data_offset = len(EXCHANGE_MAGIC)
+        _pad(outfile)
+        indices_offset = outfile.tell()
+        spilled = np.memmap(self.spill_path, dtype=np.int64, mode="r") if self.nnz else np.empty(0, np.int64)
+        for begin in range(0, self.nnz, SPILL_CHUNK):
+            outfile.write(spilled[begin:begin + SPILL_CHUNK].astype(index_dtype).tobytes())
+        del spilled
+        _pad(outfile)
+        indptr_offset = outfile.tell()
+        indptr = np.concatenate(([0], np.cumsum(self.row_counts))).astype(index_dtype)
+        outfile.write(indptr.tobytes())
+        _pad(outfile)
+        meta_offset = outfile.tell()
+        meta = json.dumps({"names" : self.names, "kind" : self.kind, "threshold" : self.threshold}).encode()
+        outfile.write(meta)
+        outfile.write(FOOTER.pack(self.n, self.nnz, data_offset, indices_offset, indptr_offset, meta_offset,
+                                  len(meta), EXCHANGE_VERSION, flags, EXCHANGE_MAGIC))
+        outfile.close()
+        os.remove(self.spill_path)
+        instrumentation.count("exchange_io/entries_written", self.nnz)
+
+    def abort(self):
+        for handle in (self.outfile, self.spill):
+            handle.close()
+        for path in (self.path, self.spill_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ExchangeMatrix:
+    def __init__(self, names, kind, threshold, upper, matrix):
+        """
+        Args:
+            names (list): The surface of every row and column.
+            kind (str): What the matrix holds.
+            threshold (float): Entries at or below this were dropped.
+            upper (bool): matrix holds only the upper triangle.
+            matrix (csr_matrix): The stored entries, usually backed by the
+                memory-mapped file.
+        """
+        self.names = names
+        self.kind = kind
+        self.threshold = threshold
+        self.upper = upper
+        self.matrix = matrix
+        self.index = {name : i for i, name in enumerate(names)}
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def to_sparse(self):
+        """
+        Returns:
+            csr_matrix: The full matrix, mirroring the upper triangle if
+                only that is stored (a copy then).
+        """
+        if not self.upper:
+            return self.matrix
+        strict = sparse.triu(self.matrix, k=1)
+        return (self.matrix + strict.T).tocsr()
+
+    def row(self, name):
+        """
+        Returns:
+            array: (N,) dense row of the surface.
+        """
+        i = self.index[name]
+        if not self.upper:
+            return self.matrix[i].toarray().ravel()
+        row = self.matrix[i].toarray().ravel()
+        row[:i] = self.matrix[:i, i].toarray().ravel()
+        return row
+
+    def get(self, from_surf, to_surf):
+        i, j = self.index[from_surf], self.index[to_surf]
+        if self.upper and j < i:
+            i, j = j, i
+        return float(self.matrix[i, j])
+
+
+def read_exchange_matrix(path, mmap=True):
+    """
+    Args:
+        path (str): A file written by ExchangeWriter.
+        mmap (bool): Map the arrays read-only instead of reading them.
+
+    Returns:
+        ExchangeMatrix
+    """
+    size = os.path.getsize(path)
+    if size < len(EXCHANGE_MAGIC) + FOOTER.size:
+        raise ExchangeFormatError(path, "too short for an exchange matrix")
+    with open(path, "rb") as infile:
+        head = infile.read(len(EXCHANGE_MAGIC))
+        infile.seek(size - FOOTER.size)
+        n, nnz, data_offset, indices_offset, indptr_offset, meta_offset, meta_length, version, flags, magic = \
+            FOOTER.unpack(infile.read(FOOTER.size))
+        if head != EXCHANGE_MAGIC or magic != EXCHANGE_MAGIC:
+            raise ExchangeFormatError(path, "not an exchange matrix")
+        if version != EXCHANGE_VERSION:
+            raise ExchangeFormatError(path, f"version {version}, expected {EXCHANGE_VERSION}")
+        infile.seek(meta_offset)
+        meta = json.loads(infile.read(meta_length).decode())
+
+    index_dtype = np.int64 if flags & FLAG_INT64 else np.int32
+
+    def section(dtype, offset, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+    data = section(np.float64, data_offset, nnz)
+    indices = section(index_dtype, indices_offset, nnz)
+    indptr = section(index_dtype, indptr_offset, n + 1)
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+    return ExchangeMatrix(meta["names"], meta["kind"], meta["threshold"], bool(flags & FLAG_UPPER), matrix)
+
+
+def write_exchange_matrix(path, names, matrix, kind="radks", threshold=0.0, upper=False,
+                          block_rows=DEFAULT_EXPORT_BLOCK_ROWS):
+    """
+    Writes a dense or sparse matrix, block_rows rows at a time.
+    """
+    with ExchangeWriter(path, names, kind, threshold, upper) as writer:
+        for begin in range(0, len(writer.names), block_rows):
+            writer.write_rows(matrix[begin:begin + block_rows])
+
+
+def grey_body_factor_rows(tn, block_rows=DEFAULT_EXPORT_BLOCK_ROWS):
+    """
+    Yields the grey body factors of a ThermalNetwork in blocks of rows, from
+    one factorization of the Gebhart system. Row i of B = A^-1 F diag(eps)
+    is (A^-T e_i)^T F diag(eps), so only block_rows rows exist at a time.
+
+    Yields:
+        (int, array): The first row of the block and the (K, N) rows.
+    """
+    view_factors = tn.get_view_factor_matrix()
+    eps = np.array([surface.eps for surface in tn.surfaces.values()])
+    n = len(eps)
+    with instrumentation.stage("gebhart_build"):
+        factors = lu_factor(np.eye(n) - view_factors * (1.0 - eps)[np.newaxis, :])
+        view_factors *= eps[np.newaxis, :]
+    for begin in range(0, n, block_rows):
+        end = min(begin + block_rows, n)
+        unit = np.zeros((n, end - begin))
+        unit[np.arange(begin, end), np.arange(end - begin)] = 1.0
+        with instrumentation.stage("gebhart_solve"):
+            rows = lu_solve(factors, unit, trans=1).T @ view_factors
+        yield begin, rows
+
+
+def export_grey_body_factors(tn, path, threshold=0.0, block_rows=DEFAULT_EXPORT_BLOCK_ROWS):
+    """
+    Streams the grey body factors of a ThermalNetwork to an exchange matrix
+    file without holding the whole matrix.
+    """
+    with ExchangeWriter(path, list(tn.surfaces), "grey_body_factors", threshold) as writer:
+        for _, rows in grey_body_factor_rows(tn, block_rows):
+            writer.write_rows(rows)
+
+
+def export_radks(tn, path, threshold=0.0, upper=True, block_rows=DEFAULT_EXPORT_BLOCK_ROWS):
+    """
+    Streams the radks radk_ij = eps_i A_i B_ij of a ThermalNetwork to an
+    exchange matrix file, by default as the upper triangle.
+    """
+    weights = np.array([surface.eps * surface.area for surface in tn.surfaces.values()])
+    with ExchangeWriter(path, list(tn.surfaces), "radks", threshold, upper) as writer:
+        for begin, rows in grey_body_factor_rows(tn, block_rows):
+            writer.write_rows(weights[begin:begin + len(rows), np.newaxis] * rows)
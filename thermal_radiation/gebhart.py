@@ -1,14 +1,29 @@
+import os
 from itertools import product
 from math import isclose
 from warnings import warn
 import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from .correction import enforce_reciprocity_and_closure
+from .radiosity import ProgressiveRadiosity
+from .spectral import band_fractions
+from .temperature import STEFAN_BOLTZMANN
+from . import instrumentation
+
+REDUCTION_LEAK_TOL = 1.0E-12 # view factor a group of reradiating surfaces must have to the rest
+RECIPROCITY_TOL = 1.0E-6 # relative mismatch of A_i F_ij and A_j F_ji accepted by from_arrays
+RECIPROCITY_ATOL = 1.0E-9 # absolute mismatch accepted on top, for pairs that barely see each other
+CLOSURE_TOL = 1.0E-6 # excess over 1 of a view factor row sum accepted by from_arrays
 
 class Surface:
-    def __init__(self, name, area, eps):
+    def __init__(self, name, area, eps, band_eps=None, reradiating=False):
         self.name = name
         self.area = area
         self.eps = eps       # emissivity
         self.rho = 1.0 - eps # reflectivity
+        self.band_eps = None if band_eps is None else np.asarray(band_eps, dtype=np.float64) # per band, None if grey
+        self.reradiating = reradiating # adiabatic, eliminated by ThermalNetwork.get_reduced_network
 
     def __str__(self):
         return f"Surface({self.name})"
@@ -17,6 +32,8 @@ class Surface:
         rtrn_str  = str(self) + ":\n"
         rtrn_str += f"\tarea: {self.area}\n"
         rtrn_str += f"\teps : {self.eps}"
+        if self.band_eps is not None:
+            rtrn_str += f"\n\tband eps : {self.band_eps}"
         return rtrn_str
 
 
@@ -90,14 +107,205 @@ class NoSurfaceException(Exception):
         Exception.__init__(self, f"No surface named \"{surf_name}\" in the thermal network.")
 
 
+class Condensation:
+    def __init__(self, active, reradiating, weights):
+        """
+        Records the reradiating surfaces eliminated from a network.
+
+        Args:
+            active (list): Names of the surfaces kept, in order.
+            reradiating (list): Names of the eliminated surfaces, in order.
+            weights (array): (R, A) radiosities of the reradiating surfaces
+                per radiosity of the active ones, J_r = weights J_a.
+        """
+        self.active = active
+        self.reradiating = reradiating
+        self.weights = weights
+
+
+def load_view_factors(path):
+    """
+    Args:
+        path (str): An .npz from scipy.sparse.save_npz, or one with a
+            "view_factors" array such as the output of the run command.
+
+    Returns:
+        array or sparse matrix
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        files = set(arrays.files)
+        if "view_factors" in files:
+            return arrays["view_factors"]
+    if {"data", "indices", "indptr", "shape"} <= files or {"row", "col", "data", "shape"} <= files:
+        return sparse.load_npz(path)
+    raise ValueError(f"{path} holds neither a sparse matrix nor a \"view_factors\" array")
+
+
+def validate_network_arrays(names, areas, eps, view_factors, reciprocity_tol=RECIPROCITY_TOL,
+                            closure_tol=CLOSURE_TOL, reciprocity_atol=RECIPROCITY_ATOL):
+    """
+    Checks surface properties and view factors in bulk: unique names,
+    positive areas, emissivities in [0, 1], finite non-negative view factors
+    whose rows sum to at most 1 + closure_tol, and reciprocity
+    |A_i F_ij - A_j F_ji| <= reciprocity_atol + reciprocity_tol max(A_i F_ij, A_j F_ji).
+    The absolute part accepts round-off on pairs whose A F is near zero.
+
+    Raises:
+        ValueError: Naming the first offending surface or pair.
+    """
+    n = len(names)
+    if len(set(names)) != n:
+        seen = set()
+        duplicate = next(name for name in names if name in seen or seen.add(name))
+        raise ValueError(f"Surface \"{duplicate}\" is given more than once")
+    if areas.shape != (n,) or eps.shape != (n,):
+        raise ValueError(f"Expected {n} areas and emissivities, got {areas.shape} and {eps.shape}")
+    if view_factors.shape != (n, n):
+        raise ValueError(f"Expected a {n}x{n} view factor matrix, got {view_factors.shape}")
+    bad = np.flatnonzero(~(np.isfinite(areas) & (areas > 0.0)))
+    if len(bad):
+        raise ValueError(f"Surface {names[bad[0]]} has area {areas[bad[0]]}")
+    bad = np.flatnonzero(~((eps >= 0.0) & (eps <= 1.0)))
+    if len(bad):
+        raise ValueError(f"Surface {names[bad[0]]} has emissivity {eps[bad[0]]}, outside [0, 1]")
+
+    if sparse.issparse(view_factors):
+        entries = sparse.coo_matrix(view_factors)
+        rows, cols, values = entries.row, entries.col, entries.data
+        row_sums = np.bincount(rows, weights=values, minlength=n)
+    else:
+        rows, cols = np.nonzero(~(np.isfinite(view_factors) & (view_factors >= 0.0)))
+        values = view_factors[rows, cols]
+        row_sums = view_factors.sum(axis=1)
+    bad = np.flatnonzero(~(np.isfinite(values) & (values >= 0.0)))
+    if len(bad):
+        i, j = rows[bad[0]], cols[bad[0]]
+        raise ValueError(f"View factor from {names[i]} to {names[j]} is {values[bad[0]]}")
+    bad = np.flatnonzero(row_sums > 1.0 + closure_tol)
+    if len(bad):
+        raise ValueError(f"View factors from {names[bad[0]]} sum to {row_sums[bad[0]]}, more than 1")
+
+    if sparse.issparse(view_factors):
+        exchange = sparse.csr_matrix(sparse.diags(areas) @ sparse.csr_matrix(view_factors))
+        excess = (abs(exchange - exchange.T) - reciprocity_tol * exchange.maximum(exchange.T)).tocoo()
+        outside = excess.data > reciprocity_atol # the pairs not stored have no excess
+        rows, cols = excess.row[outside], excess.col[outside]
+    else:
+        exchange = areas[:, np.newaxis] * view_factors
+        rows, cols = np.nonzero(np.abs(exchange - exchange.T) >
+                                reciprocity_atol + reciprocity_tol * np.maximum(exchange, exchange.T))
+    if len(rows):
+        i, j = rows[0], cols[0]
+        raise ValueError(f"View factors between {names[i]} and {names[j]} are not reciprocal: "
+                         f"A F is {exchange[i, j]} one way and {exchange[j, i]} the other")
+
+
 class ThermalNetwork:
     def __init__(self, name=None):
         self.name = name
         self.surfaces = {} # surface name -> surface properties
         self.rad_connections = {} # surface name -> surface name -> RadiationConnection
-
-    def add_surface(self, name, area, eps):
-        self.surfaces[name] = Surface(name, area, eps)
+        self.view_factor_matrix = None # bulk view factors, added to the connections
+        self.view_factor_index = {} # surface name -> row/column of view_factor_matrix
+        self.band_edges = None # wavelength band edges in um for semi-grey surfaces
+        self.condensation = None # reradiating surfaces eliminated from this network, if reduced
+
+    @classmethod
+    def from_arrays(cls, names, areas, eps, view_factors, band_eps=None, name=None, validate=True,
+                    reciprocity_tol=RECIPROCITY_TOL, closure_tol=CLOSURE_TOL, reciprocity_atol=RECIPROCITY_ATOL):
+        """
+        Builds a network from arrays in one pass, without a RadiationConnection
+        per pair. The view factors are kept as given (dense or sparse) and
+        validated with vectorized checks.
+
+        Args:
+            names (list): The surfaces, in the order of the matrix.
+            areas (array): (N,) areas.
+            eps (array): (N,) emissivities.
+            view_factors (array, sparse matrix or str): (N, N) view factors,
+                F[i, j] from names[i] to names[j], or an .npz holding them
+                (see load_view_factors).
+            band_eps (array): (N, B) band emissivities, see add_surface.
+            validate (bool): Run validate_network_arrays with reciprocity_tol,
+                closure_tol and reciprocity_atol.
+
+        Returns:
+            ThermalNetwork
+        """
+        if isinstance(view_factors, (str, os.PathLike)):
+            view_factors = load_view_factors(view_factors)
+        if not sparse.issparse(view_factors):
+            view_factors = np.asarray(view_factors, dtype=np.float64)
+        names = [str(surface_name) for surface_name in names]
+        areas = np.asarray(areas, dtype=np.float64)
+        eps = np.asarray(eps, dtype=np.float64)
+        if validate:
+            with instrumentation.stage("network_validation"):
+                validate_network_arrays(names, areas, eps, view_factors, reciprocity_tol, closure_tol,
+                                        reciprocity_atol)
+
+        tn = cls(name)
+        tn.add_surfaces(names, areas, eps, band_eps)
+        tn.add_view_factor_matrix(names, view_factors)
+        return tn
+
+    def add_surface(self, name, area, eps, band_eps=None, reradiating=False):
+        """
+        Args:
+            band_eps (array): Emissivity in every band of set_bands. Grey
+                surfaces (None) have eps in every band.
+            reradiating (bool): The surface is adiabatic, see
+                set_reradiating.
+        """
+        self.surfaces[name] = Surface(name, area, eps, band_eps, reradiating)
+
+    def set_reradiating(self, names, reradiating=True):
+        """
+        Marks surfaces as reradiating: insulated, so that they emit all they
+        absorb. Their radiosity then equals their irradiation whatever their
+        emissivity, and get_reduced_network can eliminate them.
+        """
+        for name in names:
+            if name not in self.surfaces:
+                raise NoSurfaceException(name)
+            self.surfaces[name].reradiating = reradiating
+
+    def set_bands(self, edges):
+        """
+        Args:
+            edges (array): (B + 1,) increasing wavelength band edges in um,
+                usually from 0 to inf.
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0.0):
+            raise ValueError("Band edges must be an increasing sequence of at least two wavelengths.")
+        self.band_edges = edges
+
+    def add_surfaces(self, names, areas, eps, band_eps=None):
+        band_eps = [None] * len(names) if band_eps is None else band_eps
+        for name, area, eps_value, band_eps_values in zip(names, areas, eps, band_eps):
+            self.surfaces[name] = Surface(name, float(area), float(eps_value), band_eps_values)
+
+    def add_view_factor_matrix(self, names, view_factors):
+        """
+        Sets the view factors between many surfaces at once, in place of
+        add_rad_connections for every pair. Replaces a previously added
+        matrix.
+
+        Args:
+            names (list): The surfaces of the rows and columns.
+            view_factors (array or sparse matrix): F[i, j] is the view factor
+                from names[i] to names[j].
+        """
+        for name in names:
+            if name not in self.surfaces:
+                raise NoSurfaceException(name)
+        if view_factors.shape != (len(names), len(names)):
+            raise ValueError(f"Expected a {len(names)}x{len(names)} view factor matrix, got {view_factors.shape}")
+
+        self.view_factor_matrix = sparse.csr_matrix(view_factors) if sparse.issparse(view_factors) \
+            else np.asarray(view_factors, dtype=np.float64)
+        self.view_factor_index = {name : i for i, name in enumerate(names)}
 
     def _add_rad_connection_group(self, surf1_name, surf2_name, connection):
         if surf1_name not in self.rad_connections:
@@ -127,12 +335,20 @@ class ThermalNetwork:
         except:
             raise NoConnectionException(surf1_name, surf2_name)
 
+    def _get_matrix_view_factor(self, surf1_name, surf2_name):
+        i = self.view_factor_index.get(surf1_name)
+        j = self.view_factor_index.get(surf2_name)
+        if i is None or j is None:
+            return 0.0
+        return float(self.view_factor_matrix[i, j])
+
     def get_view_factor(self, surf1_name, surf2_name):
+        matrix_view_factor = self._get_matrix_view_factor(surf1_name, surf2_name)
         try:
             rad_connection = self._get_rad_connection(surf1_name, surf2_name)
-            return rad_connection.get_view_factor(surf1_name, surf2_name)
+            return matrix_view_factor + rad_connection.get_view_factor(surf1_name, surf2_name)
         except NoConnectionException:
-            return 0.0
+            return matrix_view_factor
         except NoSurfaceException as exp:
             raise exp
 
@@ -140,9 +356,8 @@ class ThermalNetwork:
         return product(self.surfaces, self.surfaces)
 
     def get_view_factors_sums(self):
-        view_factor_sums = {surface : 0.0  for surface in self.surfaces}
-        for from_surf, to_surf in self.surface_combinations():
-            view_factor_sums[from_surf] += self.get_view_factor(from_surf, to_surf)
+        sums = self.get_view_factor_matrix().sum(axis=1)
+        view_factor_sums = {surface : float(sum_) for surface, sum_ in zip(self.surfaces, sums)}
         return view_factor_sums # from surface -> total view factor accounted for
 
     def verify_view_factors(self, view_factor_sums=None):
@@ -151,14 +366,50 @@ class ThermalNetwork:
             if not isclose(sum_, 1.0):
                 warn(f"View factors from {from_surf} is not close to 1.0. It is {sum_}.")
 
+    def get_areas(self):
+        return np.array([surface.area for surface in self.surfaces.values()])
+
+    def get_view_factor_matrix(self):
+        """
+        Returns:
+            array: F[i, j] is the view factor from the i-th to the j-th surface
+                in the order the surfaces were added.
+        """
+        index = {name : i for i, name in enumerate(self.surfaces)}
+        view_factors = np.zeros((len(index), len(index)))
+        if self.view_factor_matrix is not None:
+            positions = np.array([index[name] for name in self.view_factor_index])
+            matrix = self.view_factor_matrix
+            matrix = matrix.toarray() if sparse.issparse(matrix) else matrix
+            view_factors[np.ix_(positions, positions)] = matrix
+        for from_surf, connections in self.rad_connections.items():
+            for to_surf, connection in connections.items():
+                i, j = index[from_surf], index[to_surf]
+                view_factors[i, j] += connection.get_view_factor(from_surf, to_surf)
+        return view_factors
+
+    def enforce_reciprocity_and_closure(self, max_relative_change=0.5):
+        """
+        Replaces the radiation connections with view factors corrected by
+        correction.enforce_reciprocity_and_closure. The network must be an
+        enclosure.
+        """
+        names = list(self.surfaces)
+        view_factors = enforce_reciprocity_and_closure(
+            self.get_view_factor_matrix(), self.get_areas(),
+            max_relative_change=max_relative_change)
+
+        self.rad_connections = {}
+        self.add_view_factor_matrix(names, view_factors)
+
     def matrix_build_indexer(self):
         n = len(self.surfaces)
         for number, (from_surf, to_surf) in enumerate(self.surface_combinations()):
             i, j = divmod(number, n)
             yield (i, from_surf), (j, to_surf)
 
-    def reflected_term(self, from_surf, to_surf): # reflected from {from_surf} to {to_surf}
-        reflectivity = self.surfaces[from_surf].rho
+    def reflected_term(self, from_surf, to_surf): # reflected by {to_surf} after leaving {from_surf}
+        reflectivity = self.surfaces[to_surf].rho
         view_factor  = self.get_view_factor(from_surf, to_surf)
         return -1.0 * reflectivity * view_factor
 
@@ -182,8 +433,10 @@ class ThermalNetwork:
         gbf_map = {} # name (from) -> name (to) -> factor
 
         for to_indx, to_surf in enumerate(self.surfaces):
-            A, b = self.build_gebhart_slae(to_surf)
-            x = np.linalg.solve(A, b)
+            with instrumentation.stage("gebhart_build"):
+                A, b = self.build_gebhart_slae(to_surf)
+            with instrumentation.stage("gebhart_solve"):
+                x = np.linalg.solve(A, b)
 
             for from_indx, from_surf in enumerate(self.surfaces):
                 if to_indx == 0:
@@ -192,6 +445,170 @@ class ThermalNetwork:
 
         return gbf_map
 
+    def get_grey_body_factor_matrix(self):
+        """
+        Solves B = F diag(eps) + F diag(rho) B for all surfaces at once.
+
+        Returns:
+            array: B[i, j] is the grey body factor from the i-th to the j-th
+                surface in the order the surfaces were added.
+        """
+        view_factors = self.get_view_factor_matrix()
+        eps = np.array([surface.eps for surface in self.surfaces.values()])
+        rho = np.array([surface.rho for surface in self.surfaces.values()])
+        with instrumentation.stage("gebhart_build"):
+            A = np.eye(len(eps)) - view_factors * rho[np.newaxis, :]
+        with instrumentation.stage("gebhart_solve"):
+            return np.linalg.solve(A, view_factors * eps[np.newaxis, :])
+
+    def get_radk_matrix(self, grey_body_factors=None):
+        """
+        Returns:
+            array: radk[i, j] = eps_i A_i B_ij, symmetric for an enclosure.
+        """
+        grey_body_factors = self.get_grey_body_factor_matrix() if grey_body_factors is None else grey_body_factors
+        eps = np.array([surface.eps for surface in self.surfaces.values()])
+        return (eps * self.get_areas())[:, np.newaxis] * grey_body_factors
+
+    def get_reduced_network(self, name=None):
+        """
+        Eliminates the reradiating surfaces. Their radiosities follow from
+        those of the active surfaces a,
+
+            J_r = (I - F_rr)^-1 F_ra J_a = W J_a
+
+        so the active surfaces exchange radiation through the effective view
+        factors F_aa + F_ar W, the Schur complement of I - F on the
+        reradiating block. These keep reciprocity and closure, and the
+        reduced network gives the exact grey body factors and radks of the
+        active surfaces. Reradiating surfaces are treated as grey.
+
+        Returns:
+            ThermalNetwork: The active surfaces with the effective view
+                factors, its condensation recording W.
+        """
+        names = list(self.surfaces)
+        mask = np.array([surface.reradiating for surface in self.surfaces.values()], dtype=bool)
+        for i in np.flatnonzero(mask):
+            if self.surfaces[names[i]].band_eps is not None:
+                raise ValueError(f"Reradiating surface {names[i]} has band emissivities, "
+                                 "only grey ones can be eliminated.")
+        active, reradiating = np.flatnonzero(~mask), np.flatnonzero(mask)
+
+        view_factors = self.get_view_factor_matrix()
+        between = view_factors[np.ix_(reradiating, reradiating)]
+        # a group of reradiating surfaces that loses nothing to the rest traps its radiation
+        n_groups, groups = connected_components(sparse.csr_matrix(between), directed=False)
+        leaks = np.zeros(n_groups)
+        np.maximum.at(leaks, groups, 1.0 - between.sum(axis=1))
+        if np.any(leaks <= REDUCTION_LEAK_TOL):
+            raise ValueError("Every group of reradiating surfaces must see an active surface (or space).")
+
+        with instrumentation.stage("gebhart_condense"):
+            weights = np.linalg.solve(np.eye(len(reradiating)) - between, view_factors[np.ix_(reradiating, active)])
+            reduced_view_factors = (view_factors[np.ix_(active, active)]
+                                    + view_factors[np.ix_(active, reradiating)] @ weights)
+
+        reduced = ThermalNetwork(self.name if name is None else name)
+        reduced.band_edges = self.band_edges
+        active_names = [names[i] for i in active]
+        for surface_name in active_names:
+            surface = self.surfaces[surface_name]
+            reduced.add_surface(surface_name, surface.area, surface.eps, surface.band_eps)
+        reduced.add_view_factor_matrix(active_names, reduced_view_factors)
+        reduced.condensation = Condensation(active_names, [names[i] for i in reradiating], weights)
+        return reduced
+
+    def get_reradiating_temperatures(self, temperatures, sigma=STEFAN_BOLTZMANN):
+        """
+        Recovers the temperatures of the surfaces eliminated from a reduced
+        network, whose radiosity equals their blackbody emissive power.
+
+        Args:
+            temperatures (array): (A,) temperatures of the surfaces of this
+                reduced network.
+
+        Returns:
+            array: (R,) temperatures of condensation.reradiating.
+        """
+        if self.condensation is None:
+            raise ValueError("Not a reduced network, see get_reduced_network.")
+        eps = np.array([surface.eps for surface in self.surfaces.values()])
+        emissive_powers = sigma * np.asarray(temperatures, dtype=np.float64)**4
+        A = np.eye(len(eps)) - (1.0 - eps)[:, np.newaxis] * self.get_view_factor_matrix()
+        radiosities = np.linalg.solve(A, eps * emissive_powers)
+        return (self.condensation.weights @ radiosities / sigma)**0.25
+
+    def get_progressive_radiosity(self, temperatures, **kwargs):
+        """
+        Returns:
+            ProgressiveRadiosity: A shooting solver for the radiosities at the
+                given surface temperatures, without grey body factors.
+        """
+        return ProgressiveRadiosity.from_network(self, temperatures, **kwargs)
+
+    def get_band_emissivities(self):
+        """
+        Returns:
+            array: (B, N) emissivity of every surface in every band.
+        """
+        if self.band_edges is None:
+            raise ValueError("No bands; call set_bands first.")
+        n_bands = len(self.band_edges) - 1
+        band_eps = np.empty((n_bands, len(self.surfaces)))
+        for i, surface in enumerate(self.surfaces.values()):
+            if surface.band_eps is None:
+                band_eps[:, i] = surface.eps
+            elif surface.band_eps.shape != (n_bands,):
+                raise ValueError(f"{surface} has {len(surface.band_eps)} band emissivities, expected {n_bands}.")
+            else:
+                band_eps[:, i] = surface.band_eps
+        return band_eps
+
+    def get_band_grey_body_factor_matrices(self):
+        """
+        Solves the Gebhart system of every band in one batched call sharing
+        the view factor matrix.
+
+        Returns:
+            array: (B, N, N) grey body factors of every band.
+        """
+        view_factors = self.get_view_factor_matrix()
+        band_eps = self.get_band_emissivities()
+        with instrumentation.stage("gebhart_build"):
+            A = np.eye(len(self.surfaces)) - view_factors * (1.0 - band_eps)[:, np.newaxis, :]
+            b = view_factors * band_eps[:, np.newaxis, :]
+        with instrumentation.stage("gebhart_solve"):
+            return np.linalg.solve(A, b)
+
+    def get_band_radk_matrices(self, band_grey_body_factors=None):
+        """
+        Returns:
+            array: (B, N, N) radks of every band, radk_b[i, j] = eps_bi A_i B_bij.
+        """
+        if band_grey_body_factors is None:
+            band_grey_body_factors = self.get_band_grey_body_factor_matrices()
+        weights = self.get_band_emissivities() * self.get_areas()
+        return weights[:, :, np.newaxis] * band_grey_body_factors
+
+    def get_weighted_radk_matrix(self, temperatures, band_radks=None):
+        """
+        Blackbody fraction weighted sum of the band radks, radk = sum_b f_b(T) radk_b.
+
+        Args:
+            temperatures (float or array): Temperature of the emitters, one
+                for all or (N,) per surface. The fractions of row i are
+                evaluated at the temperature of surface i.
+
+        Returns:
+            array: (N, N) radks
+        """
+        band_radks = self.get_band_radk_matrices() if band_radks is None else band_radks
+        fractions = band_fractions(self.band_edges, temperatures) # (B,) or (N, B)
+        if fractions.ndim == 1:
+            return np.einsum("b,bij->ij", fractions, band_radks)
+        return np.einsum("ib,bij->ij", fractions, band_radks)
+
     def get_radks(self, gbf_map):
         radks_map = {}
         for from_surf, to_surf_factors in gbf_map.items():
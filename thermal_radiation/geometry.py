@@ -1,9 +1,13 @@
 import numpy as np
 from scipy.integrate import nquad
 from math import isclose
+from . import instrumentation
+
+ABSOLUTE_TOL = 1.0E-14 # about_zero: scalars of order one (lengths, weight sums) at or below this are zero
+RELATIVE_TOL = 1.0E-12 # batched predicates: fraction of the scale each one documents
 
 def about_zero(num):
-    return isclose(0.0, num, abs_tol=1.0E-14)
+    return isclose(0.0, num, abs_tol=ABSOLUTE_TOL)
 
 def magnitude(vec):
     return np.sqrt(vec @ vec)
@@ -21,15 +25,148 @@ def get_direction(from_vec, to_vec):
     return normalize(get_displacement_vector(from_vec, to_vec))
 
 
-def classify_cross_product(from_vertex, to_vertex, point):
-    from_to_point = point - from_vertex
-    from_to_to = to_vertex - from_vertex
-    cross = np.cross(from_to_point, from_to_to)
-    mag = cross @ cross
-    up = mag > 0.0
-    down = mag < 0.0
-    zero = mag == 0.0
-    return up, down, zero
+def _dot(u, v):
+    return np.einsum("...k,...k->...", u, v)
+
+
+def ray_plane_intersections(origins, directions, points, normals, eps=RELATIVE_TOL):
+    """
+    Batched ray-plane intersection. The planes broadcast against the rays:
+    one plane for all rays or one per ray.
+
+    Args:
+        origins, directions (array): (N, 3) rays.
+        points, normals (array): (3,) or (N, 3) a point on and the normal of
+            every plane.
+        eps (float): Rays whose direction is within eps (relative to
+            |normal| |direction|) of lying in the plane are parallel.
+
+    Returns:
+        (array, array): (N,) ray parameter of the intersection, inf for
+            parallel rays, and the mask of rays that are not parallel.
+    """
+    denominators = _dot(normals, directions)
+    scale = np.sqrt(_dot(normals, normals) * _dot(directions, directions))
+    valid = np.abs(denominators) > eps * scale
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(valid, _dot(normals, points - origins) / np.where(valid, denominators, 1.0), np.inf)
+    return t, valid
+
+
+def project_onto_planes(points, a, normals):
+    """
+    Returns:
+        array: (N, 3) orthogonal projections of the points onto the planes
+            through a with the given normals (broadcast like the points).
+    """
+    unit = normals / np.sqrt(_dot(normals, normals))[..., np.newaxis]
+    return points - _dot(points - a, unit)[..., np.newaxis] * unit
+
+
+def barycentric_coordinates(points, a, b, c):
+    """
+    Returns:
+        (array, array): The coordinates (u, v) of the projections of the
+            points onto the triangles, p = a + u (b - a) + v (c - a).
+            Triangles broadcast against the points.
+    """
+    edge1, edge2 = b - a, c - a
+    offsets = points - a
+    d11, d12, d22 = _dot(edge1, edge1), _dot(edge1, edge2), _dot(edge2, edge2)
+    d1p, d2p = _dot(edge1, offsets), _dot(edge2, offsets)
+    denominators = d11 * d22 - d12 * d12
+    return (d22 * d1p - d12 * d2p) / denominators, (d11 * d2p - d12 * d1p) / denominators
+
+
+def points_in_triangles(points, a, b, c, eps=RELATIVE_TOL, project=False):
+    """
+    Batched point-in-triangle test, edges and vertices included. Points are
+    accepted within eps * max(|a|, |p|, triangle size) of the triangle, so
+    the round-off of coordinates far from the origin is tolerated.
+
+    Args:
+        points (array): (N, 3) points.
+        a, b, c (array): (3,) or (N, 3) triangle vertices.
+        eps (float): Tolerance relative to that scale, for the barycentric
+            coordinates (as a length along the edges) and the distance from
+            the plane.
+        project (bool): Project the points onto the planes first, otherwise
+            points off the planes are outside.
+
+    Returns:
+        array: (N,) mask of the points on their triangles.
+    """
+    normals = np.cross(b - a, c - a)
+    norms = np.sqrt(_dot(normals, normals)) # twice the area
+    sizes = np.sqrt(norms)
+    tolerances = eps * np.maximum(np.maximum(np.sqrt(_dot(a, a)), np.sqrt(_dot(points, points))), sizes)
+    u, v = barycentric_coordinates(points, a, b, c)
+    slack = tolerances / sizes
+    inside = (u >= -slack) & (v >= -slack) & (u + v <= 1.0 + slack)
+    if not project:
+        inside &= np.abs(_dot(points - a, normals)) / norms <= tolerances
+    return inside
+
+
+def moller_trumbore(origins, directions, a, edge1, edge2, eps=RELATIVE_TOL, scales=None):
+    """
+    Batched ray-triangle intersection, one triangle per ray or one for all.
+
+    Args:
+        origins, directions (array): (N, 3) rays.
+        a, edge1, edge2 (array): (3,) or (N, 3) first vertex and edges b - a
+            and c - a of the triangles.
+        eps (float): Tolerance of the parallel test, relative to
+            |edge1| |edge2| |direction|, and of the barycentric coordinates.
+        scales (array): |edge1| |edge2| |direction| per ray if known, to skip
+            computing it.
+
+    Returns:
+        array: Ray parameter of the hit, inf where the ray misses.
+    """
+    p = np.cross(directions, edge2)
+    det = _dot(edge1, p)
+    if scales is None:
+        scales = np.sqrt(_dot(edge1, edge1) * _dot(edge2, edge2) * _dot(directions, directions))
+    valid = np.abs(det) > eps * scales
+    inv_det = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    offsets = origins - a
+    u = _dot(offsets, p) * inv_det
+    q = np.cross(offsets, edge1)
+    v = _dot(directions, q) * inv_det
+    t = _dot(edge2, q) * inv_det
+    hit = valid & (u >= -eps) & (v >= -eps) & (u + v <= 1.0 + eps)
+    return np.where(hit, t, np.inf)
+
+
+def ray_triangle_intersections(origins, directions, a, b, c, eps=RELATIVE_TOL):
+    """
+    Returns:
+        (array, array): (N,) ray parameter of the hit, inf on a miss, and the
+            mask of hits in front of the origins (t > 0).
+    """
+    t = moller_trumbore(origins, directions, a, b - a, c - a, eps)
+    return t, np.isfinite(t) & (t > 0.0)
+
+
+def line_intersections(points1, directions1, points2, directions2, eps=RELATIVE_TOL):
+    """
+    Batched intersection of coplanar lines. Pairs whose directions are
+    within eps (relative to |d1|^2 |d2|^2) of parallel are not intersected.
+
+    Returns:
+        (array, array): (N, 3) points where the first lines meet the second
+            ones and the mask of pairs that are not parallel.
+    """
+    plane_normals = np.cross(directions1, directions2)
+    in_plane_normals = np.cross(plane_normals, directions2)
+    denominators = _dot(directions1, in_plane_normals)
+    scale = _dot(directions1, directions1) * _dot(directions2, directions2)
+    valid = np.abs(denominators) > eps * scale
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distances = np.where(valid, -_dot(points1 - points2, in_plane_normals) / np.where(valid, denominators, 1.0),
+                             np.nan)
+    return points1 + distances[..., np.newaxis] * directions1, valid
 
 
 class Triangle:
@@ -79,30 +216,17 @@ class Triangle:
 
     def project_onto(self, point):
         """
-        Project point onto the place of the triangle using least squares
+        Orthogonal projection of point onto the plane of the triangle
         """
-        aT = np.array([self.a, self.b])
-        a = aT.T
-        A = aT @ a
-        b = aT @ point
-        point_in_plane = np.linalg.solve(A, b)
-        return a @ point_in_plane
+        return project_onto_planes(np.asarray(point, dtype=np.float64), self.a, self.normal)
 
     def point_on(self, point, project_first=False):
-        point = self.project_onto(point) if project_first else point
-
-        a_up, a_down, a_zero = classify_cross_product(self.a, self.b, point)
-        b_up, b_down, b_zero = classify_cross_product(self.b, self.c, point)
-        c_up, c_down, c_zero = classify_cross_product(self.c, self.a, point)
-
-        on_edge = a_zero or b_zero or c_zero
-        on_vertex = on_edge and ((a_zero and b_zero) or (a_zero and c_zero) or (b_zero and c_zero))
-
-        all_up = a_up and b_up and c_up
-        all_down = a_down and b_down and c_down
-        inside = all_up or all_down
-
-        return on_edge or on_vertex or inside
+        """
+        Whether point lies on the triangle, edges and vertices included. A
+        point off the plane is not on it unless project_first.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        return bool(points_in_triangles(point[np.newaxis], self.a, self.b, self.c, project=project_first)[0])
 
     def surface_location(self, xi, eta):
         assert xi <= 1.0 and xi >= 0.0
@@ -124,6 +248,143 @@ class Triangle:
 
         line_c_to_b = Line(self.c, get_direction(self.c, self.b))
 
+    def integration_points(self, quadrature):
+        """
+        Args:
+            quadrature (Quadrature): A rule on the unit triangle.
+
+        Returns:
+            (array, array): (Q, 3) physical quadrature points and (Q,)
+                weights, which sum to the area.
+        """
+        mapped = [quadrature.quad_domain_to_func_domain(*qp) for qp in quadrature.qps]
+        xi, eta = np.array(mapped, dtype=np.float64).reshape(-1, 2).T
+        points = np.outer(1.0 - xi - eta, self.a) + np.outer(xi, self.b) + np.outer(eta, self.c)
+        return points, 2.0 * self.area * np.array(quadrature.weights, dtype=np.float64)
+
+
+QUADRILATERAL_PLANARITY_TOL = 1.0E-10 # out of plane distance of a vertex relative to the longest diagonal
+
+
+def bilinear_shape_functions(xi, eta):
+    """
+    Returns:
+        array: (Q, 4) bilinear shape functions of a, b, c and d at the (Q,)
+            points (xi, eta) of [-1, 1]^2.
+    """
+    xi = np.asarray(xi, dtype=np.float64)
+    eta = np.asarray(eta, dtype=np.float64)
+    return 0.25 * np.stack(((1.0 - xi) * (1.0 - eta), (1.0 + xi) * (1.0 - eta),
+                            (1.0 + xi) * (1.0 + eta), (1.0 - xi) * (1.0 + eta)), axis=-1)
+
+
+def bilinear_tangents(vertices, xi, eta):
+    """
+    Args:
+        vertices (array): (..., 4, 3) vertices a, b, c and d.
+        xi, eta (array): (Q,) points of [-1, 1]^2.
+
+    Returns:
+        (array, array): (..., Q, 3) derivatives of the bilinear map w.r.t. xi
+            and eta.
+    """
+    xi = np.asarray(xi, dtype=np.float64)[:, np.newaxis]
+    eta = np.asarray(eta, dtype=np.float64)[:, np.newaxis]
+    a, b, c, d = (vertices[..., np.newaxis, k, :] for k in range(4))
+    d_xi = 0.25 * ((1.0 - eta) * (b - a) + (1.0 + eta) * (c - d))
+    d_eta = 0.25 * ((1.0 - xi) * (d - a) + (1.0 + xi) * (c - b))
+    return d_xi, d_eta
+
+
+class Quadrilateral:
+    CURR_ID = 0
+
+    def __init__(self, a, b, c, d):
+        """
+        Args:
+            a, b, c, d (vectors): The position vectors of the vertices of a
+                planar, convex quadrilateral oriented in the counter clockwise
+                orientation w.r.t. the surface normal.
+
+        The bilinear map takes the reference square [-1, 1]^2 to the element
+
+            eta
+            d_______c
+            |       |
+            |       |
+            a_______b Xi
+        """
+        self.a = np.array(a, dtype=np.float64)
+        self.b = np.array(b, dtype=np.float64)
+        self.c = np.array(c, dtype=np.float64)
+        self.d = np.array(d, dtype=np.float64)
+        self.vertices = np.array([self.a, self.b, self.c, self.d])
+
+        cross = np.cross(self.c - self.a, self.d - self.b) # twice the vector area
+        cross_mag = magnitude(cross)
+        assert not about_zero(cross_mag) # the vertices don't span a quadrilateral
+
+        self.area = 0.5 * cross_mag
+        self.normal = 0.5 * cross
+        self.normalized_normal = cross / cross_mag
+        self.magnitude = cross_mag
+
+        size = max(magnitude(self.c - self.a), magnitude(self.d - self.b))
+        offsets = (self.vertices - self.vertices.mean(axis=0)) @ self.normalized_normal
+        if np.abs(offsets).max() > QUADRILATERAL_PLANARITY_TOL * size:
+            raise ValueError(f"Quadrilateral is not planar, a vertex is {np.abs(offsets).max():g} off its plane")
+        corners = np.cross(np.roll(self.vertices, -1, axis=0) - self.vertices,
+                           np.roll(self.vertices, 1, axis=0) - self.vertices)
+        if np.any(corners @ self.normalized_normal <= 0.0):
+            raise ValueError("Quadrilateral is not convex, its bilinear map would fold over")
+
+        abc = 0.5 * magnitude(np.cross(self.b - self.a, self.c - self.a))
+        acd = self.area - abc
+        self.centroid = (abc * (self.a + self.b + self.c) + acd * (self.a + self.c + self.d)) / (3.0 * self.area)
+        self.id = Quadrilateral.CURR_ID
+        Quadrilateral.CURR_ID += 1
+
+    def __repr__(self):
+        classname = type(self).__name__
+        return f"{classname}({self.id})"
+
+    def surface_location(self, xi, eta):
+        assert xi <= 1.0 and xi >= -1.0
+        assert eta <= 1.0 and eta >= -1.0
+        return bilinear_shape_functions([xi], [eta])[0] @ self.vertices
+
+    def jacobian(self, xi, eta):
+        """
+        Returns:
+            array: The area scale of the bilinear map at each of the points
+                (xi, eta), which integrates to the area over [-1, 1]^2.
+        """
+        d_xi, d_eta = bilinear_tangents(self.vertices, np.atleast_1d(xi), np.atleast_1d(eta))
+        return np.cross(d_xi, d_eta) @ self.normalized_normal
+
+    def split(self):
+        """
+        Returns:
+            (Triangle, Triangle): abc and acd.
+        """
+        return Triangle(self.a, self.b, self.c), Triangle(self.a, self.c, self.d)
+
+    def integration_points(self, quadrature):
+        """
+        Args:
+            quadrature (Quadrature): A rule on [-1, 1]^2, e.g.
+                QuadrilateralGaussLegendre2D.
+
+        Returns:
+            (array, array): (Q, 3) physical quadrature points and (Q,)
+                weights, which sum to the area.
+        """
+        if hasattr(quadrature, "quad_domain_to_func_domain"):
+            raise ValueError(f"{type(quadrature).__name__} is a triangle rule, quadrilaterals need a rule on [-1, 1]^2")
+        xi, eta = np.array(quadrature.qps, dtype=np.float64).reshape(-1, 2).T
+        points = bilinear_shape_functions(xi, eta) @ self.vertices
+        return points, np.array(quadrature.weights, dtype=np.float64) * self.jacobian(xi, eta)
+
 
 class DegenerateIntersection(Exception):
     """
@@ -134,7 +395,7 @@ class DegenerateIntersection(Exception):
         2) The hyperplanes are parallel and never intersect.
     """
     def __init__(self):
-        Except.__init__(self, "Degenerate intersection occured")
+        Exception.__init__(self, "Degenerate intersection occured")
 
 
 class Line:
@@ -164,12 +425,8 @@ class Line:
         Raises:
             DegenerateIntersection
         """
-        try:
-            t = self.get_distance_to_plane(plane)
-            return t, self.get_point(t)
-        except DegenerateIntersection as di:
-            raise di
-            return 0.0, self.point
+        t = self.get_distance_to_plane(plane)
+        return t, self.get_point(t)
 
 
 def get_intersection_point(line1, line2):
@@ -247,14 +504,24 @@ def adaptive_triangle_view_factor(from_triangle, to_triangle, epsabs=1.0e-14, ep
     }
 
     triangle_diff_view_factor = generate_triangles_diff_view_factor(from_triangle, to_triangle)
-    ref_quad, error = nquad(triangle_diff_view_factor, quad_bounds, opts=opts)
+    if instrumentation.ENABLED:
+        ref_quad, error, info = nquad(triangle_diff_view_factor, quad_bounds, opts=opts, full_output=True)
+        instrumentation.count("pairs/adaptive")
+        instrumentation.count("integrand_evaluations/adaptive", info["neval"])
+    else:
+        ref_quad, error = nquad(triangle_diff_view_factor, quad_bounds, opts=opts)
     return (quad_scale * ref_quad) / from_triangle.area
 
 
 def get_fixed_triangle_view_factor(quadrature):
     quad_domain_to_func_domain = quadrature.quad_domain_to_func_domain
+    n_evaluations = len(quadrature.qps) ** 2
 
     def triangle_view_factor(from_triangle, to_triangle):
+        if instrumentation.ENABLED:
+            instrumentation.count("pairs/fixed")
+            instrumentation.count("integrand_evaluations/fixed", n_evaluations)
+
         quad_scale = 4.0 * from_triangle.area * to_triangle.area
         triangle_diff_view_factor = generate_triangles_diff_view_factor(from_triangle, to_triangle)
 
@@ -269,6 +536,27 @@ def get_fixed_triangle_view_factor(quadrature):
     return triangle_view_factor
 
 
+def get_fixed_element_view_factor(from_quadrature, to_quadrature):
+    """
+    The fixed quadrature view factor between any two planar elements with an
+    integration_points method, e.g. a Triangle and a Quadrilateral, each with
+    its own rule.
+    """
+    def element_view_factor(from_element, to_element):
+        from_points, from_weights = from_element.integration_points(from_quadrature)
+        to_points, to_weights = to_element.integration_points(to_quadrature)
+        if instrumentation.ENABLED:
+            instrumentation.count("pairs/fixed")
+            instrumentation.count("integrand_evaluations/fixed", len(from_weights) * len(to_weights))
+
+        s = to_points[np.newaxis, :, :] - from_points[:, np.newaxis, :]
+        s_squared = np.einsum("pqd,pqd->pq", s, s)
+        numerator = -1.0 * (s @ from_element.normalized_normal) * (s @ to_element.normalized_normal)
+        kernel = numerator / (np.pi * s_squared * s_squared)
+        return float(from_weights @ kernel @ to_weights) / from_element.area
+    return element_view_factor
+
+
 if __name__ == '__main__':
     tri_a = Triangle(
             [0.0,  0.0, 0.0],
@@ -0,0 +1,289 @@
+"""
+Hemicube view factors.
+
+A unit hemicube is placed on the centroid of the emitting element: the top
+face spans [-1, 1]^2 at height 1 and the four half height side faces close it
+off. Every other triangle is clipped against the near plane of each face,
+projected onto it and rasterized with a z-buffer, so that each pixel is
+owned by the nearest triangle. The view factor to a triangle is the sum of
+the precomputed delta form factors of its pixels,
+
+    top face:  dF = dA / (pi (u^2 + v^2 + 1)^2)
+    side face: dF = v dA / (pi (u^2 + v^2 + 1)^2)
+
+where (u, v) are the pixel center coordinates on the face. The approximation
+treats each row's element as a point, so nearby pairs are less accurate than
+with the quadrature engines, but every row costs a few vectorized passes over
+the mesh.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy import sparse
+from .mesh import TriangleMesh, as_mesh
+from .monte_carlo import ragged_ranges, tangent_frames
+from .precision import get_policy
+from . import instrumentation
+
+NEAR_PLANE = 1.0E-6 # relative to the scene size
+PIXEL_CHUNK = 2**21 # triangle-pixel pairs tested at once
+
+# (forward, u, v) axes of the faces in the local (tangent, bitangent, normal)
+# frame, with the signs of the axes
+FACES = (
+    ((2, 1.0), (0, 1.0), (1, 1.0)),   # top
+    ((0, 1.0), (1, 1.0), (2, 1.0)),   # +x
+    ((0, -1.0), (1, -1.0), (2, 1.0)), # -x
+    ((1, 1.0), (0, -1.0), (2, 1.0)),  # +y
+    ((1, -1.0), (0, 1.0), (2, 1.0)),  # -y
+)
+
+
+class Hemicube:
+    def __init__(self, resolution):
+        """
+        Args:
+            resolution (int): Pixels along an edge of the top face, even.
+        """
+        if resolution < 2 or resolution % 2:
+            raise ValueError("The hemicube resolution must be an even number of at least 2.")
+        self.resolution = resolution
+        self.pixel_size = 2.0 / resolution
+        centers = -1.0 + (np.arange(resolution) + 0.5) * self.pixel_size
+        pixel_area = self.pixel_size**2
+
+        u, v = np.meshgrid(centers, centers, indexing="ij")
+        self.top = pixel_area / (np.pi * (u**2 + v**2 + 1.0)**2)
+        u, v = np.meshgrid(centers, centers[resolution // 2:], indexing="ij")
+        self.side = pixel_area * v / (np.pi * (u**2 + v**2 + 1.0)**2)
+
+    def face(self, index):
+        """
+        Returns:
+            (array, float): The delta form factors of the face's pixels and
+                the lower bound of v on it.
+        """
+        return (self.top, -1.0) if index == 0 else (self.side, 0.0)
+
+
+def clip_near(points, near):
+    """
+    Clips triangles against the plane w = near, w being the last coordinate.
+
+    Args:
+        points (array): (T, 3, 3) triangle vertices (u, v, w).
+
+    Returns:
+        (array, array): (T', 3, 3) clipped triangles and the index of the
+            triangle each came from.
+    """
+    inside = points[:, :, 2] > near
+    n_inside = inside.sum(axis=1)
+    kept = [points[n_inside == 3]]
+    sources = [np.flatnonzero(n_inside == 3)]
+
+    def intersect(p, q):
+        t = (near - p[:, 2]) / (q[:, 2] - p[:, 2])
+        return p + t[:, np.newaxis] * (q - p)
+
+    for count in (1, 2):
+        triangles = np.flatnonzero(n_inside == count)
+        if not len(triangles):
+            continue
+        # roll the vertices so that the odd one out comes first
+        odd = inside[triangles] if count == 1 else ~inside[triangles]
+        shift = np.argmax(odd, axis=1)
+        order = (shift[:, np.newaxis] + np.arange(3)) % 3
+        p0, p1, p2 = np.moveaxis(np.take_along_axis(points[triangles], order[:, :, np.newaxis], axis=1), 1, 0)
+        a = intersect(p0, p1)
+        b = intersect(p0, p2)
+        if count == 1:
+            kept.append(np.stack((p0, a, b), axis=1))
+            sources.append(triangles)
+        else:
+            kept.append(np.stack((a, p1, p2), axis=1))
+            kept.append(np.stack((a, p2, b), axis=1))
+            sources += [triangles, triangles]
+
+    return np.concatenate(kept), np.concatenate(sources)
+
+
+class HemicubeEngine:
+    def __init__(self, triangles, resolution=64, precision=None):
+        """
+        Args:
+            triangles: A TriangleMesh or a sequence of Triangles (or
+                problem_domain elements), in the order of the matrix rows.
+            resolution (int): Pixels along an edge of the hemicube's top face.
+            precision (PrecisionPolicy): Projection and rasterization use its
+                hemicube dtype, DOUBLE by default. Delta form factors are
+                summed in float64.
+        """
+        self.mesh = as_mesh(triangles)
+        self.precision = get_policy(precision)
+        self.dtype = self.precision.compute_dtype("hemicube")
+        self.hemicube = Hemicube(resolution)
+        self.frames = tangent_frames(self.mesh)
+        extent = np.ptp(self.mesh.vertices.reshape(-1, 3), axis=0)
+        self.near = NEAR_PLANE * max(np.sqrt(extent @ extent), 1.0E-300)
+
+    def row(self, index):
+        """
+        Returns:
+            (array, array): The elements seen from element index and the view
+                factors to them.
+        """
+        mesh = self.mesh
+        center = mesh.centroids[index]
+        frame = np.stack((self.frames[0][index], self.frames[1][index], mesh.normals[index]))
+        local = ((mesh.vertices - center) @ frame.T).astype(self.dtype) # (N, 3, 3) in the tangent frame
+
+        # elements entirely below the hemicube can neither be seen nor occlude
+        candidates = np.flatnonzero((local[:, :, 2] > self.near).any(axis=1))
+        candidates = candidates[candidates != index]
+        front = np.einsum("ij,ij->i", mesh.normals[candidates], center - mesh.a[candidates]) > 0.0
+
+        local = local[candidates]
+        view_factors = np.zeros(len(candidates))
+        for face_index, ((w_axis, w_sign), (u_axis, u_sign), (v_axis, v_sign)) in enumerate(FACES):
+            points = np.stack((u_sign * local[:, :, u_axis], v_sign * local[:, :, v_axis],
+                               w_sign * local[:, :, w_axis]), axis=-1)
+            owners, delta_form_factors = self.rasterize(face_index, points)
+            view_factors += np.bincount(owners, weights=delta_form_factors, minlength=len(candidates))
+
+        seen = front & (view_factors > 0.0)
+        instrumentation.count("rows/hemicube")
+        return candidates[seen], view_factors[seen]
+
+    def rasterize(self, face_index, points):
+        """
+        Args:
+            points (array): (T, 3, 3) triangles in the face's (u, v, w)
+                coordinates, w pointing from the center into the face.
+
+        Returns:
+            (array, array): For every pixel covered, the index of the
+                nearest triangle and the pixel's delta form factor.
+        """
+        pixels, v_lower = self.hemicube.face(face_index)
+        n_u, n_v = pixels.shape
+        size = self.hemicube.pixel_size
+
+        clipped, sources = clip_near(points, self.near)
+        if not len(clipped):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        inverse_w = 1.0 / clipped[:, :, 2]
+        projected = clipped[:, :, :2] * inverse_w[:, :, np.newaxis] # (T, 3, 2)
+
+        # pixel bounding boxes, clipped to the face
+        lower = np.floor((projected.min(axis=1) - [-1.0, v_lower]) / size - 0.5).astype(np.int64) + 1
+        upper = np.ceil((projected.max(axis=1) - [-1.0, v_lower]) / size - 0.5).astype(np.int64) - 1
+        lower = np.maximum(lower, 0)
+        upper = np.minimum(upper, [n_u - 1, n_v - 1])
+        spans = np.maximum(upper - lower + 1, 0)
+        counts = spans[:, 0] * spans[:, 1]
+
+        edge_a = projected[:, 1] - projected[:, 0]
+        edge_b = projected[:, 2] - projected[:, 0]
+        doubled_area = edge_a[:, 0] * edge_b[:, 1] - edge_a[:, 1] * edge_b[:, 0]
+        visible = (counts > 0) & (np.abs(doubled_area) > 1.0E-12 * size * size)
+        triangles = np.flatnonzero(visible)
+
+        pixel_ids, owners, depths = [], [], []
+        # split the triangles so that each chunk tests about PIXEL_CHUNK pairs
+        chunk_ids = np.cumsum(counts[triangles]) // PIXEL_CHUNK
+        for chunk in np.split(triangles, np.flatnonzero(np.diff(chunk_ids)) + 1):
+            if not len(chunk):
+                continue
+            pair_counts = counts[chunk]
+            pair_triangles = np.repeat(chunk, pair_counts)
+            local_ids = ragged_ranges(np.zeros(len(chunk), dtype=np.int64), pair_counts)
+            iu, iv = np.divmod(local_ids, spans[pair_triangles, 1])
+            iu += lower[pair_triangles, 0]
+            iv += lower[pair_triangles, 1]
+            centers = np.stack((-1.0 + (iu + 0.5) * size, v_lower + (iv + 0.5) * size), axis=1).astype(projected.dtype)
+
+            # barycentric coordinates of the pixel centers
+            offsets = centers - projected[pair_triangles, 0]
+            l1 = (offsets[:, 0] * edge_b[pair_triangles, 1] - offsets[:, 1] * edge_b[pair_triangles, 0]) \
+                / doubled_area[pair_triangles]
+            l2 = (edge_a[pair_triangles, 0] * offsets[:, 1] - edge_a[pair_triangles, 1] * offsets[:, 0]) \
+                / doubled_area[pair_triangles]
+            l0 = 1.0 - l1 - l2
+            covered = (l0 >= 0.0) & (l1 >= 0.0) & (l2 >= 0.0)
+
+            # 1 / w is linear in screen space
+            depth = (l0 * inverse_w[pair_triangles, 0] + l1 * inverse_w[pair_triangles, 1]
+                     + l2 * inverse_w[pair_triangles, 2])
+            pixel_ids.append((iu * n_v + iv)[covered])
+            owners.append(sources[pair_triangles[covered]])
+            depths.append(depth[covered])
+
+        if not pixel_ids:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        pixel_ids = np.concatenate(pixel_ids)
+        owners = np.concatenate(owners)
+        depths = np.concatenate(depths)
+
+        # z-buffer: the largest 1 / w, i.e. the nearest triangle, owns a pixel
+        order = np.lexsort((-depths, pixel_ids))
+        pixel_ids = pixel_ids[order]
+        first = np.concatenate(([True], pixel_ids[1:] != pixel_ids[:-1]))
+        return owners[order][first], pixels.ravel()[pixel_ids[first]]
+
+    def compute(self, rows=None, jobs=1, progress=None):
+        """
+        Args:
+            rows (array): Elements to compute the rows of, all by default.
+            jobs (int): Number of worker processes.
+            progress (callable): Called with (rows done, total rows).
+
+        Returns:
+            csr_matrix: (N, N) view factors.
+        """
+        n = len(self.mesh)
+        rows = np.arange(n) if rows is None else np.asarray(rows)
+        blocks = [block for block in np.array_split(rows, max(1, min(len(rows), 8 * jobs))) if len(block)]
+        results = []
+
+        with instrumentation.stage("hemicube"):
+            if jobs <= 1:
+                for block in blocks:
+                    results.append(_compute_rows(self, block))
+                    if progress is not None:
+                        progress(sum(len(r[0]) for r in results), len(rows))
+            else:
+                initargs = (self.mesh.vertices, self.hemicube.resolution, self.precision)
+                with ProcessPoolExecutor(max_workers=jobs, initializer=_initialize_worker,
+                                         initargs=initargs) as executor:
+                    futures = [executor.submit(_compute_worker_rows, block) for block in blocks]
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        if progress is not None:
+                            progress(sum(len(r[0]) for r in results), len(rows))
+
+        row_ids = np.concatenate([np.repeat(block, counts) for block, counts, _, _ in results]) \
+            if results else np.empty(0, dtype=np.intp)
+        col_ids = np.concatenate([cols for _, _, cols, _ in results]) if results else np.empty(0, dtype=np.intp)
+        values = np.concatenate([vals for _, _, _, vals in results]) if results else np.empty(0)
+        return sparse.csr_matrix((values, (row_ids, col_ids)), shape=(n, n))
+
+
+def _compute_rows(engine, block):
+    counts, cols, values = [], [], []
+    for index in block:
+        seen, view_factors = engine.row(index)
+        counts.append(len(seen))
+        cols.append(seen)
+        values.append(view_factors)
+    return block, np.array(counts, dtype=np.intp), np.concatenate(cols), np.concatenate(values)
+
+
+_worker_engine = None
+
+def _initialize_worker(vertices, resolution, precision):
+    global _worker_engine
+    _worker_engine = HemicubeEngine(TriangleMesh(vertices, validate=False), resolution, precision)
+
+
+def _compute_worker_rows(block):
+    return _compute_rows(_worker_engine, block)
@@ -0,0 +1,204 @@
+"""
+Aggregation of element view factors onto a hierarchy of surfaces.
+
+SurfaceIndex walks the surface tree depth first, a surface's own elements
+before those of its subsurfaces, so that every surface and subsurface covers a
+contiguous range of element positions. A level of the hierarchy is reduced
+from the element matrix with a sparse membership matrix P as
+
+    F_S = diag(1 / A_S) P diag(A) F P^T,    A_S = P A
+
+which is the area weighted average of the element view factors.
+"""
+import numpy as np
+from scipy import sparse
+from .gebhart import ThermalNetwork
+
+PATH_SEPARATOR = "/"
+
+
+class SurfaceNode:
+    def __init__(self, surface, name, depth, parent, begin):
+        """
+        The elements of the node are positions [begin, end) of the index, its
+        own (those not in a subsurface) [begin, own_end).
+        """
+        self.surface = surface
+        self.name = name
+        self.depth = depth
+        self.parent = parent
+        self.children = []
+        self.begin = begin
+        self.own_end = begin
+        self.end = begin
+
+    def __len__(self):
+        return self.end - self.begin
+
+    def __repr__(self):
+        return f"SurfaceNode({self.name}, [{self.begin}, {self.end}))"
+
+
+class SurfaceIndex:
+    def __init__(self, surfaces):
+        """
+        Args:
+            surfaces (list): The top level problem_domain.Surfaces. The
+                surfaces hold either element objects or facet index arrays,
+                not both.
+        """
+        self.nodes = [] # depth first, parents before their subsurfaces
+        self.by_name = {}
+        self.elements = []
+        facets = []
+
+        stack = [(surface, None) for surface in reversed(surfaces)]
+        position = 0
+        unnamed = 0
+        while stack:
+            surface, parent = stack.pop()
+            if surface is None: # marks the end of parent's subsurfaces
+                parent.end = position
+                continue
+
+            if surface.name is None:
+                name = f"surface{unnamed}"
+                unnamed += 1
+            else:
+                name = surface.name
+            if parent is not None:
+                name = parent.name + PATH_SEPARATOR + name
+            if name in self.by_name:
+                raise ValueError(f"Duplicate surface name \"{name}\".")
+
+            node = SurfaceNode(surface, name, 0 if parent is None else parent.depth + 1, parent, position)
+            self.elements.extend(surface.elements)
+            facets.extend(surface.facets)
+            position += len(surface.elements) + sum(len(f) for f in surface.facets)
+            node.own_end = position
+
+            self.nodes.append(node)
+            self.by_name[name] = node
+            if parent is not None:
+                parent.children.append(node)
+            stack.append((None, node))
+            stack += [(subsurface, node) for subsurface in reversed(surface.subsurfaces)]
+
+        if self.elements and facets:
+            raise ValueError("Surfaces mix element objects and facet indices.")
+        if facets:
+            self.order = np.concatenate(facets).astype(np.intp)
+        else:
+            self.order = np.arange(len(self.elements))
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    @property
+    def depth(self):
+        return max((node.depth for node in self.nodes), default=-1) + 1
+
+    def level(self, depth=0):
+        """
+        The partition of the elements at a level of the hierarchy: every
+        surface at the given depth with all of its subsurfaces, and the own
+        elements of the shallower surfaces.
+
+        Returns:
+            (list, list): The surface names and their (begin, end) position
+                ranges.
+        """
+        names, ranges = [], []
+        for node in self.nodes:
+            if node.depth == depth or (node.depth < depth and not node.children):
+                begin, end = node.begin, node.end
+            elif node.depth < depth:
+                begin, end = node.begin, node.own_end
+            else:
+                continue
+            if end > begin:
+                names.append(node.name)
+                ranges.append((begin, end))
+        return names, ranges
+
+    def membership(self, ranges, n_elements=None):
+        """
+        Returns:
+            csr_matrix: (S, N) with P[s, e] = 1 if element e (a column of the
+                element matrix) belongs to range s.
+        """
+        n_elements = len(self) if n_elements is None else n_elements
+        lengths = np.array([end - begin for begin, end in ranges], dtype=np.intp)
+        positions = np.concatenate([np.arange(begin, end) for begin, end in ranges]) \
+            if ranges else np.empty(0, dtype=np.intp)
+        rows = np.repeat(np.arange(len(ranges)), lengths)
+        return sparse.csr_matrix((np.ones(len(positions)), (rows, self.order[positions])),
+                                 shape=(len(ranges), n_elements))
+
+
+def aggregate_view_factors(view_factors, areas, membership):
+    """
+    Args:
+        view_factors (array, sparse matrix or OutOfCoreMatrix): (N, N)
+            element view factors.
+        areas (array): (N,) element areas.
+        membership (sparse matrix): (S, N) from SurfaceIndex.membership.
+
+    Returns:
+        (array, array): (S,) surface areas and the (S, S) surface view factors.
+    """
+    if hasattr(view_factors, "aggregate"): # streams over an out-of-core matrix
+        return view_factors.aggregate(membership, areas)
+    areas = np.asarray(areas, dtype=np.float64)
+    surface_areas = membership @ areas
+    weighted = membership.multiply(areas[np.newaxis, :]).tocsr() # P diag(A)
+    exchange = weighted @ view_factors @ membership.T
+    exchange = exchange.toarray() if sparse.issparse(exchange) else np.asarray(exchange)
+    return surface_areas, exchange / surface_areas[:, np.newaxis]
+
+
+def lookup_emissivity(emissivities, name, default=None):
+    """
+    Looks the surface up by its full path first and then by the paths of its
+    parents, so a subsurface inherits the emissivity of its surface.
+    """
+    path = name
+    while path:
+        if path in emissivities:
+            return emissivities[path]
+        path = path.rpartition(PATH_SEPARATOR)[0]
+    if default is None:
+        raise KeyError(name)
+    return default
+
+
+def build_thermal_network(index, view_factors, areas, emissivities, level=0,
+                          default_eps=None, name=None):
+    """
+    Populates a ThermalNetwork with the surfaces of one level of the hierarchy
+    and their aggregated view factors in bulk.
+
+    Args:
+        index (SurfaceIndex): The surface hierarchy.
+        view_factors (array, sparse matrix or OutOfCoreMatrix): (N, N)
+            element view factors.
+        areas (array): (N,) element areas.
+        emissivities (dict): Surface name -> emissivity.
+        level (int): Depth of the hierarchy to aggregate to.
+        default_eps (float): Emissivity of surfaces missing in emissivities.
+
+    Returns:
+        ThermalNetwork
+    """
+    names, ranges = index.level(level)
+    surface_areas, surface_view_factors = aggregate_view_factors(
+        view_factors, areas, index.membership(ranges, len(areas)))
+
+    tn = ThermalNetwork(name)
+    eps = [lookup_emissivity(emissivities, surface_name, default_eps) for surface_name in names]
+    tn.add_surfaces(names, surface_areas, eps)
+    tn.add_view_factor_matrix(names, surface_view_factors)
+    return tn
@@ -0,0 +1,191 @@
+"""
+Low overhead instrumentation of the view factor pipeline.
+
+Counters (integrand evaluations, pairs per engine, cache hits, ...) and stage
+timers are only recorded while instrumentation is enabled::
+
+    with instrument() as report:
+        problem.calculate_view_factors()
+    print(report.to_dict())
+
+When disabled, stage() and count() return immediately and hot loops guard
+their bookkeeping with ``if instrumentation.ENABLED``, so the cost is a module
+attribute lookup.
+"""
+import sys
+import json
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+ENABLED = False
+TRACK_MEMORY = False
+
+
+class StageTiming:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+class Report:
+    def __init__(self):
+        self.counters = {} # name -> count
+        self.stages = {} # name -> StageTiming
+        self.peak_memory = None # bytes allocated through Python, if tracked
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, elapsed):
+        if name not in self.stages:
+            self.stages[name] = StageTiming()
+        self.stages[name].add(elapsed)
+
+    def to_dict(self):
+        return {
+            "counters" : dict(self.counters),
+            "stages" : {
+                name : {"calls" : timing.calls, "total_s" : timing.total, "max_s" : timing.max}
+                for name, timing in self.stages.items()
+            },
+            "peak_memory_bytes" : self.peak_memory,
+            "max_rss_bytes" : max_rss(),
+        }
+
+    def records(self):
+        for name, value in self.counters.items():
+            yield {"type" : "counter", "name" : name, "value" : value}
+        for name, timing in self.stages.items():
+            yield {"type" : "stage", "name" : name, "calls" : timing.calls,
+                   "total_s" : timing.total, "max_s" : timing.max}
+        yield {"type" : "memory", "peak_memory_bytes" : self.peak_memory, "max_rss_bytes" : max_rss()}
+
+    def write_json_lines(self, stream=sys.stdout):
+        for record in self.records():
+            stream.write(json.dumps(record) + "\n")
+
+    def __str__(self):
+        lines = []
+        for name, timing in sorted(self.stages.items(), key=lambda item: -item[1].total):
+            lines.append(f"{name:<32} {timing.total:>10.4f} s {timing.calls:>10} calls")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<32} {value:>12}")
+        if self.peak_memory is not None:
+            lines.append(f"{'peak memory':<32} {self.peak_memory / 2**20:>10.2f} MiB")
+        return "\n".join(lines)
+
+
+report = Report()
+
+
+def max_rss():
+    """
+    Returns:
+        int: The peak resident set size of the process in bytes, if known.
+    """
+    try:
+        import resource
+    except ImportError: # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def enable(track_memory=False):
+    global ENABLED, TRACK_MEMORY
+    ENABLED = True
+    TRACK_MEMORY = track_memory
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global ENABLED, TRACK_MEMORY
+    if TRACK_MEMORY and tracemalloc.is_tracing():
+        report.peak_memory = max(report.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    ENABLED = False
+    TRACK_MEMORY = False
+
+
+def reset():
+    global report
+    report = Report()
+    if TRACK_MEMORY and tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def get_report():
+    if TRACK_MEMORY and tracemalloc.is_tracing():
+        report.peak_memory = max(report.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+    return report
+
+
+def count(name, n=1):
+    if ENABLED:
+        report.count(name, n)
+
+
+class stage:
+    """
+    Context manager timing one pipeline stage, e.g.
+
+        with stage("assembly"):
+            ...
+    """
+    __slots__ = ("name", "begin")
+
+    def __init__(self, name):
+        self.name = name
+        self.begin = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.begin = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.begin is not None and ENABLED:
+            report.add_time(self.name, perf_counter() - self.begin)
+        return False
+
+
+@contextmanager
+def instrument(track_memory=False):
+    """
+    Enables instrumentation on a fresh report for the duration of the block.
+    Blocks nest: the enclosing report, memory tracking and tracemalloc
+    session are restored on exit, and a tracemalloc session started by the
+    caller is left running.
+
+    Yields:
+        Report: The report being filled in.
+    """
+    global ENABLED, TRACK_MEMORY, report
+    previous, was_enabled, was_tracking = report, ENABLED, TRACK_MEMORY
+    was_tracing = tracemalloc.is_tracing()
+    if was_tracking and was_tracing: # the peak so far belongs to the enclosing block
+        previous.peak_memory = max(previous.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+    ENABLED = True
+    TRACK_MEMORY = track_memory
+    report = Report()
+    if track_memory:
+        if was_tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+    current = report
+    try:
+        yield current
+    finally:
+        get_report()
+        if track_memory and not was_tracing:
+            tracemalloc.stop()
+        report, ENABLED, TRACK_MEMORY = previous, was_enabled, was_tracking
@@ -0,0 +1,212 @@
+"""
+Struct-of-arrays storage for triangular meshes.
+
+TriangleMesh keeps the vertices and derived quantities of every facet in a
+handful of contiguous arrays, which is far more compact than one Triangle per
+facet and lets geometric quantities be computed in bulk. TriangleView exposes a
+single facet with the same attributes as a Triangle so that the existing pair
+kernels can still be used.
+"""
+import numpy as np
+from .geometry import Triangle
+
+DEGENERACY_TOL = 1.0E-14 # same tolerance as geometry.about_zero
+
+
+class DegenerateTrianglesException(Exception):
+    def __init__(self, indices):
+        self.indices = indices
+        shown = ", ".join(str(i) for i in indices[:10])
+        more = ", ..." if len(indices) > 10 else ""
+        Exception.__init__(self, f"{len(indices)} degenerate triangle(s): {shown}{more}")
+
+
+class TriangleView:
+    """
+    A lightweight, Triangle compatible reference to one facet of a TriangleMesh.
+    """
+    __slots__ = ("mesh", "id")
+
+    def __init__(self, mesh, index):
+        self.mesh = mesh
+        self.id = index
+
+    @property
+    def a(self):
+        return self.mesh.vertices[self.id, 0]
+
+    @property
+    def b(self):
+        return self.mesh.vertices[self.id, 1]
+
+    @property
+    def c(self):
+        return self.mesh.vertices[self.id, 2]
+
+    @property
+    def area(self):
+        return self.mesh.areas[self.id]
+
+    @property
+    def magnitude(self):
+        return 2.0 * self.mesh.areas[self.id]
+
+    @property
+    def normalized_normal(self):
+        return self.mesh.normals[self.id]
+
+    @property
+    def normal(self):
+        return self.magnitude * self.mesh.normals[self.id]
+
+    @property
+    def centroid(self):
+        return self.mesh.centroids[self.id]
+
+    def __eq__(self, other):
+        return isinstance(other, TriangleView) and self.mesh is other.mesh and self.id == other.id
+
+    def __hash__(self):
+        return hash((id(self.mesh), self.id))
+
+    def __repr__(self):
+        classname = type(self).__name__
+        return f"{classname}({self.id})"
+
+    project_onto = Triangle.project_onto
+    point_on = Triangle.point_on
+    surface_location = Triangle.surface_location
+
+
+class TriangleMesh:
+    def __init__(self, vertices, validate=True):
+        """
+        Args:
+            vertices (array): (N, 3, 3) array of triangle vertices where
+                vertices[i] holds a, b and c of triangle i oriented counter
+                clockwise w.r.t. the surface normal.
+            validate (bool): Raise DegenerateTrianglesException if any of the
+                triangles have (numerically) zero area.
+        """
+        vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+        if vertices.ndim != 3 or vertices.shape[1:] != (3, 3):
+            raise ValueError(f"Expected an (N, 3, 3) vertex array, got {vertices.shape}")
+
+        a, b, c = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+        cross = np.cross(b - a, c - a)
+        magnitudes = np.sqrt(np.einsum("ij,ij->i", cross, cross))
+
+        degenerate = magnitudes <= DEGENERACY_TOL
+        if validate and degenerate.any():
+            raise DegenerateTrianglesException(np.flatnonzero(degenerate))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.normals = cross / magnitudes[:, np.newaxis]
+        self.vertices = vertices
+        self.areas = 0.5 * magnitudes
+        self.centroids = vertices.mean(axis=1)
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        return cls(np.array([[tri.a, tri.b, tri.c] for tri in triangles]))
+
+    @classmethod
+    def from_mesh_data(cls, mesh_data):
+        return cls(mesh_data.triangles())
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            n = len(self)
+            if not -n <= index < n:
+                raise IndexError(index)
+            return TriangleView(self, int(index) % n)
+        return TriangleMesh(self.vertices[index], validate=False)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TriangleView(self, i)
+
+    @property
+    def a(self):
+        return self.vertices[:, 0]
+
+    @property
+    def b(self):
+        return self.vertices[:, 1]
+
+    @property
+    def c(self):
+        return self.vertices[:, 2]
+
+    @property
+    def total_area(self):
+        return self.areas.sum()
+
+    @property
+    def nbytes(self):
+        arrays = (self.vertices, self.normals, self.areas, self.centroids)
+        return sum(array.nbytes for array in arrays)
+
+    def surface_locations(self, xi, eta):
+        """
+        Vectorized counterpart of Triangle.surface_location.
+
+        Args:
+            xi, eta (array): (Q,) parametric coordinates on the unit triangle.
+
+        Returns:
+            array: (N, Q, 3) position vectors of every point on every triangle.
+        """
+        xi = np.asarray(xi, dtype=np.float64)
+        eta = np.asarray(eta, dtype=np.float64)
+        shape_functions = np.stack((1.0 - xi - eta, xi, eta), axis=-1) # (Q, 3)
+        return np.einsum("qk,nkd->nqd", shape_functions, self.vertices)
+
+
+def as_mesh(triangles):
+    """
+    Args:
+        triangles: A TriangleMesh or a sequence of Triangles (or
+            problem_domain elements).
+    """
+    if isinstance(triangles, TriangleMesh):
+        return triangles
+    return TriangleMesh.from_triangles(triangles)
+
+
+def rectangle_triangles(origin, u, v, n_u, n_v, crossed=False):
+    """
+    Meshes the parallelogram spanned by u and v with 2 * n_u * n_v triangles
+    whose normals point along u x v. With crossed, every cell is split into
+    four triangles around its center instead, which keeps the mirror
+    symmetries of the parallelogram.
+
+    Returns:
+        array: (2 * n_u * n_v, 3, 3) or (4 * n_u * n_v, 3, 3) triangle vertices.
+    """
+    origin, u, v = (np.asarray(vec, dtype=np.float64) for vec in (origin, u, v))
+    s = np.arange(n_u)[:, np.newaxis] / n_u
+    t = np.arange(n_v)[np.newaxis, :] / n_v
+    corner = origin + s[..., np.newaxis] * u + t[..., np.newaxis] * v
+    du = u / n_u
+    dv = v / n_v
+
+    p00 = corner.reshape(-1, 3)
+    p10 = p00 + du
+    p01 = p00 + dv
+    p11 = p00 + du + dv
+    if crossed:
+        center = p00 + 0.5 * (du + dv)
+        return np.concatenate([
+            np.stack((p00, p10, center), axis=1),
+            np.stack((p10, p11, center), axis=1),
+            np.stack((p11, p01, center), axis=1),
+            np.stack((p01, p00, center), axis=1),
+        ])
+
+    lower = np.stack((p00, p10, p11), axis=1)
+    upper = np.stack((p00, p11, p01), axis=1)
+    return np.concatenate((lower, upper))
@@ -0,0 +1,283 @@
+"""
+Streaming readers for STL (binary and ASCII) and OBJ meshes.
+
+Facets are read in chunks straight into contiguous vertex and index arrays; no
+per-facet Python objects are created. Surface groups (OBJ ``g``/``o``
+statements, ASCII STL ``solid`` blocks) are kept as a per-facet group index.
+Group names containing ``/`` describe a hierarchy, e.g. ``wall/left`` is the
+``left`` subsurface of ``wall``.
+"""
+import os
+import numpy as np
+from .problem_domain import Surface
+
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_GROUP = "default"
+GROUP_SEPARATOR = "/"
+
+STL_HEADER_SIZE = 80
+STL_RECORD = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attribute", "<u2"),
+])
+
+
+class MeshFormatError(Exception):
+    def __init__(self, path, reason):
+        Exception.__init__(self, f"Could not read \"{path}\": {reason}")
+
+
+class ArrayBuffer:
+    """
+    A growable 2D array which amortizes appends by doubling its capacity.
+    """
+    def __init__(self, width, dtype, capacity=1024):
+        self.data = np.empty((capacity, width), dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape(-1, self.data.shape[1])
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            capacity = max(needed, 2 * len(self.data))
+            grown = np.empty((capacity, self.data.shape[1]), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = rows
+        self.size = needed
+
+    def array(self):
+        return self.data[:self.size].copy()
+
+
+class MeshData:
+    def __init__(self, vertices, faces, face_groups, group_names):
+        """
+        Args:
+            vertices (array): (V, 3) vertex coordinates.
+            faces (array): (F, 3) vertex indices of each triangular facet,
+                counter clockwise w.r.t. the surface normal.
+            face_groups (array): (F,) index into group_names for each facet.
+            group_names (list): The name of each group.
+        """
+        self.vertices = vertices
+        self.faces = faces
+        self.face_groups = face_groups
+        self.group_names = group_names
+
+    def __len__(self):
+        return len(self.faces)
+
+    def triangles(self):
+        """
+        Returns:
+            array: (F, 3, 3) vertices of every facet.
+        """
+        return self.vertices[self.faces]
+
+    def group_facets(self, name):
+        group = self.group_names.index(name)
+        return np.flatnonzero(self.face_groups == group)
+
+    def merge_vertices(self):
+        """
+        Collapses exactly coincident vertices, e.g. those repeated by STL files.
+        """
+        vertices, inverse = np.unique(self.vertices, axis=0, return_inverse=True)
+        self.vertices = vertices
+        self.faces = inverse.reshape(-1)[self.faces]
+
+
+class GroupTable:
+    def __init__(self):
+        self.names = []
+        self.indices = {}
+
+    def get(self, name):
+        name = name if name else DEFAULT_GROUP
+        if name not in self.indices:
+            self.indices[name] = len(self.names)
+            self.names.append(name)
+        return self.indices[name]
+
+
+def is_binary_stl(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as stl_file:
+        header = stl_file.read(STL_HEADER_SIZE + 4)
+    if len(header) < STL_HEADER_SIZE + 4:
+        return False
+    n_facets = int(np.frombuffer(header[STL_HEADER_SIZE:], dtype="<u4")[0])
+    if size == STL_HEADER_SIZE + 4 + n_facets * STL_RECORD.itemsize:
+        return True
+    return not header.lstrip().startswith(b"solid")
+
+
+def read_binary_stl(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    with open(path, "rb") as stl_file:
+        stl_file.seek(STL_HEADER_SIZE)
+        n_facets = int(np.fromfile(stl_file, dtype="<u4", count=1)[0])
+        vertices = np.empty((3 * n_facets, 3))
+        read = 0
+        while read < n_facets:
+            count = min(chunk_size, n_facets - read)
+            records = np.fromfile(stl_file, dtype=STL_RECORD, count=count)
+            if len(records) != count:
+                raise MeshFormatError(path, f"expected {n_facets} facets, found {read + len(records)}")
+            vertices[3 * read:3 * (read + count)] = records["vertices"].reshape(-1, 3)
+            read += count
+
+    faces = np.arange(3 * n_facets).reshape(n_facets, 3)
+    face_groups = np.zeros(n_facets, dtype=np.intp)
+    return MeshData(vertices, faces, face_groups, [DEFAULT_GROUP])
+
+
+def read_ascii_stl(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    vertices = ArrayBuffer(3, np.float64)
+    face_groups = ArrayBuffer(1, np.intp)
+    groups = GroupTable()
+    group = groups.get(DEFAULT_GROUP)
+
+    pending = [] # vertex coordinate tokens not yet flushed
+    pending_groups = []
+
+    def flush():
+        if pending:
+            vertices.extend(np.array(pending, dtype=np.float64))
+            face_groups.extend(pending_groups)
+            del pending[:]
+            del pending_groups[:]
+
+    with open(path, "r") as stl_file:
+        n_vertices = 0
+        for line in stl_file:
+            tokens = line.split()
+            if not tokens:
+                continue
+            keyword = tokens[0]
+            if keyword == "vertex":
+                pending.append(tokens[1:4])
+                n_vertices += 1
+                if n_vertices % 3 == 0:
+                    pending_groups.append(group)
+                    if len(pending_groups) >= chunk_size:
+                        flush()
+            elif keyword == "solid":
+                group = groups.get(" ".join(tokens[1:]))
+        flush()
+
+    if n_vertices % 3 != 0:
+        raise MeshFormatError(path, "the number of vertices is not a multiple of three")
+
+    n_facets = n_vertices // 3
+    faces = np.arange(n_vertices).reshape(n_facets, 3)
+    return MeshData(vertices.array(), faces, face_groups.array().reshape(-1), groups.names)
+
+
+def read_stl(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    if is_binary_stl(path):
+        return read_binary_stl(path, chunk_size)
+    return read_ascii_stl(path, chunk_size)
+
+
+def parse_obj_index(token, n_vertices):
+    index = int(token.split("/", 1)[0])
+    return index - 1 if index > 0 else n_vertices + index
+
+
+def read_obj(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Polygonal faces are triangulated as fans around their first vertex.
+    """
+    vertices = ArrayBuffer(3, np.float64)
+    faces = ArrayBuffer(3, np.intp)
+    face_groups = ArrayBuffer(1, np.intp)
+    groups = GroupTable()
+    group = groups.get(DEFAULT_GROUP)
+
+    pending_vertices = []
+    pending_faces = []
+    pending_groups = []
+
+    def flush():
+        if pending_vertices:
+            vertices.extend(np.array(pending_vertices, dtype=np.float64))
+            del pending_vertices[:]
+        if pending_faces:
+            faces.extend(pending_faces)
+            face_groups.extend(pending_groups)
+            del pending_faces[:]
+            del pending_groups[:]
+
+    n_vertices = 0
+    with open(path, "r") as obj_file:
+        for line in obj_file:
+            tokens = line.split()
+            if not tokens:
+                continue
+            keyword = tokens[0]
+            if keyword == "v":
+                pending_vertices.append(tokens[1:4])
+                n_vertices += 1
+            elif keyword == "f":
+                polygon = [parse_obj_index(token, n_vertices) for token in tokens[1:]]
+                if len(polygon) < 3:
+                    raise MeshFormatError(path, f"face with {len(polygon)} vertices")
+                for k in range(1, len(polygon) - 1):
+                    pending_faces.append((polygon[0], polygon[k], polygon[k + 1]))
+                    pending_groups.append(group)
+            elif keyword in ("g", "o"):
+                group = groups.get(" ".join(tokens[1:]))
+
+            if len(pending_vertices) + len(pending_faces) >= chunk_size:
+                flush()
+        flush()
+
+    faces = faces.array()
+    if len(faces) and (faces.min() < 0 or faces.max() >= n_vertices):
+        raise MeshFormatError(path, "face refers to a vertex which does not exist")
+    return MeshData(vertices.array(), faces, face_groups.array().reshape(-1), groups.names)
+
+
+def read_mesh(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".stl":
+        return read_stl(path, chunk_size)
+    elif extension == ".obj":
+        return read_obj(path, chunk_size)
+    raise MeshFormatError(path, f"unsupported extension \"{extension}\"")
+
+
+def build_surfaces(mesh_data):
+    """
+    Maps the groups of a mesh onto a hierarchy of Surfaces. Each surface holds
+    the indices of its facets rather than element objects.
+
+    Returns:
+        list: The top level surfaces in order of first appearance.
+    """
+    order = np.argsort(mesh_data.face_groups, kind="stable")
+    counts = np.bincount(mesh_data.face_groups, minlength=len(mesh_data.group_names))
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+
+    top_level = []
+    by_path = {}
+
+    def get_surface(path):
+        if path in by_path:
+            return by_path[path]
+        parent_path, _, name = path.rpartition(GROUP_SEPARATOR)
+        surface = Surface(name)
+        if parent_path:
+            get_surface(parent_path).add_subsurface(surface)
+        else:
+            top_level.append(surface)
+        by_path[path] = surface
+        return surface
+
+    for group, name in enumerate(mesh_data.group_names):
+        if counts[group]:
+            get_surface(name).add_facets(order[bounds[group]:bounds[group + 1]])
+
+    return top_level
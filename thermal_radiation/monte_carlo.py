@@ -0,0 +1,279 @@
+"""
+Monte Carlo ray tracing view factors.
+
+Every element emits cosine weighted rays from uniformly distributed points.
+The estimate of F_ij is the fraction of the rays of element i whose first hit
+is the front side of element j, so occlusion by any other element is taken
+into account. Rays are traced in NumPy batches through a uniform grid: all
+active rays step one cell at a time (3D DDA) and are tested against the
+triangles of their current cell with the Moller-Trumbore algorithm.
+
+The statistical error of an estimate from n rays is sqrt(F (1 - F) / n).
+"""
+import numpy as np
+from scipy import sparse
+from .geometry import moller_trumbore
+from .mesh import as_mesh
+from .precision import get_policy
+from . import instrumentation
+
+RAY_BATCH = 2**16 # rays traced at once
+TRIANGLES_PER_CELL = 2.0 # target density of the uniform grid
+MAX_CELLS_PER_AXIS = 256
+RAY_EPSILON = 1.0E-9 # relative to the scene size
+
+
+def tangent_frames(mesh):
+    """
+    Returns:
+        (array, array): (N, 3) unit tangents and bitangents completing the
+            normals to right handed frames.
+    """
+    tangents = mesh.b - mesh.a
+    tangents /= np.sqrt(np.einsum("ij,ij->i", tangents, tangents))[:, np.newaxis]
+    return tangents, np.cross(mesh.normals, tangents)
+
+
+def sample_rays(mesh, frames, elements, rng):
+    """
+    Cosine weighted rays from uniformly distributed points of the elements.
+
+    Returns:
+        (array, array): (R, 3) origins and unit directions.
+    """
+    u, v, r1, r2 = rng.random((4, len(elements)))
+    s = np.sqrt(u)[:, np.newaxis]
+    v = v[:, np.newaxis]
+    origins = ((1.0 - s) * mesh.a[elements] + s * (1.0 - v) * mesh.b[elements]
+               + s * v * mesh.c[elements])
+
+    radius = np.sqrt(r1)[:, np.newaxis]
+    phi = 2.0 * np.pi * r2[:, np.newaxis]
+    tangents, bitangents = frames
+    directions = (radius * np.cos(phi) * tangents[elements] + radius * np.sin(phi) * bitangents[elements]
+                  + np.sqrt(1.0 - r1)[:, np.newaxis] * mesh.normals[elements])
+    return origins, directions
+
+
+def ragged_ranges(starts, counts):
+    """
+    Returns:
+        array: The concatenation of arange(start, start + count) for every
+            start, count.
+    """
+    total = counts.sum()
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+class UniformGrid:
+    def __init__(self, mesh, triangles_per_cell=TRIANGLES_PER_CELL):
+        """
+        Registers every triangle in the cells its bounding box overlaps.
+        """
+        lower = mesh.vertices.min(axis=1)
+        upper = mesh.vertices.max(axis=1)
+        scene_lower = lower.min(axis=0)
+        scene_upper = upper.max(axis=0)
+        extent = scene_upper - scene_lower
+        size = max(extent.max(), 1.0E-300)
+        padding = 1.0E-6 * size
+        self.lower = scene_lower - padding
+        extent = np.maximum(extent + 2.0 * padding, 1.0E-3 * size)
+
+        cells_wanted = max(1.0, len(mesh) / triangles_per_cell)
+        density = (cells_wanted / np.prod(extent)) ** (1.0 / 3.0)
+        self.dims = np.clip(np.ceil(extent * density).astype(np.int64), 1, MAX_CELLS_PER_AXIS)
+        self.cell_size = extent / self.dims
+
+        first = self.cell_of(lower)
+        last = self.cell_of(upper)
+        spans = last - first + 1
+        counts = np.prod(spans, axis=1)
+        triangle_ids = np.repeat(np.arange(len(mesh)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        spans_r = spans[triangle_ids]
+        kx, rest = np.divmod(local, spans_r[:, 1] * spans_r[:, 2])
+        ky, kz = np.divmod(rest, spans_r[:, 2])
+        cells = first[triangle_ids] + np.stack((kx, ky, kz), axis=1)
+        flat = self.flatten(cells)
+
+        order = np.argsort(flat, kind="stable")
+        self.items = triangle_ids[order]
+        cell_counts = np.bincount(flat, minlength=int(np.prod(self.dims)))
+        self.starts = np.concatenate(([0], np.cumsum(cell_counts)[:-1]))
+        self.counts = cell_counts
+
+    def cell_of(self, points):
+        cells = np.floor((points - self.lower) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.dims - 1)
+
+    def flatten(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+
+class MonteCarloEngine:
+    def __init__(self, triangles, seed=None, precision=None):
+        """
+        Args:
+            triangles: A TriangleMesh or a sequence of Triangles (or
+                problem_domain elements), in the order of the matrix rows.
+            seed: Seed of the random number generator.
+            precision (PrecisionPolicy): The ray intersection tests use its
+                monte_carlo dtype, DOUBLE by default.
+        """
+        self.mesh = as_mesh(triangles)
+        self.grid = UniformGrid(self.mesh)
+        self.frames = tangent_frames(self.mesh)
+        self.dtype = get_policy(precision).compute_dtype("monte_carlo")
+        self.a = self.mesh.a.astype(self.dtype)
+        self.edge1 = (self.mesh.b - self.mesh.a).astype(self.dtype)
+        self.edge2 = (self.mesh.c - self.mesh.a).astype(self.dtype)
+        self.edge_scales = np.sqrt(np.einsum("ij,ij->i", self.edge1, self.edge1)
+                                   * np.einsum("ij,ij->i", self.edge2, self.edge2)) # directions are unit
+        self.rng = np.random.default_rng(seed)
+        relative = max(RAY_EPSILON, 64.0 * np.finfo(self.dtype).eps)
+        self.epsilon = relative * np.sqrt(np.sum((self.grid.dims * self.grid.cell_size)**2))
+
+    def trace(self, origins, directions, sources=None):
+        """
+        Args:
+            origins, directions (array): (R, 3) rays.
+            sources (array): (R,) element each ray leaves from, never hit.
+
+        Returns:
+            (array, array): (R,) index of the first element hit or -1, and
+                the ray parameter of the hit.
+        """
+        n_rays = len(origins)
+        sources = np.full(n_rays, -1) if sources is None else sources
+        grid = self.grid
+        hits = np.full(n_rays, -1, dtype=np.int64)
+        hit_t = np.full(n_rays, np.inf)
+
+        cells = grid.cell_of(origins)
+        step = np.where(directions > 0.0, 1, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1.0 / np.abs(directions)
+            next_boundary = grid.lower + (cells + (step > 0)) * grid.cell_size
+            t_max = np.where(directions != 0.0, (next_boundary - origins) / directions, np.inf)
+            t_delta = np.where(directions != 0.0, grid.cell_size * inverse, np.inf)
+
+        ray_origins = origins.astype(self.dtype, copy=False)
+        ray_directions = directions.astype(self.dtype, copy=False)
+        active = np.arange(n_rays)
+        while len(active):
+            t_exit = t_max[active].min(axis=1)
+            flat = grid.flatten(cells[active])
+            counts = grid.counts[flat]
+            pair_rays = np.repeat(active, counts)
+            pair_triangles = grid.items[ragged_ranges(grid.starts[flat], counts)]
+
+            t = moller_trumbore(ray_origins[pair_rays], ray_directions[pair_rays], self.a[pair_triangles],
+                                self.edge1[pair_triangles], self.edge2[pair_triangles],
+                                scales=self.edge_scales[pair_triangles])
+            t[(t <= self.epsilon) | (pair_triangles == sources[pair_rays])] = np.inf
+            t[t > np.repeat(t_exit, counts) + self.epsilon] = np.inf
+
+            # nearest hit of every ray in its current cell, the pairs of a ray
+            # are contiguous
+            occupied = counts > 0
+            nearest = np.full(len(active), np.inf)
+            if len(t):
+                segment_starts = (np.cumsum(counts) - counts)[occupied]
+                nearest[occupied] = np.minimum.reduceat(t, segment_starts)
+            candidates = np.flatnonzero(np.isfinite(t) & (t == np.repeat(nearest, counts)))
+            found_rays, first = np.unique(pair_rays[candidates], return_index=True)
+            hits[found_rays] = pair_triangles[candidates[first]]
+            hit_t[found_rays] = t[candidates[first]]
+
+            # step the remaining rays into their next cell
+            active = active[~np.isfinite(nearest)]
+            axis = np.argmin(t_max[active], axis=1)
+            cells[active, axis] += step[active, axis]
+            t_max[active, axis] += t_delta[active, axis]
+            inside = (cells[active, axis] >= 0) & (cells[active, axis] < grid.dims[axis])
+            active = active[inside]
+
+        return hits, hit_t
+
+    def compute(self, rays_per_batch=256, max_rays=4096, target_error=None, rows=None):
+        """
+        Args:
+            rays_per_batch (int): Rays per element and round.
+            max_rays (int): Upper limit of rays per element.
+            target_error (float): Elements stop emitting once the standard
+                error of each of their view factors is below this.
+            rows (array): Elements to emit from, all by default.
+
+        Returns:
+            (csr_matrix, array, array): (N, N) view factors, the standard
+                error of every row (its largest entry error) and the rays
+                used per row.
+        """
+        mesh = self.mesh
+        n = len(mesh)
+        rows = np.arange(n) if rows is None else np.asarray(rows)
+        rays = np.zeros(n, dtype=np.int64)
+        hits = sparse.csr_matrix((n, n))
+        errors = np.zeros(n)
+        emitting = rows
+
+        with instrumentation.stage("monte_carlo"):
+            while len(emitting):
+                sources = np.repeat(emitting, rays_per_batch)
+                round_rows, round_cols = [], []
+                for begin in range(0, len(sources), RAY_BATCH):
+                    batch = sources[begin:begin + RAY_BATCH]
+                    origins, directions = sample_rays(mesh, self.frames, batch, self.rng)
+                    targets, _ = self.trace(origins, directions, batch)
+                    front = targets >= 0
+                    front[front] = np.einsum("ij,ij->i", directions[front], mesh.normals[targets[front]]) < 0.0
+                    round_rows.append(batch[front])
+                    round_cols.append(targets[front])
+                instrumentation.count("rays/monte_carlo", len(sources))
+
+                rays[emitting] += rays_per_batch
+                round_rows = np.concatenate(round_rows)
+                hits = hits + sparse.csr_matrix((np.ones(len(round_rows)), (round_rows, np.concatenate(round_cols))),
+                                                shape=(n, n))
+                errors = self.row_errors(hits, rays)
+                emitting = emitting[rays[emitting] + rays_per_batch <= max_rays]
+                if target_error is not None:
+                    emitting = emitting[errors[emitting] > target_error]
+
+        counts = np.maximum(rays, 1).astype(np.float64)
+        view_factors = sparse.diags(1.0 / counts) @ hits
+        return view_factors.tocsr(), errors, rays
+
+    @staticmethod
+    def row_errors(hits, rays):
+        """
+        The largest standard error of the view factors of every row. The
+        estimates are shifted to (hits + 1) / (rays + 2) so that rows (or
+        entries) without any hits yet don't report a zero error.
+        """
+        hits = hits.tocsr()
+        n = np.maximum(rays, 1).astype(np.float64)
+        row_of = np.repeat(np.arange(hits.shape[0]), np.diff(hits.indptr))
+        estimate = (hits.data + 1.0) / (n[row_of] + 2.0)
+        variance = estimate * (1.0 - estimate) / n[row_of]
+        worst = 1.0 / ((n + 2.0) * n) # an entry without hits
+        np.maximum.at(worst, row_of, variance)
+        return np.sqrt(worst)
+
+
+def get_monte_carlo_triangle_view_factor(n_rays=100000, seed=None):
+    """
+    The Monte Carlo counterpart of geometry.get_fixed_triangle_view_factor,
+    for comparing a single unoccluded pair with the other engines.
+    """
+    rng = np.random.default_rng(seed)
+
+    def triangle_view_factor(from_triangle, to_triangle):
+        engine = MonteCarloEngine([from_triangle, to_triangle])
+        engine.rng = rng
+        view_factors, _, _ = engine.compute(rays_per_batch=n_rays, max_rays=n_rays, rows=[0])
+        return view_factors[0, 1]
+
+    return triangle_view_factor
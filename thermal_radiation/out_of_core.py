@@ -0,0 +1,294 @@
+"""
+Out-of-core assembly of element view factor matrices.
+
+The matrix is assembled in blocks of rows whose size follows from a RAM
+budget and written straight to disk, either as a dense memory-mapped ``.npy``
+file or, with a drop tolerance, as a sparse CSR store (a directory holding
+the raw data and index arrays). Only the upper triangle is integrated. In
+dense mode, the lower triangle of a block is read back from the column strip
+of the rows already written. In sparse mode, the transposed entries are
+spilled to per-block bucket files and picked up when their rows are
+assembled.
+
+OutOfCoreMatrix streams over either store one block of rows at a time for
+row sums, matrix-vector products and surface aggregation.
+"""
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
+from .assembly import PAIR_CHUNK_BYTES, PairKernel, reference_points, upper_triangle_block
+from .assembly import _initialize_worker, _compute_block
+from .precision import get_policy
+from . import instrumentation
+
+DEFAULT_RAM_BUDGET = 256 * 2**20
+BYTES_PER_BLOCK_ENTRY = 40 # block, column strip, pair indices and values
+SPILL_DTYPE = np.dtype([("row", np.int64), ("col", np.int64), ("value", np.float64)])
+META_FILE = "meta.json"
+
+
+def rows_per_block(n_columns, ram_budget, bytes_per_entry=BYTES_PER_BLOCK_ENTRY):
+    available = max(ram_budget - PAIR_CHUNK_BYTES, bytes_per_entry * n_columns)
+    return int(max(1, min(n_columns, available // (bytes_per_entry * max(n_columns, 1)))))
+
+
+def fixed_row_blocks(n, block_rows):
+    return [(begin, min(begin + block_rows, n)) for begin in range(0, n, block_rows)]
+
+
+class UpperBlockComputer:
+    """
+    Computes the upper triangle pairs of a block of rows, in process or on a
+    pool of workers.
+    """
+    def __init__(self, mesh, quadrature, jobs, precision):
+        self.n = len(mesh)
+        self.jobs = jobs
+        if jobs <= 1:
+            self.kernel = PairKernel(mesh, quadrature, precision)
+            self.executor = None
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=jobs, initializer=_initialize_worker,
+                                                initargs=(mesh.vertices, reference_points(quadrature), precision))
+
+    def __call__(self, begin, end):
+        """
+        Returns:
+            (array, array, array): rows, cols and view factors of the pairs
+                i < j with begin <= i < end.
+        """
+        rows, cols = upper_triangle_block(self.n, begin, end)
+        if self.executor is None:
+            return rows, cols, self.kernel(rows, cols)
+        bounds = np.linspace(begin, end, self.jobs + 1).astype(int)
+        parts = self.executor.map(_compute_block, [self.n] * self.jobs, bounds[:-1], bounds[1:])
+        return rows, cols, np.concatenate([values for _, _, values in parts])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def assemble_out_of_core(mesh, quadrature, path, ram_budget=DEFAULT_RAM_BUDGET, drop_tolerance=None,
+                         jobs=1, precision=None, progress=None):
+    """
+    Args:
+        mesh (TriangleMesh): The elements.
+        quadrature (Quadrature): The fixed rule used for every pair.
+        path (str): The ``.npy`` file of a dense result, or the directory of
+            a sparse one.
+        ram_budget (int): Bytes of memory the assembly may use.
+        drop_tolerance (float): If given, view factors below it are dropped
+            and the result is stored sparse.
+        jobs (int): Number of worker processes.
+        progress (callable): Called with (rows done, total rows).
+
+    Returns:
+        OutOfCoreMatrix
+    """
+    precision = get_policy(precision)
+    n = len(mesh)
+    areas = mesh.areas
+    blocks = fixed_row_blocks(n, rows_per_block(n, ram_budget))
+    compute = UpperBlockComputer(mesh, quadrature, jobs, precision)
+
+    try:
+        with instrumentation.stage("assembly_out_of_core"):
+            if drop_tolerance is None:
+                _assemble_dense(n, areas, blocks, compute, path, precision.accumulate, progress)
+            else:
+                _assemble_sparse(n, areas, blocks, compute, path, drop_tolerance, progress)
+    finally:
+        compute.close()
+    return OutOfCoreMatrix(path)
+
+
+def _assemble_dense(n, areas, blocks, compute, path, dtype, progress):
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n, n))
+    block_rows = blocks[0][1] - blocks[0][0] if blocks else 1
+    for begin, end in blocks:
+        block = np.zeros((end - begin, n), dtype=dtype)
+        rows, cols, values = compute(begin, end)
+        block[rows - begin, cols] = values
+
+        # the lower triangle within the block
+        inside = cols < end
+        block[cols[inside] - begin, rows[inside]] = values[inside] * areas[rows[inside]] / areas[cols[inside]]
+
+        # and left of the block, from the column strip of the rows above
+        for strip_begin in range(0, begin, block_rows):
+            strip_end = min(strip_begin + block_rows, begin)
+            strip = np.asarray(matrix[strip_begin:strip_end, begin:end])
+            block[:, strip_begin:strip_end] = (strip * areas[strip_begin:strip_end, np.newaxis]).T \
+                / areas[begin:end, np.newaxis]
+
+        matrix[begin:end] = block
+        instrumentation.count("rows/out_of_core", end - begin)
+        if progress is not None:
+            progress(end, n)
+    matrix.flush()
+    del matrix
+
+
+def _assemble_sparse(n, areas, blocks, compute, path, drop_tolerance, progress):
+    os.makedirs(path, exist_ok=True)
+    block_of_row = np.repeat(np.arange(len(blocks)), [end - begin for begin, end in blocks])
+    spill_paths = [os.path.join(path, f"spill{k}.bin") for k in range(len(blocks))]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    nnz = 0
+
+    with open(os.path.join(path, "data.bin"), "wb") as data_file, \
+         open(os.path.join(path, "indices.bin"), "wb") as indices_file:
+        for k, (begin, end) in enumerate(blocks):
+            rows, cols, values = compute(begin, end)
+            transposed = values * areas[rows] / areas[cols]
+            keep = values >= drop_tolerance
+            keep_transposed = transposed >= drop_tolerance
+
+            # transposed entries of later blocks are spilled to their buckets
+            later = keep_transposed & (cols >= end)
+            spill = np.empty(int(later.sum()), dtype=SPILL_DTYPE)
+            spill["row"], spill["col"], spill["value"] = cols[later], rows[later], transposed[later]
+            spill_blocks = block_of_row[spill["row"]]
+            order = np.argsort(spill_blocks, kind="stable")
+            spill, spill_blocks = spill[order], spill_blocks[order]
+            for target in np.unique(spill_blocks):
+                with open(spill_paths[target], "ab") as spill_file:
+                    spill[spill_blocks == target].tofile(spill_file)
+
+            inside = keep_transposed & (cols < end)
+            entries = [(rows[keep], cols[keep], values[keep]),
+                       (cols[inside], rows[inside], transposed[inside])]
+            if os.path.exists(spill_paths[k]):
+                spilled = np.fromfile(spill_paths[k], dtype=SPILL_DTYPE)
+                entries.append((spilled["row"], spilled["col"], spilled["value"]))
+                os.remove(spill_paths[k])
+
+            block_rows = np.concatenate([e[0] for e in entries]) - begin
+            block = sparse.csr_matrix((np.concatenate([e[2] for e in entries]),
+                                       (block_rows, np.concatenate([e[1] for e in entries]))),
+                                      shape=(end - begin, n))
+            block.sum_duplicates()
+            block.sort_indices()
+            block.data.astype(np.float64).tofile(data_file)
+            block.indices.astype(np.int64).tofile(indices_file)
+            indptr[begin + 1:end + 1] = nnz + block.indptr[1:]
+            nnz += block.nnz
+
+            instrumentation.count("rows/out_of_core", end - begin)
+            if progress is not None:
+                progress(end, n)
+
+    np.save(os.path.join(path, "indptr.npy"), indptr)
+    with open(os.path.join(path, META_FILE), "w") as meta_file:
+        json.dump({"format" : "csr", "shape" : [n, n], "nnz" : int(nnz),
+                   "drop_tolerance" : drop_tolerance}, meta_file)
+
+
+class OutOfCoreMatrix:
+    def __init__(self, path, ram_budget=DEFAULT_RAM_BUDGET):
+        """
+        Args:
+            path (str): A dense ``.npy`` file or a sparse store directory
+                written by assemble_out_of_core.
+            ram_budget (int): Bytes of memory a streaming pass may use.
+        """
+        self.path = path
+        self.ram_budget = ram_budget
+        if os.path.isdir(path):
+            with open(os.path.join(path, META_FILE)) as meta_file:
+                meta = json.load(meta_file)
+            self.shape = tuple(meta["shape"])
+            self.is_sparse = True
+            self.indptr = np.load(os.path.join(path, "indptr.npy"))
+            nnz = meta["nnz"]
+            self.data = np.memmap(os.path.join(path, "data.bin"), dtype=np.float64, mode="r", shape=(nnz,)) \
+                if nnz else np.empty(0)
+            self.indices = np.memmap(os.path.join(path, "indices.bin"), dtype=np.int64, mode="r", shape=(nnz,)) \
+                if nnz else np.empty(0, dtype=np.int64)
+        else:
+            self.matrix = np.load(path, mmap_mode="r")
+            self.shape = self.matrix.shape
+            self.is_sparse = False
+
+    def row_blocks(self):
+        """
+        Yields (begin, end, block) with the rows [begin, end) as an array, or
+        a csr_matrix for a sparse store.
+        """
+        n_rows, n_cols = self.shape
+        if self.is_sparse:
+            mean_row_bytes = 16 * max(1, len(self.data) // max(n_rows, 1)) # value and column index
+        else:
+            mean_row_bytes = self.matrix.itemsize * n_cols
+        block_rows = int(min(max(n_rows, 1), max(1, self.ram_budget // max(mean_row_bytes, 1))))
+
+        for begin, end in fixed_row_blocks(n_rows, block_rows):
+            if self.is_sparse:
+                first, last = self.indptr[begin], self.indptr[end]
+                block = sparse.csr_matrix((np.asarray(self.data[first:last]), np.asarray(self.indices[first:last]),
+                                           self.indptr[begin:end + 1] - first), shape=(end - begin, n_cols))
+            else:
+                block = np.asarray(self.matrix[begin:end])
+            yield begin, end, block
+
+    def row(self, i):
+        if self.is_sparse:
+            first, last = self.indptr[i], self.indptr[i + 1]
+            row = np.zeros(self.shape[1])
+            row[self.indices[first:last]] = self.data[first:last]
+            return row
+        return np.array(self.matrix[i], dtype=np.float64)
+
+    def row_sums(self):
+        sums = np.empty(self.shape[0])
+        for begin, end, block in self.row_blocks():
+            sums[begin:end] = np.asarray(block.sum(axis=1)).ravel()
+        return sums
+
+    def matvec(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.empty(self.shape[0])
+        for begin, end, block in self.row_blocks():
+            y[begin:end] = block @ x
+        return y
+
+    def rmatvec(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.zeros(self.shape[1])
+        for begin, end, block in self.row_blocks():
+            y += block.T @ x[begin:end]
+        return y
+
+    def as_linear_operator(self):
+        return LinearOperator(self.shape, matvec=self.matvec, rmatvec=self.rmatvec, dtype=np.float64)
+
+    def aggregate(self, membership, areas):
+        """
+        Streaming counterpart of hierarchy.aggregate_view_factors.
+
+        Returns:
+            (array, array): (S,) surface areas and (S, S) surface view factors.
+        """
+        membership = sparse.csr_matrix(membership)
+        areas = np.asarray(areas, dtype=np.float64)
+        membership_columns = membership.tocsc()
+        surface_areas = membership @ areas
+        exchange = np.zeros((membership.shape[0], membership.shape[0]))
+        for begin, end, block in self.row_blocks():
+            weighted = membership_columns[:, begin:end].multiply(areas[np.newaxis, begin:end]) # P diag(A) on the rows
+            exchange += np.asarray(weighted @ (block @ membership.T))
+        return surface_areas, exchange / surface_areas[:, np.newaxis]
+
+    def to_array(self):
+        if self.is_sparse:
+            return self.to_sparse().toarray()
+        return np.array(self.matrix)
+
+    def to_sparse(self):
+        if self.is_sparse:
+            return sparse.csr_matrix((np.asarray(self.data), np.asarray(self.indices), self.indptr), shape=self.shape)
+        return sparse.csr_matrix(self.to_array())
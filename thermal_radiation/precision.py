@@ -0,0 +1,96 @@
+"""
+Floating point precision policies for the view factor engines.
+
+A policy chooses the dtype the geometry and kernel temporaries are computed
+in, per engine, while sums over quadrature points, pixels or rays are always
+accumulated in the accumulation dtype (float64 by default). The quadrature
+pair kernel can additionally use a cheaper dtype for far-field pairs, whose
+kernel varies slowly over the elements and loses little to rounding.
+
+    DOUBLE  everything in float64, the default
+    MIXED   float64 near-field pairs, float32 far-field pairs, Monte Carlo and
+            hemicube
+    SINGLE  float32 everywhere, float64 accumulation
+"""
+import numpy as np
+
+ENGINES = ("quadrature", "monte_carlo", "hemicube")
+
+
+class PrecisionPolicy:
+    def __init__(self, compute=np.float64, accumulate=np.float64, far_field=None,
+                 far_field_distance=4.0, engines=None, name=None):
+        """
+        Args:
+            compute: Default dtype of the geometry and kernel temporaries.
+            accumulate: Dtype of quadrature sums and results.
+            far_field: Dtype of quadrature pairs further apart than
+                far_field_distance, None to use compute.
+            far_field_distance (float): Centroid distance over the sum of the
+                element sizes (longest edges) beyond which a pair is far-field.
+            engines (dict): Engine name -> compute dtype overriding compute.
+        """
+        self.compute = np.dtype(compute)
+        self.accumulate = np.dtype(accumulate)
+        self.far_field = None if far_field is None else np.dtype(far_field)
+        self.far_field_distance = far_field_distance
+        self.engines = {engine : np.dtype(dtype) for engine, dtype in (engines or {}).items()}
+        for engine in self.engines:
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown engine \"{engine}\", expected one of {', '.join(ENGINES)}")
+        self.name = name
+
+    def compute_dtype(self, engine="quadrature"):
+        return self.engines.get(engine, self.compute)
+
+    @property
+    def is_double(self):
+        dtypes = [self.compute, self.accumulate, *self.engines.values()]
+        if self.far_field is not None:
+            dtypes.append(self.far_field)
+        return all(dtype == np.float64 for dtype in dtypes)
+
+    def __str__(self):
+        if self.name is not None:
+            return self.name
+        parts = [f"compute={self.compute}", f"accumulate={self.accumulate}"]
+        if self.far_field is not None:
+            parts.append(f"far_field={self.far_field}@{self.far_field_distance:g}")
+        parts += [f"{engine}={dtype}" for engine, dtype in sorted(self.engines.items())]
+        return ",".join(parts)
+
+    def __repr__(self):
+        return f"PrecisionPolicy({self})"
+
+
+DOUBLE = PrecisionPolicy(name="double")
+MIXED = PrecisionPolicy(far_field=np.float32, engines={"monte_carlo" : np.float32, "hemicube" : np.float32},
+                        name="mixed")
+SINGLE = PrecisionPolicy(compute=np.float32, name="single")
+
+POLICIES = {policy.name : policy for policy in (DOUBLE, MIXED, SINGLE)}
+
+
+def get_policy(policy=None):
+    """
+    Args:
+        policy: A PrecisionPolicy, one of the names "double", "mixed" and
+            "single", or None for DOUBLE.
+    """
+    if policy is None:
+        return DOUBLE
+    if isinstance(policy, PrecisionPolicy):
+        return policy
+    try:
+        return POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"Unknown precision \"{policy}\", expected one of {', '.join(POLICIES)}")
+
+
+def element_sizes(mesh):
+    """
+    Returns:
+        array: (N,) longest edge of every element.
+    """
+    edges = mesh.vertices - np.roll(mesh.vertices, 1, axis=1)
+    return np.sqrt(np.einsum("nkd,nkd->nk", edges, edges).max(axis=1))
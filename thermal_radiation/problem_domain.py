@@ -1,4 +1,10 @@
-from .geometry import Triangle
+import numpy as np
+from .geometry import Quadrilateral, Triangle, get_fixed_element_view_factor, get_fixed_triangle_view_factor
+from .cache import hash_key
+from .mesh import TriangleMesh
+from .symmetry import SymmetryGroup, expand_orbits
+from .hierarchy import SurfaceIndex, aggregate_view_factors, build_thermal_network
+from . import instrumentation
 
 class TriangleElement(Triangle):
     def __init__(self, a, b, c, quadrature):
@@ -12,41 +18,186 @@ class TriangleElement(Triangle):
         self.view_factors[element] = view_factor
 
 
+class QuadElement(Quadrilateral):
+    def __init__(self, a, b, c, d, quadrature):
+        """
+        Args:
+            quadrature (Quadrature): A rule on [-1, 1]^2, e.g.
+                QuadrilateralGaussLegendre2D.
+        """
+        Quadrilateral.__init__(self, a, b, c, d)
+        self.quadrature = quadrature
+        self.view_factors = {} # element -> view factor to the element
+        self.total_view_factor = 0.0
+
+    def add_view_factor(self, element, view_factor):
+        self.total_view_factor += view_factor
+        self.view_factors[element] = view_factor
+
+
 class Surface:
-    def __init__(self):
+    def __init__(self, name=None):
+        self.name = name
         self.elements = []
+        self.facets = [] # index arrays into array-backed mesh storage
         self.subsurfaces = []
 
     def add_element(self, element):
         self.elements.append(element)
 
+    def add_facets(self, indices):
+        self.facets.append(np.asarray(indices))
+
     def add_subsurface(self, subsurface):
         self.subsurfaces.append(subsurface)
 
+    def walk(self):
+        """
+        Yields the surface and all of its subsurfaces depth first.
+        """
+        stack = [self]
+        while stack:
+            surface = stack.pop()
+            yield surface
+            stack += reversed(surface.subsurfaces)
+
     def aggregate_elements(self):
-        all_elements = self.elements[:]
-        for subsurface in self.subsurfaces:
-            all_elements += subsurface.aggregate_elements()
+        all_elements = []
+        for surface in self.walk():
+            all_elements.extend(surface.elements)
         return all_elements
 
+    def aggregate_facets(self):
+        all_facets = [facets for surface in self.walk() for facets in surface.facets]
+        if not all_facets:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(all_facets)
+
 
 class Problem:
-    def __init__(self, surfaces=[]):
+    def __init__(self, surfaces=[], cache=None, symmetry=None):
+        """
+        Args:
+            surfaces (list): The surfaces making up the problem.
+            cache (ViewFactorCache): Optional persistent store of assembled
+                view factor matrices.
+            symmetry: None to integrate every pair, "auto" to detect the
+                symmetries of the elements, or a list of declared
+                SymmetryPlanes and SymmetryAxes. Only one pair per orbit of
+                the symmetry group is integrated.
+        """
         self.surfaces = surfaces
+        self.cache = cache
+        self.symmetry = symmetry
+        self.view_factor_functions = {} # id(quadrature) or (id(from), id(to)) -> view factor function
 
     def add_surface(self, surface):
         self.surfaces.append(surface)
 
     def aggregate_elements(self):
-        elements = []
-        for surface in self.surfaces:
-            elements += surface.aggregate_elements()
-        self.elements = elements
+        self.surface_index = SurfaceIndex(self.surfaces)
+        self.elements = self.surface_index.elements
+
+    def get_element_areas(self):
+        return np.array([element.area for element in self.elements])
+
+    def get_surface_view_factors(self, level=0):
+        """
+        Area weighted surface view factors at a level of the surface hierarchy.
+
+        Returns:
+            (list, array, array): The surface names, their areas and the view
+                factors between them.
+        """
+        names, ranges = self.surface_index.level(level)
+        areas, view_factors = aggregate_view_factors(
+            self.get_view_factor_matrix(), self.get_element_areas(),
+            self.surface_index.membership(ranges))
+        return names, areas, view_factors
+
+    def get_thermal_network(self, emissivities, level=0, default_eps=None, name=None):
+        return build_thermal_network(self.surface_index, self.get_view_factor_matrix(),
+                                     self.get_element_areas(), emissivities, level=level,
+                                     default_eps=default_eps, name=name)
+
+    def has_quadrilaterals(self):
+        return any(isinstance(element, Quadrilateral) for element in self.elements)
+
+    def get_vertex_array(self):
+        """
+        Returns:
+            array: (N, 3, 3) triangle vertices, or (N, 4, 3) if there are
+                quadrilaterals, with the fourth vertex of triangles NaN.
+        """
+        if not self.has_quadrilaterals():
+            return np.array([[element.a, element.b, element.c] for element in self.elements])
+        missing = np.full(3, np.nan)
+        return np.array([[element.a, element.b, element.c, getattr(element, "d", missing)]
+                         for element in self.elements])
+
+    def get_cache_key(self):
+        quadratures = [element.quadrature for element in self.elements]
+        tag = "problem/mixed" if self.has_quadrilaterals() else "problem"
+        return hash_key(self.get_vertex_array(), quadratures, tag=tag)
 
     def calculate_view_factor(self, from_element, to_element):
-        return 1.0
+        quadrature = from_element.quadrature
+        if (quadrature is to_element.quadrature and isinstance(from_element, Triangle)
+                and isinstance(to_element, Triangle)):
+            quad_id = id(quadrature)
+            if quad_id not in self.view_factor_functions:
+                self.view_factor_functions[quad_id] = get_fixed_triangle_view_factor(quadrature)
+            return self.view_factor_functions[quad_id](from_element, to_element)
+
+        pair_id = (id(quadrature), id(to_element.quadrature))
+        if pair_id not in self.view_factor_functions:
+            self.view_factor_functions[pair_id] = get_fixed_element_view_factor(quadrature, to_element.quadrature)
+        return self.view_factor_functions[pair_id](from_element, to_element)
+
+    def get_view_factor_matrix(self):
+        n = len(self.elements)
+        index = {element : i for i, element in enumerate(self.elements)}
+        view_factors = np.zeros((n, n))
+        for i, from_element in enumerate(self.elements):
+            for to_element, view_factor in from_element.view_factors.items():
+                view_factors[i, index[to_element]] = view_factor
+        return view_factors
+
+    def set_view_factor_matrix(self, view_factors):
+        for from_element, row in zip(self.elements, view_factors):
+            for to_element, view_factor in zip(self.elements, row):
+                if from_element is not to_element:
+                    from_element.add_view_factor(to_element, float(view_factor))
 
     def calculate_view_factors(self):
+        with instrumentation.stage("assembly"):
+            if self.cache is None:
+                self._calculate_view_factors()
+                return
+
+            key = self.get_cache_key()
+            view_factors = self.cache.get(key)
+            if view_factors is not None:
+                instrumentation.count("cache/hits")
+                self.set_view_factor_matrix(view_factors)
+            else:
+                instrumentation.count("cache/misses")
+                self._calculate_view_factors()
+                self.cache.put(key, self.get_view_factor_matrix())
+
+    def get_symmetry_group(self):
+        if self.has_quadrilaterals():
+            raise ValueError("Symmetry reduction is only available for triangle elements")
+        mesh = TriangleMesh.from_triangles(self.elements)
+        if self.symmetry == "auto":
+            return SymmetryGroup.detect(mesh)
+        return SymmetryGroup.from_operations(mesh, self.symmetry)
+
+    def _calculate_view_factors(self):
+        if self.symmetry is not None:
+            self._calculate_symmetric_view_factors()
+            return
+
         for i, from_element in enumerate(self.elements):
             for to_element in self.elements[i+1:]:
                 f_from_to = self.calculate_view_factor(from_element, to_element)
@@ -55,6 +206,22 @@ class Problem:
                 f_to_from = (f_from_to * from_element.area) / to_element.area
                 to_element.add_view_factor(from_element, f_to_from)
 
+    def _calculate_symmetric_view_factors(self):
+        elements = self.elements
+        group = self.get_symmetry_group()
+        rep_rows, rep_cols, orbit, swapped = group.pair_orbits(len(elements))
+        rep_view_factors = np.array([self.calculate_view_factor(elements[i], elements[j])
+                                     for i, j in zip(rep_rows, rep_cols)])
+
+        areas = self.get_element_areas()
+        rows, cols, values = expand_orbits(rep_view_factors, orbit, swapped, areas)
+        for i, j, f_from_to in zip(rows, cols, values):
+            from_element, to_element = elements[i], elements[j]
+            from_element.add_view_factor(to_element, f_from_to)
+
+            f_to_from = (f_from_to * from_element.area) / to_element.area
+            to_element.add_view_factor(from_element, f_to_from)
+
 
 if __name__ == '__main__':
     from .geometry import Triangle
@@ -1,12 +1,23 @@
+from functools import lru_cache
 from sympy.integrals.quadrature import gauss_legendre
+from . import instrumentation
 
 PRECISION = 20
 
+@lru_cache(maxsize=None)
+def _gauss_legendre_pairs(order):
+    with instrumentation.stage("quadrature_construction"):
+        qps, weights = gauss_legendre(order, PRECISION)
+    return tuple(float(qp) for qp in qps), tuple(float(weight) for weight in weights)
+
+
 def get_gauss_legendre_pairs(order):
-    qps, weights = gauss_legendre(order, PRECISION)
-    apprx_qps = [float(qp) for qp in qps]
-    apprx_weights = [float(weight) for weight in weights]
-    return apprx_qps, apprx_weights
+    """
+    The sympy construction is slow, so the pairs are computed once per order
+    and process.
+    """
+    qps, weights = _gauss_legendre_pairs(order)
+    return list(qps), list(weights)
 
 
 class Quadrature:
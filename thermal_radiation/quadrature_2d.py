@@ -1,4 +1,5 @@
 from .quadrature_1d import get_gauss_legendre_pairs, Quadrature
+from functools import lru_cache
 from itertools import product
 from math import factorial
 from .geometry import about_zero
@@ -358,6 +359,32 @@ class TriangleSymmetricalGauss2D(Quadrature):
 
         self.quad_domain_to_func_domain = quad_domain_to_func_domain
 
+QUADRATURE_RULES = {
+    "symmetric" : lambda order: TriangleSymmetricalGauss2D(order),
+    "tensor" : lambda order: TriangleTensorProductGaussLegendre2D(order, order),
+}
+
+
+@lru_cache(maxsize=None)
+def get_quadrature(spec):
+    """
+    Args:
+        spec (str): "<rule>:<order>", e.g. "symmetric:7" or "tensor:6".
+
+    Returns:
+        Quadrature: The rule, shared by all callers asking for the same spec
+            through the cache, so its points and weights must not be changed
+            in place; copy.deepcopy it to modify it.
+    """
+    rule, _, order = spec.partition(":")
+    if rule not in QUADRATURE_RULES or not order.isdigit():
+        raise ValueError(f"expected one of {', '.join(QUADRATURE_RULES)} followed by :<order>, got \"{spec}\"")
+    try:
+        return QUADRATURE_RULES[rule](int(order))
+    except (KeyError, ValueError):
+        raise ValueError(f"order {order} is not available for the {rule} rule")
+
+
 def integral_value(i, j):
     return (factorial(i) * factorial(j)) / factorial(i + j + 2)
 
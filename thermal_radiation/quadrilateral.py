@@ -0,0 +1,286 @@
+"""
+Native planar quadrilateral elements.
+
+A quadrilateral is mapped bilinearly from the reference square [-1, 1]^2 and
+integrated with a rule on the square such as QuadrilateralGaussLegendre2D,
+weighted by the Jacobian of the map. Keeping quadrilaterals instead of
+splitting every one into two triangles halves the element count of a
+quad-dominant mesh and quarters its pair count.
+
+The pair kernel works on the physical quadrature points and weights of two
+element sets, so the same code integrates triangle-triangle, quad-quad and
+the mixed pairs, each set with its own rule:
+
+    F_ij = 1 / A_i sum_p sum_q W_ip W_jq K(x_ip, x_jq)
+
+where the weights W of an element sum to its area.
+"""
+import numpy as np
+from .assembly import PAIR_CHUNK_BYTES, reference_points, row_blocks, upper_triangle_block
+from .geometry import QUADRILATERAL_PLANARITY_TOL, bilinear_shape_functions, bilinear_tangents
+from .mesh import DEGENERACY_TOL, TriangleMesh
+from . import instrumentation
+
+
+class InvalidQuadrilateralsException(Exception):
+    def __init__(self, indices, reason):
+        self.indices = indices
+        shown = ", ".join(str(i) for i in indices[:10])
+        more = ", ..." if len(indices) > 10 else ""
+        Exception.__init__(self, f"{len(indices)} {reason} quadrilateral(s): {shown}{more}")
+
+
+class QuadMesh:
+    def __init__(self, vertices, validate=True):
+        """
+        Args:
+            vertices (array): (N, 4, 3) array of quadrilateral vertices where
+                vertices[i] holds a, b, c and d of quadrilateral i oriented
+                counter clockwise w.r.t. the surface normal.
+            validate (bool): Raise InvalidQuadrilateralsException if any of
+                the quadrilaterals is degenerate, not planar or not convex.
+        """
+        vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+        if vertices.ndim != 3 or vertices.shape[1:] != (4, 3):
+            raise ValueError(f"Expected an (N, 4, 3) vertex array, got {vertices.shape}")
+
+        a, b, c, d = (vertices[:, k] for k in range(4))
+        cross = np.cross(c - a, d - b)
+        magnitudes = np.sqrt(np.einsum("ij,ij->i", cross, cross))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.normals = cross / magnitudes[:, np.newaxis]
+
+        if validate:
+            degenerate = magnitudes <= DEGENERACY_TOL
+            if degenerate.any():
+                raise InvalidQuadrilateralsException(np.flatnonzero(degenerate), "degenerate")
+            sizes = np.maximum(np.linalg.norm(c - a, axis=1), np.linalg.norm(d - b, axis=1))
+            offsets = np.einsum("nkd,nd->nk", vertices - vertices.mean(axis=1, keepdims=True), self.normals)
+            warped = np.abs(offsets).max(axis=1) > QUADRILATERAL_PLANARITY_TOL * sizes
+            if warped.any():
+                raise InvalidQuadrilateralsException(np.flatnonzero(warped), "non-planar")
+            corners = np.cross(np.roll(vertices, -1, axis=1) - vertices, np.roll(vertices, 1, axis=1) - vertices)
+            folded = (np.einsum("nkd,nd->nk", corners, self.normals) <= 0.0).any(axis=1)
+            if folded.any():
+                raise InvalidQuadrilateralsException(np.flatnonzero(folded), "non-convex")
+
+        abc = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=1)
+        self.vertices = vertices
+        self.areas = 0.5 * magnitudes
+        with np.errstate(invalid="ignore", divide="ignore"):
+            acd = self.areas - abc
+            self.centroids = (abc[:, np.newaxis] * (a + b + c) + acd[:, np.newaxis] * (a + c + d)) / \
+                (3.0 * self.areas[:, np.newaxis])
+
+    @classmethod
+    def from_quadrilaterals(cls, quadrilaterals):
+        return cls(np.array([[quad.a, quad.b, quad.c, quad.d] for quad in quadrilaterals]))
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __getitem__(self, index):
+        return QuadMesh(self.vertices[index], validate=False)
+
+    @property
+    def total_area(self):
+        return self.areas.sum()
+
+    def surface_locations(self, xi, eta):
+        """
+        Args:
+            xi, eta (array): (Q,) parametric coordinates on [-1, 1]^2.
+
+        Returns:
+            array: (N, Q, 3) position vectors of every point on every
+                quadrilateral.
+        """
+        return np.einsum("qk,nkd->nqd", bilinear_shape_functions(xi, eta), self.vertices)
+
+    def jacobians(self, xi, eta):
+        """
+        Returns:
+            array: (N, Q) area scale of the bilinear maps at the points.
+        """
+        d_xi, d_eta = bilinear_tangents(self.vertices, xi, eta)
+        return np.einsum("nqd,nd->nq", np.cross(d_xi, d_eta), self.normals)
+
+    def split(self):
+        """
+        Returns:
+            TriangleMesh: Triangles abc and acd of every quadrilateral, those
+                of quadrilateral i at 2 i and 2 i + 1.
+        """
+        a, b, c, d = (self.vertices[:, k] for k in range(4))
+        triangles = np.stack((np.stack((a, b, c), axis=1), np.stack((a, c, d), axis=1)), axis=1)
+        return TriangleMesh(triangles.reshape(-1, 3, 3), validate=False)
+
+
+def rectangle_quadrilaterals(origin, u, v, n_u, n_v):
+    """
+    Meshes the parallelogram spanned by u and v with n_u * n_v
+    quadrilaterals whose normals point along u x v, the cells of
+    mesh.rectangle_triangles.
+
+    Returns:
+        array: (n_u * n_v, 4, 3) quadrilateral vertices.
+    """
+    origin, u, v = (np.asarray(vec, dtype=np.float64) for vec in (origin, u, v))
+    s = np.arange(n_u)[:, np.newaxis] / n_u
+    t = np.arange(n_v)[np.newaxis, :] / n_v
+    corner = (origin + s[..., np.newaxis] * u + t[..., np.newaxis] * v).reshape(-1, 3)
+    du = u / n_u
+    dv = v / n_v
+    return np.stack((corner, corner + du, corner + du + dv, corner + dv), axis=1)
+
+
+class ElementPoints:
+    def __init__(self, points, weights, normals, areas):
+        """
+        The physical quadrature points of a set of planar elements.
+
+        Args:
+            points (array): (N, Q, 3) quadrature points.
+            weights (array): (N, Q) weights, summing to the element areas.
+            normals (array): (N, 3) unit normals.
+            areas (array): (N,) areas.
+        """
+        self.points = points
+        self.weights = weights
+        self.normals = normals
+        self.areas = areas
+
+    def __len__(self):
+        return len(self.areas)
+
+    @property
+    def n_qps(self):
+        return self.points.shape[1]
+
+
+def integration_points(mesh, quadrature):
+    """
+    Args:
+        mesh (TriangleMesh or QuadMesh): The elements.
+        quadrature (Quadrature): A rule on the unit triangle for a
+            TriangleMesh, on [-1, 1]^2 for a QuadMesh.
+
+    Returns:
+        ElementPoints
+    """
+    if isinstance(mesh, QuadMesh):
+        if hasattr(quadrature, "quad_domain_to_func_domain"):
+            raise ValueError(f"{type(quadrature).__name__} is a triangle rule, quadrilaterals need a rule on [-1, 1]^2")
+        xi, eta = np.array(quadrature.qps, dtype=np.float64).reshape(-1, 2).T
+        weights = np.array(quadrature.weights, dtype=np.float64) * mesh.jacobians(xi, eta)
+    else:
+        xi, eta, weights = reference_points(quadrature)
+        weights = 2.0 * mesh.areas[:, np.newaxis] * weights
+    return ElementPoints(mesh.surface_locations(xi, eta), weights, mesh.normals, mesh.areas)
+
+
+class ElementPairKernel:
+    def __init__(self, from_points, to_points=None):
+        """
+        Args:
+            from_points (ElementPoints): The elements the pairs start from.
+            to_points (ElementPoints): The elements the pairs end on, the
+                same set by default, in which case pairs of an element with
+                itself are zero.
+        """
+        self.from_points = from_points
+        self.to_points = from_points if to_points is None else to_points
+        self.same_set = to_points is None or to_points is from_points
+        self.n_evaluations = from_points.n_qps * self.to_points.n_qps
+        self.chunk = max(1, PAIR_CHUNK_BYTES // (self.n_evaluations * 8 * 6))
+
+    def __call__(self, from_indices, to_indices):
+        """
+        Args:
+            from_indices, to_indices (array): (K,) element indices of each
+                pair into the from and to sets.
+
+        Returns:
+            array: (K,) view factors from from_indices[k] to to_indices[k].
+        """
+        from_indices = np.asarray(from_indices, dtype=np.intp)
+        to_indices = np.asarray(to_indices, dtype=np.intp)
+        view_factors = np.empty(len(from_indices))
+        for begin in range(0, len(from_indices), self.chunk):
+            end = begin + self.chunk
+            view_factors[begin:end] = self._evaluate(from_indices[begin:end], to_indices[begin:end])
+        if instrumentation.ENABLED:
+            instrumentation.count("pairs/vectorized", len(from_indices))
+            instrumentation.count("integrand_evaluations/vectorized", len(from_indices) * self.n_evaluations)
+        return view_factors
+
+    def _evaluate(self, from_indices, to_indices):
+        source, target = self.from_points, self.to_points
+        s = target.points[to_indices][:, np.newaxis, :, :] - source.points[from_indices][:, :, np.newaxis, :]
+        s_squared = np.einsum("kpqd,kpqd->kpq", s, s)
+        from_cos = np.einsum("kpqd,kd->kpq", s, source.normals[from_indices])
+        to_cos = np.einsum("kpqd,kd->kpq", s, target.normals[to_indices])
+
+        same = from_indices == to_indices if self.same_set else np.zeros(len(from_indices), dtype=bool)
+        s_squared[same] = 1.0
+        kernel = (-1.0 / np.pi) * from_cos * to_cos / (s_squared * s_squared)
+        inner = np.einsum("kpq,kq->kp", kernel, target.weights[to_indices])
+        integral = np.einsum("kp,kp->k", inner, source.weights[from_indices])
+
+        view_factors = integral / source.areas[from_indices]
+        view_factors[same] = 0.0
+        return view_factors
+
+
+def assemble_mixed_view_factor_matrix(triangles, triangle_quadrature, quads, quad_quadrature, progress=None,
+                                      blocks=8):
+    """
+    Assembles the view factors of a mesh of triangles and quadrilaterals.
+    Only one pair of every (i, j), (j, i) is integrated.
+
+    Args:
+        triangles (TriangleMesh): The triangles, possibly empty.
+        triangle_quadrature (Quadrature): The rule on the unit triangle.
+        quads (QuadMesh): The quadrilaterals, possibly empty.
+        quad_quadrature (Quadrature): The rule on [-1, 1]^2.
+        progress (callable): Called with (pairs done, total pairs).
+
+    Returns:
+        array: (N, N) element view factors, the triangles first.
+    """
+    n_triangles, n_quads = len(triangles), len(quads)
+    n = n_triangles + n_quads
+    areas = np.concatenate((triangles.areas, quads.areas))
+    sets = [integration_points(triangles, triangle_quadrature) if n_triangles else None,
+            integration_points(quads, quad_quadrature) if n_quads else None]
+    offsets = [0, n_triangles]
+    view_factors = np.zeros((n, n))
+    total = n * (n - 1) // 2
+    done = 0
+
+    def scatter(rows, cols, values):
+        view_factors[rows, cols] = values
+        view_factors[cols, rows] = values * areas[rows] / areas[cols]
+
+    with instrumentation.stage("assembly_mixed"):
+        for k, points in enumerate(sets):
+            if points is None:
+                continue
+            kernel = ElementPairKernel(points)
+            for begin, end in row_blocks(len(points), blocks):
+                rows, cols = upper_triangle_block(len(points), begin, end)
+                scatter(rows + offsets[k], cols + offsets[k], kernel(rows, cols))
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+
+        if n_triangles and n_quads:
+            kernel = ElementPairKernel(sets[1], sets[0]) # quad -> triangle
+            for block in np.array_split(np.arange(n_quads), min(blocks, n_quads)):
+                rows = np.repeat(block, n_triangles)
+                cols = np.tile(np.arange(n_triangles), len(block))
+                scatter(rows + n_triangles, cols, kernel(rows, cols))
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+    return view_factors
@@ -0,0 +1,190 @@
+"""
+Progressive refinement (shooting) radiosity.
+
+Instead of solving for all grey body factors, the radiosity field for one set
+of emissive powers is found by repeatedly shooting the unshot radiosity of the
+element with the most unshot power. Shooting from i only needs the row F[i, :]
+of the view factor matrix, which is computed on demand, and distributes
+
+    dP_j = dJ_i A_i F_ij
+
+to every element j, which absorbs eps_j dP_j and adds rho_j dP_j / A_j to its
+radiosity and unshot radiosity. The unshot power decreases monotonically, so
+the iteration can be stopped whenever it is small enough, and every
+intermediate state is a usable approximation: the radiosities and absorbed
+powers only miss the unshot power.
+"""
+import numpy as np
+from collections import OrderedDict
+from scipy import sparse
+from .assembly import PairKernel
+from .temperature import STEFAN_BOLTZMANN
+from . import instrumentation
+
+
+class MatrixRows:
+    def __init__(self, view_factors):
+        """
+        Args:
+            view_factors (array, sparse matrix or OutOfCoreMatrix): (N, N)
+                view factors.
+        """
+        self.view_factors = sparse.csr_matrix(view_factors) if sparse.issparse(view_factors) else view_factors
+        self.shape = view_factors.shape
+
+    def __call__(self, i):
+        if sparse.issparse(self.view_factors):
+            return self.view_factors[i].toarray().ravel()
+        if hasattr(self.view_factors, "row"):
+            return self.view_factors.row(i)
+        return np.asarray(self.view_factors[i], dtype=np.float64)
+
+
+class KernelRows:
+    def __init__(self, mesh, quadrature, precision=None, max_cached_rows=64):
+        """
+        Computes element view factor rows with the fixed quadrature pair
+        kernel when they are first needed, keeping the most recently used.
+
+        Args:
+            mesh (TriangleMesh): The elements.
+            quadrature (Quadrature): The rule used for every pair.
+            max_cached_rows (int): Rows kept, each N floats.
+        """
+        self.kernel = PairKernel(mesh, quadrature, precision)
+        self.shape = (len(mesh), len(mesh))
+        self.max_cached_rows = max_cached_rows
+        self.rows = OrderedDict() # element -> view factor row
+        self.computed = 0
+
+    def __call__(self, i):
+        if i in self.rows:
+            self.rows.move_to_end(i)
+            return self.rows[i]
+        n = self.shape[0]
+        row = self.kernel(np.full(n, i), np.arange(n))
+        self.computed += 1
+        instrumentation.count("radiosity/rows_computed")
+        self.rows[i] = row
+        while len(self.rows) > self.max_cached_rows:
+            self.rows.popitem(last=False)
+        return row
+
+
+class RadiositySolution:
+    def __init__(self, shots, radiosities, emitted, absorbed, unshot):
+        """
+        Args:
+            shots (int): Shots so far.
+            radiosities (array): (N,) radiosity in W/m^2.
+            emitted (array): (N,) emitted power eps A E in W.
+            absorbed (array): (N,) absorbed power in W.
+            unshot (float): Power not yet distributed, in W.
+        """
+        self.shots = shots
+        self.radiosities = radiosities
+        self.emitted = emitted
+        self.absorbed = absorbed
+        self.unshot = unshot
+
+    @property
+    def heat_flows(self):
+        """
+        Net heat leaving every element by radiation in W.
+        """
+        return self.emitted - self.absorbed
+
+    @property
+    def residual(self):
+        """
+        Unshot power relative to the emitted power.
+        """
+        total = self.emitted.sum()
+        return self.unshot / total if total > 0.0 else 0.0
+
+
+class ProgressiveRadiosity:
+    def __init__(self, rows, areas, eps, emissive_powers):
+        """
+        Args:
+            rows (callable): i -> (N,) view factors from i, e.g. MatrixRows
+                or KernelRows.
+            areas (array): (N,) areas.
+            eps (array): (N,) emissivities.
+            emissive_powers (array): (N,) blackbody emissive powers E in W/m^2.
+        """
+        self.rows = rows
+        self.areas = np.asarray(areas, dtype=np.float64)
+        self.eps = np.asarray(eps, dtype=np.float64)
+        self.rho = 1.0 - self.eps
+        emission = self.eps * np.asarray(emissive_powers, dtype=np.float64)
+        self.emitted = emission * self.areas
+        self.radiosities = emission.copy()
+        self.unshot = emission.copy() # unshot radiosity in W/m^2
+        self.absorbed = np.zeros(len(self.areas))
+        self.shots = 0
+
+    @classmethod
+    def from_network(cls, tn, temperatures, sigma=STEFAN_BOLTZMANN):
+        """
+        Args:
+            tn (ThermalNetwork): Surfaces in the order they were added.
+            temperatures (array): (N,) surface temperatures in K.
+        """
+        eps = np.array([surface.eps for surface in tn.surfaces.values()])
+        emissive_powers = sigma * np.asarray(temperatures, dtype=np.float64)**4
+        return cls(MatrixRows(tn.get_view_factor_matrix()), tn.get_areas(), eps, emissive_powers)
+
+    def unshot_power(self):
+        return float(np.dot(self.unshot, self.areas))
+
+    def shoot(self):
+        """
+        Shoots the unshot radiosity of the element with the most unshot power.
+
+        Returns:
+            int: The element shot from.
+        """
+        i = int(np.argmax(self.unshot * self.areas))
+        incident = self.unshot[i] * self.areas[i] * self.rows(i) # W arriving at every element
+        reflected = self.rho * incident / self.areas
+        self.absorbed += self.eps * incident
+        self.radiosities += reflected
+        self.unshot[i] = 0.0
+        self.unshot += reflected
+        self.shots += 1
+        instrumentation.count("radiosity/shots")
+        return i
+
+    def snapshot(self):
+        return RadiositySolution(self.shots, self.radiosities.copy(), self.emitted, self.absorbed.copy(),
+                                 self.unshot_power())
+
+    def iterate(self, tolerance=1.0E-6, max_shots=None, report_every=None):
+        """
+        Shoots until the unshot power is below tolerance times the emitted
+        power, yielding the intermediate solution every report_every shots
+        and the final one. The caller may stop early at any yield.
+
+        Args:
+            max_shots (int): Shots after which to stop regardless.
+            report_every (int): Shots between intermediate results, N by
+                default.
+        """
+        report_every = len(self.areas) if report_every is None else report_every
+        target = tolerance * self.emitted.sum()
+        while self.unshot_power() > target and (max_shots is None or self.shots < max_shots):
+            self.shoot()
+            if self.shots % report_every == 0:
+                yield self.snapshot()
+        yield self.snapshot()
+
+    def solve(self, tolerance=1.0E-6, max_shots=None):
+        """
+        Returns:
+            RadiositySolution: The solution once converged (or max_shots
+                reached, check its residual).
+        """
+        for solution in self.iterate(tolerance, max_shots, report_every=max_shots or np.iinfo(np.int64).max):
+            pass
+        return solution
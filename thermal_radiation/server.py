@@ -0,0 +1,389 @@
+"""
+A long-lived worker answering view factor and Gebhart queries.
+
+Starting Python, importing numpy, scipy and sympy and constructing quadrature
+rules costs seconds, which dominates small queries. The server pays for it
+once and keeps quadrature rules, meshes, pair kernels and assembled element
+matrices warm between requests.
+
+Requests and responses are JSON objects, one per line, over stdin/stdout or a
+local (Unix or loopback TCP) socket::
+
+    {"id": 1, "method": "load_mesh", "params": {"path": "enclosure.obj"}}
+    {"id": 1, "result": {"mesh": "3f2a...", "elements": 1200, "surfaces": [...]}}
+
+    {"id": 2, "method": "view_factors", "params": {"mesh": "3f2a...", "pairs": [[0, 5], [3, 7]]}}
+    {"id": 2, "result": {"view_factors": [0.0123, 0.0087]}}
+
+A failed request is answered with ``{"id": ..., "error": {"type": ...,
+"message": ...}}``. Lines that arrive together, from one or several clients,
+are handled as a batch: the pairs of all view_factors requests on the same
+mesh, rule and precision are evaluated with a single kernel call.
+
+Methods:
+    ping                    {} -> pid, uptime
+    load_mesh               {path} or {vertices, groups} -> mesh, elements, surfaces
+    view_factors            {mesh, pairs, quadrature, precision} -> view_factors
+    surface_view_factors    {mesh, level, quadrature, precision} -> names, areas, view_factors
+    gebhart                 {mesh, emissivities, default_eps, level, quadrature, precision}
+                            or {names, areas, eps, view_factors}
+                            -> names, grey_body_factors, radks
+    stats                   {} -> warm object counts and request counters
+    shutdown                {} -> stops the server after the batch
+"""
+import os
+import sys
+import json
+import time
+import socket
+import selectors
+from collections import OrderedDict
+import numpy as np
+from .assembly import PairKernel, assemble_view_factor_matrix
+from .cache import hash_key
+from .gebhart import ThermalNetwork
+from .hierarchy import SurfaceIndex, aggregate_view_factors, build_thermal_network
+from .mesh import TriangleMesh
+from .mesh_io import MeshData, build_surfaces, read_mesh
+from .precision import get_policy
+from .quadrature_2d import get_quadrature
+from . import instrumentation
+
+DEFAULT_QUADRATURE = "symmetric:4"
+READ_SIZE = 1 << 16
+
+
+class LruStore:
+    """
+    A dict that forgets its least recently used items beyond max_items.
+    """
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self.items)
+
+
+class WarmMesh:
+    def __init__(self, mesh_id, mesh, index):
+        self.id = mesh_id
+        self.mesh = mesh
+        self.index = index
+
+
+class RequestError(Exception):
+    pass
+
+
+class Server:
+    def __init__(self, warm=(), max_meshes=8, max_kernels=16, max_matrices=4, cache=None):
+        """
+        Args:
+            warm (list): Quadrature specs, e.g. "symmetric:7", to construct up
+                front.
+            max_meshes (int): Meshes kept loaded.
+            max_kernels (int): Pair kernels (mesh, rule, precision) kept.
+            max_matrices (int): Assembled element matrices kept.
+            cache (ViewFactorCache): Optional persistent cache of the element
+                matrices.
+        """
+        for spec in warm:
+            get_quadrature(spec)
+        self.meshes = LruStore(max_meshes)
+        self.kernels = LruStore(max_kernels)
+        self.matrices = LruStore(max_matrices)
+        self.cache = cache
+        self.started = time.monotonic()
+        self.stopped = False
+        self.counters = {"requests" : 0, "batches" : 0, "kernel_calls" : 0, "pairs" : 0}
+        self.methods = {
+            "ping" : self.ping,
+            "load_mesh" : self.load_mesh,
+            "surface_view_factors" : self.surface_view_factors,
+            "gebhart" : self.gebhart,
+            "stats" : self.stats,
+            "shutdown" : self.shutdown,
+        }
+
+    def handle_lines(self, lines):
+        """
+        Args:
+            lines (list): Request lines (bytes or str) that arrived together.
+
+        Returns:
+            list: The response line for every request line, None for blank
+                lines.
+        """
+        requests = [None] * len(lines)
+        responses = [None] * len(lines)
+        for k, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                requests[k] = json.loads(line)
+                if not isinstance(requests[k], dict):
+                    raise RequestError("a request must be a JSON object")
+            except (ValueError, RequestError) as exc:
+                requests[k] = None
+                responses[k] = error_response(None, exc)
+
+        pending = [k for k, request in enumerate(requests) if request is not None]
+        if not pending:
+            return [None if response is None else json.dumps(response) for response in responses]
+        for k, response in zip(pending, self.handle_batch([requests[k] for k in pending])):
+            responses[k] = response
+        return [None if response is None else json.dumps(response) for response in responses]
+
+    def handle_batch(self, requests):
+        """
+        Handles requests in order, except that the kernel evaluations of all
+        view_factors requests sharing a kernel run together at the end.
+
+        Returns:
+            list: A response dict for every request.
+        """
+        self.counters["batches"] += 1
+        self.counters["requests"] += len(requests)
+        responses = [None] * len(requests)
+        groups = {} # kernel key -> (kernel arguments, [(request position, rows, cols)])
+        for k, request in enumerate(requests):
+            try:
+                method = request.get("method")
+                params = request.get("params") or {}
+                if method == "view_factors":
+                    key, arguments, rows, cols = self.prepare_pairs(params)
+                    groups.setdefault(key, (arguments, []))[1].append((k, rows, cols))
+                elif method in self.methods:
+                    responses[k] = result_response(request, self.methods[method](params))
+                else:
+                    raise RequestError(f"unknown method \"{method}\"")
+            except Exception as exc:
+                responses[k] = error_response(request, exc)
+
+        for key, (arguments, members) in groups.items():
+            rows = np.concatenate([member[1] for member in members])
+            cols = np.concatenate([member[2] for member in members])
+            try:
+                values = self.get_kernel(key, *arguments)(rows, cols)
+            except Exception as exc:
+                for k, _, _ in members:
+                    responses[k] = error_response(requests[k], exc)
+                continue
+            self.counters["kernel_calls"] += 1
+            self.counters["pairs"] += len(rows)
+            instrumentation.count("server/batched_requests", len(members))
+            offset = 0
+            for k, member_rows, _ in members:
+                result = {"view_factors" : values[offset:offset + len(member_rows)].tolist()}
+                responses[k] = result_response(requests[k], result)
+                offset += len(member_rows)
+        return responses
+
+    def get_mesh(self, params):
+        mesh_id = params.get("mesh")
+        warm = self.meshes.get(mesh_id)
+        if warm is None:
+            raise RequestError(f"no mesh \"{mesh_id}\" is loaded, send load_mesh first")
+        return warm
+
+    def get_kernel(self, key, warm, quadrature, precision):
+        kernel = self.kernels.get(key)
+        if kernel is None:
+            kernel = self.kernels.put(key, PairKernel(warm.mesh, quadrature, precision))
+        return kernel
+
+    def get_matrix(self, warm, spec, precision):
+        key = (warm.id, spec, str(precision))
+        view_factors = self.matrices.get(key)
+        if view_factors is None:
+            view_factors = assemble_view_factor_matrix(warm.mesh, get_quadrature(spec), cache=self.cache,
+                                                       precision=precision)
+            self.matrices.put(key, view_factors)
+        return view_factors
+
+    def prepare_pairs(self, params):
+        warm = self.get_mesh(params)
+        spec = params.get("quadrature", DEFAULT_QUADRATURE)
+        precision = get_policy(params.get("precision"))
+        pairs = np.asarray(params.get("pairs", []), dtype=np.int64).reshape(-1, 2)
+        n = len(warm.mesh)
+        if np.any((pairs < 0) | (pairs >= n)):
+            raise RequestError(f"element indices must be in [0, {n})")
+        key = (warm.id, spec, str(precision))
+        return key, (warm, get_quadrature(spec), precision), pairs[:, 0], pairs[:, 1]
+
+    def ping(self, params):
+        return {"pid" : os.getpid(), "uptime" : time.monotonic() - self.started}
+
+    def load_mesh(self, params):
+        if "path" in params:
+            mesh_data = read_mesh(params["path"])
+        elif "vertices" in params:
+            triangles = np.asarray(params["vertices"], dtype=np.float64).reshape(-1, 3, 3)
+            groups = params.get("groups") or ["default"] * len(triangles)
+            if len(groups) != len(triangles):
+                raise RequestError(f"{len(groups)} groups given for {len(triangles)} elements")
+            group_names = list(dict.fromkeys(groups))
+            face_groups = np.array([group_names.index(group) for group in groups], dtype=np.int64)
+            mesh_data = MeshData(triangles.reshape(-1, 3), np.arange(3 * len(triangles)).reshape(-1, 3),
+                                 face_groups, group_names)
+        else:
+            raise RequestError("load_mesh needs a path or vertices")
+
+        mesh = TriangleMesh.from_mesh_data(mesh_data)
+        groups = [mesh_data.group_names[group] for group in mesh_data.face_groups]
+        mesh_id = hash_key(mesh.vertices, [], tag=f"server:{json.dumps(groups)}")[:16]
+        warm = self.meshes.get(mesh_id)
+        if warm is None:
+            warm = self.meshes.put(mesh_id, WarmMesh(mesh_id, mesh, SurfaceIndex(build_surfaces(mesh_data))))
+        names, _ = warm.index.level(0)
+        return {"mesh" : mesh_id, "elements" : len(warm.mesh), "surfaces" : names}
+
+    def surface_view_factors(self, params):
+        warm = self.get_mesh(params)
+        precision = get_policy(params.get("precision"))
+        view_factors = self.get_matrix(warm, params.get("quadrature", DEFAULT_QUADRATURE), precision)
+        names, ranges = warm.index.level(int(params.get("level", 0)))
+        areas, surface_view_factors = aggregate_view_factors(
+            view_factors, warm.mesh.areas, warm.index.membership(ranges, len(warm.mesh)))
+        return {"names" : names, "areas" : areas.tolist(), "view_factors" : surface_view_factors.tolist()}
+
+    def gebhart(self, params):
+        if "mesh" in params:
+            warm = self.get_mesh(params)
+            precision = get_policy(params.get("precision"))
+            view_factors = self.get_matrix(warm, params.get("quadrature", DEFAULT_QUADRATURE), precision)
+            tn = build_thermal_network(warm.index, view_factors, warm.mesh.areas, params.get("emissivities", {}),
+                                       level=int(params.get("level", 0)), default_eps=params.get("default_eps"))
+        else:
+            names = list(params["names"])
+            tn = ThermalNetwork()
+            tn.add_surfaces(names, params["areas"], params["eps"])
+            tn.add_view_factor_matrix(names, np.asarray(params["view_factors"], dtype=np.float64))
+        grey_body_factors = tn.get_grey_body_factor_matrix()
+        return {
+            "names" : list(tn.surfaces),
+            "grey_body_factors" : grey_body_factors.tolist(),
+            "radks" : tn.get_radk_matrix(grey_body_factors).tolist(),
+        }
+
+    def stats(self, params):
+        return {"meshes" : len(self.meshes), "kernels" : len(self.kernels), "matrices" : len(self.matrices),
+                **self.counters}
+
+    def shutdown(self, params):
+        self.stopped = True
+        return {}
+
+
+def result_response(request, result):
+    return {"id" : request.get("id"), "result" : result}
+
+
+def error_response(request, exc):
+    request_id = request.get("id") if isinstance(request, dict) else None
+    return {"id" : request_id, "error" : {"type" : type(exc).__name__, "message" : str(exc)}}
+
+
+def split_lines(buffer, data):
+    """
+    Returns:
+        (list, bytes): The complete lines and the rest of the buffer.
+    """
+    *lines, rest = (buffer + data).split(b"\n")
+    return lines, rest
+
+
+def serve_stdio(server, infile=None, outfile=None):
+    """
+    Serves requests from infile (stdin) until it is closed or a shutdown
+    request arrives. Whatever was readable at once is one batch.
+    """
+    in_fd = (infile if infile is not None else sys.stdin.buffer).fileno()
+    outfile = outfile if outfile is not None else sys.stdout.buffer
+    buffer = b""
+    while not server.stopped:
+        data = os.read(in_fd, READ_SIZE)
+        if not data:
+            lines, buffer = [buffer], b""
+        else:
+            lines, buffer = split_lines(buffer, data)
+        for response in server.handle_lines(lines):
+            if response is not None:
+                outfile.write(response.encode() + b"\n")
+        outfile.flush()
+        if not data:
+            break
+
+
+def serve_socket(server, address, ready=None):
+    """
+    Serves any number of clients on a Unix socket path or a (host, port)
+    address until a shutdown request arrives. Lines readable from all clients
+    at once form one batch.
+
+    Args:
+        ready (callable): Called with the bound address once listening.
+    """
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(address)
+    listener.listen()
+    if ready is not None:
+        ready(listener.getsockname())
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    buffers = {} # connection -> incomplete line
+    try:
+        while not server.stopped:
+            batch = [] # (connection, line)
+            for key, _ in selector.select():
+                if key.fileobj is listener:
+                    connection, _ = listener.accept()
+                    selector.register(connection, selectors.EVENT_READ)
+                    buffers[connection] = b""
+                    continue
+                connection = key.fileobj
+                data = connection.recv(READ_SIZE)
+                if not data:
+                    selector.unregister(connection)
+                    connection.close()
+                    del buffers[connection]
+                    continue
+                lines, buffers[connection] = split_lines(buffers[connection], data)
+                batch += [(connection, line) for line in lines]
+
+            responses = server.handle_lines([line for _, line in batch])
+            for (connection, _), response in zip(batch, responses):
+                if response is not None:
+                    try:
+                        connection.sendall(response.encode() + b"\n")
+                    except OSError:
+                        pass # the client went away, it is unregistered on its next read
+    finally:
+        for connection in buffers:
+            connection.close()
+        selector.close()
+        listener.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
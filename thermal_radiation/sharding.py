@@ -0,0 +1,222 @@
+"""
+Sharded view factor assembly for batch clusters.
+
+The upper triangle pairs (i < j) are split into contiguous row ranges of
+roughly equal cost, one per shard. The split only depends on the mesh, the
+shard count and the precision policy, so every invocation of a shard computes
+the same range without coordination. A shard is written to a self-describing
+``.npz`` partial holding the range, the element areas and a key of the inputs,
+and merge_shards validates a complete set of partials before filling in both
+triangles of the matrix.
+"""
+import numpy as np
+from .assembly import far_field_pairs, upper_triangle_block
+from .cache import hash_key
+from .out_of_core import DEFAULT_RAM_BUDGET, UpperBlockComputer, fixed_row_blocks, rows_per_block
+from .precision import element_sizes, get_policy
+from . import instrumentation
+
+SHARD_FORMAT = "thermal_radiation/shard"
+SHARD_VERSION = 1
+FAR_FIELD_COST = 0.5 # cost of a far-field pair relative to a near-field one
+
+
+class ShardMismatchException(Exception):
+    def __init__(self, path, reason):
+        self.path = path
+        Exception.__init__(self, f"{path}: {reason}")
+
+
+def pairs_in_rows(n, begin, end):
+    """
+    Returns:
+        int: The number of pairs i < j with begin <= i < end.
+    """
+    rows = np.arange(begin, end, dtype=np.int64)
+    return int((n - rows - 1).sum())
+
+
+def row_costs(mesh, precision=None, block_rows=256):
+    """
+    Returns:
+        array: (N,) relative cost of the upper triangle pairs of every row.
+            Pairs evaluated in the far-field dtype count FAR_FIELD_COST.
+    """
+    precision = get_policy(precision)
+    n = len(mesh)
+    costs = (n - np.arange(n) - 1).astype(np.float64)
+    if precision.far_field is None or precision.far_field == precision.compute_dtype():
+        return costs
+
+    sizes = element_sizes(mesh)
+    for begin, end in fixed_row_blocks(n, block_rows):
+        rows, cols = upper_triangle_block(n, begin, end)
+        far = rows[far_field_pairs(mesh.centroids, sizes, precision.far_field_distance, rows, cols)]
+        costs -= (1.0 - FAR_FIELD_COST) * np.bincount(far, minlength=n)
+    return costs
+
+
+def shard_bounds(costs, n_shards):
+    """
+    Splits the rows into n_shards contiguous ranges with roughly equal total
+    cost.
+
+    Returns:
+        list: n_shards (begin, end) row ranges, possibly empty.
+    """
+    n = len(costs)
+    cumulative = np.cumsum(costs)
+    total = cumulative[-1] if n else 0.0
+    targets = total * np.arange(1, n_shards) / n_shards
+    bounds = np.searchsorted(cumulative, targets, side="left") + 1
+    bounds = np.concatenate(([0], np.minimum(bounds, n), [n]))
+    bounds = np.maximum.accumulate(bounds)
+    return [(int(begin), int(end)) for begin, end in zip(bounds[:-1], bounds[1:])]
+
+
+def shard_key(mesh, quadrature, precision):
+    precision = get_policy(precision)
+    tag = "assembly" if precision.is_double else f"assembly/{precision}"
+    return hash_key(mesh.vertices, [quadrature], tag=tag)
+
+
+def compute_shard(mesh, quadrature, shard, n_shards, path, jobs=1, precision=None, progress=None,
+                  ram_budget=DEFAULT_RAM_BUDGET):
+    """
+    Computes the pairs of one shard and writes them to a partial.
+
+    Args:
+        mesh (TriangleMesh): The elements, identical for every shard.
+        quadrature (Quadrature): The fixed rule used for every pair.
+        shard (int): Index of this shard, 0 <= shard < n_shards.
+        n_shards (int): Number of shards.
+        path (str): The ``.npz`` partial to write.
+        jobs (int): Worker processes of this shard.
+        progress (callable): Called with (pairs done, pairs of the shard).
+
+    Returns:
+        (int, int): The row range of the shard.
+    """
+    if not 0 <= shard < n_shards:
+        raise ValueError(f"Shard {shard} is out of range for {n_shards} shards")
+    precision = get_policy(precision)
+    n = len(mesh)
+    begin, end = shard_bounds(row_costs(mesh, precision), n_shards)[shard]
+    total = pairs_in_rows(n, begin, end)
+
+    values = np.empty(total, dtype=precision.accumulate)
+    done = 0
+    compute = UpperBlockComputer(mesh, quadrature, jobs, precision)
+    try:
+        with instrumentation.stage("assembly_shard"):
+            for block_begin, block_end in fixed_row_blocks(end - begin, rows_per_block(n, ram_budget)):
+                _, _, block_values = compute(begin + block_begin, begin + block_end)
+                values[done:done + len(block_values)] = block_values
+                done += len(block_values)
+                if progress is not None:
+                    progress(done, total)
+    finally:
+        compute.close()
+
+    np.savez(path, format=SHARD_FORMAT, version=SHARD_VERSION, key=shard_key(mesh, quadrature, precision),
+             precision=str(precision), n=n, shard=shard, n_shards=n_shards, begin=begin, end=end,
+             areas=mesh.areas, values=values)
+    return begin, end
+
+
+def _stored_shape(partial, name):
+    """
+    Reads the shape of an array of an opened ``.npz`` from its header only.
+    """
+    with partial.zip.open(f"{name}.npy") as member:
+        major, _ = np.lib.format.read_magic(member)
+        read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+        shape, _, _ = read_header(member)
+    return shape
+
+
+def read_shard(path, values=True):
+    """
+    Args:
+        values (bool): Also load the values. Otherwise only their count,
+            n_values, is read.
+
+    Returns:
+        dict: The fields of a partial, after checking its format.
+    """
+    with np.load(path) as partial:
+        fields = {name : partial[name] for name in partial.files if values or name != "values"}
+        if not values and "values" in partial.files:
+            fields["n_values"] = _stored_shape(partial, "values")[0]
+    if fields.get("format", np.array("")).item() != SHARD_FORMAT:
+        raise ShardMismatchException(path, "not a view factor shard")
+    if int(fields["version"]) != SHARD_VERSION:
+        raise ShardMismatchException(path, f"version {int(fields['version'])}, expected {SHARD_VERSION}")
+    for name in ("n", "shard", "n_shards", "begin", "end", "version"):
+        fields[name] = int(fields[name])
+    for name in ("format", "key", "precision"):
+        fields[name] = fields[name].item()
+    return fields
+
+
+def merge_shards(paths, output=None):
+    """
+    Checks that the partials come from the same inputs, cover every shard
+    exactly once and are complete, then assembles the full matrix.
+
+    Args:
+        paths (list): The ``.npz`` partials, in any order.
+        output (str): If given, the matrix is written to this memory-mapped
+            ``.npy`` file instead of memory.
+
+    Returns:
+        array: (N, N) element view factor matrix.
+    """
+    if not paths:
+        raise ValueError("No shards to merge")
+    shards = {}
+    first = None
+    for path in paths:
+        fields = read_shard(path, values=False)
+        if first is None:
+            first = fields
+        for name in ("key", "n", "n_shards", "precision"):
+            if fields[name] != first[name]:
+                raise ShardMismatchException(path, f"{name} differs from the other shards")
+        if fields["shard"] in shards:
+            raise ShardMismatchException(path, f"shard {fields['shard']} given twice")
+        expected = pairs_in_rows(fields["n"], fields["begin"], fields["end"])
+        if fields.get("n_values") != expected:
+            raise ShardMismatchException(path, f"{fields.get('n_values')} pairs, expected {expected}")
+        shards[fields["shard"]] = (path, fields)
+
+    missing = sorted(set(range(first["n_shards"])) - set(shards))
+    if missing:
+        raise ValueError(f"Missing shard(s) {', '.join(map(str, missing))} of {first['n_shards']}")
+    row = 0
+    for shard in range(first["n_shards"]):
+        path, fields = shards[shard]
+        if fields["begin"] != row:
+            raise ShardMismatchException(path, f"starts at row {fields['begin']}, expected {row}")
+        row = fields["end"]
+    if row != first["n"]:
+        raise ShardMismatchException(path, f"ends at row {row}, expected {first['n']}")
+
+    n = first["n"]
+    areas = first["areas"]
+    view_factors = None
+    for shard in range(first["n_shards"]):
+        path, fields = shards.pop(shard)
+        with np.load(path) as partial: # one partial's values in memory at a time
+            values = partial["values"]
+        if view_factors is None:
+            if output is None:
+                view_factors = np.zeros((n, n), dtype=values.dtype)
+            else:
+                view_factors = np.lib.format.open_memmap(output, mode="w+", dtype=values.dtype, shape=(n, n))
+        rows, cols = upper_triangle_block(n, fields["begin"], fields["end"])
+        view_factors[rows, cols] = values
+        view_factors[cols, rows] = values * areas[rows] / areas[cols]
+    if output is not None:
+        view_factors.flush()
+    return view_factors
@@ -0,0 +1,53 @@
+"""
+Blackbody fractions for semi-grey (band wise grey) radiation.
+
+The fraction of blackbody emission at temperature T below wavelength lambda
+only depends on lambda T and is evaluated with the series
+
+    f(lambda T) = 15 / pi^4 sum_n exp(-n z) / n (z^3 + 3 z^2 / n + 6 z / n^2 + 6 / n^3)
+
+with z = C2 / (lambda T), which converges quickly for all lambda T.
+Wavelengths are in micrometres.
+"""
+import numpy as np
+
+C2 = 14387.768775 # second radiation constant, um K
+SERIES_TERMS = 64
+
+
+def blackbody_fraction(wavelength_temperature):
+    """
+    Args:
+        wavelength_temperature (array): lambda T in um K.
+
+    Returns:
+        array: Fraction of the blackbody emission below lambda.
+    """
+    lt = np.asarray(wavelength_temperature, dtype=np.float64)
+    fraction = np.zeros(lt.shape)
+    positive = lt > 0.0
+    finite = positive & np.isfinite(lt)
+    fraction[positive & ~finite] = 1.0
+
+    z = C2 / lt[finite]
+    n = np.arange(1, SERIES_TERMS + 1)[:, np.newaxis]
+    terms = np.exp(-n * z) / n * (z**3 + 3.0 * z**2 / n + 6.0 * z / n**2 + 6.0 / n**3)
+    fraction[finite] = 15.0 / np.pi**4 * terms.sum(axis=0)
+    return fraction
+
+
+def band_fractions(edges, temperatures):
+    """
+    Args:
+        edges (array): (B + 1,) increasing band edges in um, e.g.
+            [0, 4, inf] for a solar and an infrared band.
+        temperatures (float or array): Temperatures in K.
+
+    Returns:
+        array: (B,) or (..., B) fraction of the blackbody emission in every
+            band at every temperature.
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    below = blackbody_fraction(temperatures[..., np.newaxis] * edges)
+    return np.diff(below, axis=-1)
@@ -0,0 +1,141 @@
+"""
+Parallel, resumable parametric sweeps.
+
+A sweep evaluates a function at every point of a parameter grid (the cartesian
+product of the given axes) on a process pool. Completed points are appended to
+a JSON lines checkpoint as they finish so that an interrupted sweep resumes
+where it stopped. The result is a single columnar ``.npz`` with one column per
+parameter plus the values, the evaluation times and the sweep metadata.
+"""
+import os
+import json
+from itertools import product
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+class CheckpointMismatch(Exception):
+    def __init__(self, path, index):
+        Exception.__init__(self, f"Checkpoint \"{path}\" has different parameters for point {index}.")
+
+
+def parameter_grid(axes):
+    """
+    Args:
+        axes (dict): Parameter name -> values.
+
+    Returns:
+        list: A dict of parameters for every point, the last axis varying
+            fastest.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in product(*(axes[name] for name in names))]
+
+
+def evaluate_point(func, index, params):
+    begin = perf_counter()
+    value = func(**params)
+    return index, value, perf_counter() - begin
+
+
+def read_checkpoint(path, points):
+    completed = {} # index -> (value, time)
+    if path is None or not os.path.exists(path):
+        return completed
+
+    with open(path) as checkpoint:
+        for line in checkpoint:
+            try:
+                record = json.loads(line)
+            except ValueError: # a line cut short by an interruption
+                continue
+            index = record["index"]
+            if index >= len(points) or record["params"] != json_safe(points[index]):
+                raise CheckpointMismatch(path, index)
+            completed[index] = (record["value"], record["time"])
+    return completed
+
+
+def json_safe(params):
+    """
+    Converts numpy scalars (np.float64, np.int64, np.bool_, ...) and arrays
+    in the parameters to the Python values json writes and reads back equal.
+    """
+    def convert(value):
+        if isinstance(value, (np.generic, np.ndarray)):
+            return value.tolist() # .item() for scalars, nested lists for arrays
+        return value
+    return {name : convert(value) for name, value in params.items()}
+
+
+def write_columns(output, axes, points, values, times, metadata):
+    columns = {name : np.array([point[name] for point in points]) for name in axes}
+    columns["value"] = np.array(values, dtype=np.float64)
+    columns["time"] = np.array(times, dtype=np.float64)
+    columns["metadata"] = np.array(json.dumps(metadata or {}))
+
+    tmp_output = output + ".tmp.npz"
+    np.savez(tmp_output, **columns)
+    os.replace(tmp_output, output)
+
+
+def run_sweep(func, axes, output, jobs=1, checkpoint=None, metadata=None, progress=None):
+    """
+    Args:
+        func (callable): Called as func(**params), returns a float. Must be
+            picklable (a module level function) when jobs > 1.
+        axes (dict): Parameter name -> values.
+        output (str): Path of the columnar .npz result.
+        jobs (int): Number of worker processes.
+        checkpoint (str): Path of the JSON lines checkpoint. None disables
+            resuming.
+        metadata (dict): Stored with the result, e.g. the engine and
+            quadrature used.
+        progress (callable): Called with (points done, total points).
+
+    Returns:
+        dict: The columns written to output.
+    """
+    points = parameter_grid(axes)
+    completed = read_checkpoint(checkpoint, points)
+    pending = [index for index in range(len(points)) if index not in completed]
+
+    checkpoint_file = None
+    if checkpoint is not None:
+        checkpoint_file = open(checkpoint, "a+")
+        if checkpoint_file.tell() > 0: # don't continue a line cut short
+            checkpoint_file.seek(checkpoint_file.tell() - 1)
+            if checkpoint_file.read(1) != "\n":
+                checkpoint_file.write("\n")
+
+    def record(index, value, elapsed):
+        completed[index] = (value, elapsed)
+        if checkpoint_file is not None:
+            entry = {"index" : index, "params" : json_safe(points[index]), "value" : value, "time" : elapsed}
+            checkpoint_file.write(json.dumps(entry) + "\n")
+            checkpoint_file.flush()
+        if progress is not None:
+            progress(len(completed), len(points))
+
+    try:
+        if jobs <= 1:
+            for index in pending:
+                index, value, elapsed = evaluate_point(func, index, points[index])
+                record(index, float(value), elapsed)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(evaluate_point, func, index, points[index]) for index in pending]
+                for future in as_completed(futures):
+                    index, value, elapsed = future.result()
+                    record(index, float(value), elapsed)
+    finally:
+        if checkpoint_file is not None:
+            checkpoint_file.close()
+
+    values = [completed[index][0] for index in range(len(points))]
+    times = [completed[index][1] for index in range(len(points))]
+    write_columns(output, axes, points, values, times, metadata)
+
+    with np.load(output) as result:
+        return dict(result)
@@ -0,0 +1,255 @@
+"""
+Symmetry reduction of element pair computations.
+
+An isometry g which maps the mesh onto itself permutes its elements, and the
+view factor is invariant under it: F(g(i), g(j)) = F(i, j). The element pairs
+therefore split into orbits under the symmetry group and only one pair per
+orbit needs to be integrated.
+
+Symmetries are either declared (SymmetryPlane, SymmetryAxis) or detected by
+testing mirror planes and rotation axes through the area weighted centroid
+along the coordinate axes, their diagonals and the principal axes of the mesh.
+"""
+from itertools import combinations
+import numpy as np
+from scipy.spatial import cKDTree
+
+ROTATION_ORDERS = (2, 3, 4, 6)
+MAX_GROUP_ORDER = 384
+PAIR_CHUNK_ENTRIES = 2**22 # pairs x group order handled at once
+
+
+def reflection_matrix(normal):
+    normal = np.asarray(normal, dtype=np.float64)
+    normal = normal / np.sqrt(normal @ normal)
+    return np.eye(3) - 2.0 * np.outer(normal, normal)
+
+
+def rotation_matrix(direction, angle):
+    direction = np.asarray(direction, dtype=np.float64)
+    x, y, z = direction / np.sqrt(direction @ direction)
+    cross = np.array([[0.0, -z, y], [z, 0.0, -x], [-y, x, 0.0]])
+    return np.eye(3) + np.sin(angle) * cross + (1.0 - np.cos(angle)) * (cross @ cross)
+
+
+class SymmetryPlane:
+    def __init__(self, point, normal):
+        self.point = np.asarray(point, dtype=np.float64)
+        self.normal = np.asarray(normal, dtype=np.float64)
+
+    def transform(self):
+        """
+        Returns:
+            (array, array): R and t of the isometry x -> R x + t.
+        """
+        R = reflection_matrix(self.normal)
+        return R, self.point - R @ self.point
+
+
+class SymmetryAxis:
+    def __init__(self, point, direction, order):
+        """
+        Args:
+            point (vector): A point on the axis.
+            direction (vector): The direction of the axis.
+            order (int): The geometry is invariant under rotations by
+                2 pi / order about the axis.
+        """
+        self.point = np.asarray(point, dtype=np.float64)
+        self.direction = np.asarray(direction, dtype=np.float64)
+        self.order = order
+
+    def transform(self):
+        R = rotation_matrix(self.direction, 2.0 * np.pi / self.order)
+        return R, self.point - R @ self.point
+
+
+class NotASymmetryException(Exception):
+    def __init__(self, operation):
+        Exception.__init__(self, f"{type(operation).__name__} does not map the mesh onto itself.")
+
+
+def element_permutation(mesh, R, t, tol, tree=None):
+    """
+    Args:
+        mesh (TriangleMesh): The elements.
+        R, t: The isometry x -> R x + t.
+        tol (float): Absolute tolerance on vertex positions.
+
+    Returns:
+        array: perm with element i mapped onto element perm[i], or None if the
+            isometry does not map the mesh onto itself.
+    """
+    tree = cKDTree(mesh.centroids) if tree is None else tree
+    mapped_centroids = mesh.centroids @ R.T + t
+    distances, perm = tree.query(mapped_centroids, distance_upper_bound=tol)
+    if np.any(~np.isfinite(distances)):
+        return None
+    if len(np.unique(perm)) != len(perm):
+        return None
+
+    mapped_vertices = mesh.vertices @ R.T + t
+    target_vertices = mesh.vertices[perm]
+    mismatch = np.full(len(perm), np.inf)
+    for order in ((0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (2, 1, 0), (1, 0, 2)):
+        difference = np.abs(mapped_vertices[:, order] - target_vertices).max(axis=(1, 2))
+        mismatch = np.minimum(mismatch, difference)
+    if np.any(mismatch > tol):
+        return None
+
+    mapped_normals = mesh.normals @ R.T
+    alignment = np.einsum("ij,ij->i", mapped_normals, mesh.normals[perm])
+    if np.any(alignment < 1.0 - 1.0E-6):
+        return None
+    return perm
+
+
+def close_group(generators, n):
+    """
+    Returns:
+        array: (G, N) every permutation generated by the generators, the
+            identity first.
+    """
+    identity = np.arange(n)
+    elements = [identity]
+    seen = {identity.tobytes()}
+    frontier = [identity]
+    while frontier:
+        new_frontier = []
+        for element in frontier:
+            for generator in generators:
+                product = generator[element]
+                key = product.tobytes()
+                if key not in seen:
+                    seen.add(key)
+                    elements.append(product)
+                    new_frontier.append(product)
+                    if len(elements) > MAX_GROUP_ORDER:
+                        raise ValueError("Symmetry group is larger than expected; check the tolerance.")
+        frontier = new_frontier
+    return np.array(elements)
+
+
+def mesh_tolerance(mesh, tol):
+    extent = np.ptp(mesh.vertices.reshape(-1, 3), axis=0)
+    return tol * max(np.sqrt(extent @ extent), 1.0E-300)
+
+
+def candidate_directions(mesh, center):
+    frames = [np.eye(3)]
+    offsets = mesh.centroids - center
+    second_moment = np.einsum("i,ij,ik->jk", mesh.areas, offsets, offsets)
+    frames.append(np.linalg.eigh(second_moment)[1].T)
+
+    directions = []
+    for x, y, z in frames:
+        directions += [x, y, z]
+        directions += [u + s * v for u, v in combinations((x, y, z), 2) for s in (1.0, -1.0)]
+        directions += [x + s1 * y + s2 * z for s1 in (1.0, -1.0) for s2 in (1.0, -1.0)]
+
+    unique = []
+    for direction in directions:
+        direction = direction / np.sqrt(direction @ direction)
+        if all(abs(direction @ other) < 1.0 - 1.0E-9 for other in unique):
+            unique.append(direction)
+    return unique
+
+
+class SymmetryGroup:
+    def __init__(self, permutations):
+        """
+        Args:
+            permutations (array): (G, N) element permutations, identity first.
+        """
+        self.permutations = np.asarray(permutations)
+
+    @property
+    def order(self):
+        return len(self.permutations)
+
+    @classmethod
+    def trivial(cls, n):
+        return cls(np.arange(n)[np.newaxis, :])
+
+    @classmethod
+    def from_operations(cls, mesh, operations, tol=1.0E-8):
+        """
+        Args:
+            operations (list): Declared SymmetryPlanes and SymmetryAxes.
+
+        Raises:
+            NotASymmetryException
+        """
+        abs_tol = mesh_tolerance(mesh, tol)
+        tree = cKDTree(mesh.centroids)
+        generators = []
+        for operation in operations:
+            perm = element_permutation(mesh, *operation.transform(), abs_tol, tree)
+            if perm is None:
+                raise NotASymmetryException(operation)
+            generators.append(perm)
+        return cls(close_group(generators, len(mesh)))
+
+    @classmethod
+    def detect(cls, mesh, tol=1.0E-8):
+        abs_tol = mesh_tolerance(mesh, tol)
+        tree = cKDTree(mesh.centroids)
+        center = np.einsum("i,ij->j", mesh.areas, mesh.centroids) / mesh.areas.sum()
+
+        generators = []
+        for direction in candidate_directions(mesh, center):
+            transforms = [reflection_matrix(direction)]
+            transforms += [rotation_matrix(direction, 2.0 * np.pi / k) for k in ROTATION_ORDERS]
+            for R in transforms:
+                perm = element_permutation(mesh, R, center - R @ center, abs_tol, tree)
+                if perm is not None:
+                    generators.append(perm)
+        return cls(close_group(generators, len(mesh)))
+
+    def pair_orbits(self, n=None):
+        """
+        Classifies the pairs i < j of the upper triangle, in row major order,
+        into orbits.
+
+        Returns:
+            (array, array, array, array): rep_rows, rep_cols of one
+                representative pair (a < b) per orbit, the orbit index of every
+                pair and whether the group element mapping the pair onto its
+                representative reverses it, i.e. maps (i, j) to (b, a).
+        """
+        n = self.permutations.shape[1] if n is None else n
+        rows, cols = np.triu_indices(n, 1)
+        best_codes = np.empty(len(rows), dtype=np.int64)
+        swapped = np.empty(len(rows), dtype=bool)
+        chunk = max(1, PAIR_CHUNK_ENTRIES // self.order)
+
+        for begin in range(0, len(rows), chunk):
+            i = rows[begin:begin + chunk]
+            j = cols[begin:begin + chunk]
+            images_i = self.permutations[:, i].astype(np.int64)
+            images_j = self.permutations[:, j].astype(np.int64)
+            reverse = images_i > images_j
+            codes = np.where(reverse, images_j * n + images_i, images_i * n + images_j)
+            best = np.argmin(codes, axis=0)
+            columns = np.arange(len(i))
+            best_codes[begin:begin + chunk] = codes[best, columns]
+            swapped[begin:begin + chunk] = reverse[best, columns]
+
+        unique_codes, orbit = np.unique(best_codes, return_inverse=True)
+        rep_rows, rep_cols = np.divmod(unique_codes, n)
+        return rep_rows, rep_cols, orbit.reshape(-1), swapped
+
+
+def expand_orbits(rep_view_factors, orbit, swapped, areas):
+    """
+    Returns:
+        (array, array, array): rows, cols and view factors F[i, j] of every
+            pair i < j of the upper triangle, in row major order.
+    """
+    n = len(areas)
+    rows, cols = np.triu_indices(n, 1)
+    values = rep_view_factors[orbit]
+    # the element mapping (i, j) onto (b, a) preserves areas, A_a = A_j and
+    # A_b = A_i, so F_ij = F_ba = F_ab A_a / A_b = F_ab A_j / A_i
+    values = np.where(swapped, values * areas[cols] / areas[rows], values)
+    return rows, cols, values
@@ -0,0 +1,266 @@
+"""
+Steady state and transient surface temperatures from radks.
+
+The net heat leaving node i by radiation is
+
+    Q_i = sigma sum_j radk_ij (T_i^4 - T_j^4) = sigma (L T^4)_i
+
+with the radk Laplacian L = diag(radk 1) - radk. Optional linear conductors G
+(W/K) add K T with K = diag(G 1) - G. Nodes either have a fixed temperature or
+a fixed heat load (W, zero for an adiabatic node). The free temperatures are
+found with Newton's method on the heat balance, whose Jacobian
+
+    J = 4 sigma L diag(T^3) + K (+ C / dt for an implicit Euler step)
+
+is sparse and analytic. Factorizations of J are kept while Newton keeps
+converging fast with them, across iterations and time steps. Without
+conductors the steady Jacobian is L diag(4 sigma T^3), so one factorization of
+L solves every Newton step exactly.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from . import instrumentation
+
+STEFAN_BOLTZMANN = 5.670374419E-8 # W / (m^2 K^4)
+
+
+class NoConvergenceException(Exception):
+    def __init__(self, iterations, change):
+        Exception.__init__(self, f"Newton's method did not converge in {iterations} iterations, "
+                                 f"the last temperature change was {change:g} K.")
+
+
+class SingularNetworkException(Exception):
+    def __init__(self):
+        Exception.__init__(self, "The heat balance is singular; every group of connected nodes "
+                                 "needs a fixed temperature (or a heat capacity for a time step).")
+
+
+def laplacian(links):
+    """
+    Returns:
+        csr_matrix: diag(links 1) - links for a symmetric link matrix.
+    """
+    links = sparse.csr_matrix(links, dtype=np.float64)
+    row_sums = np.asarray(links.sum(axis=1)).ravel()
+    return (sparse.diags(row_sums) - links).tocsr()
+
+
+class TemperatureSolver:
+    def __init__(self, radks, names=None, conductances=None, capacities=None,
+                 sigma=STEFAN_BOLTZMANN, refactor_ratio=0.25):
+        """
+        Args:
+            radks (array or sparse matrix): (N, N) radiative exchange
+                coefficients, e.g. from ThermalNetwork.get_radk_matrix.
+            names (list): Node names, defaults to the indices.
+            conductances (array or sparse matrix): (N, N) symmetric linear
+                conductors between the nodes in W/K.
+            capacities (array): (N,) lumped heat capacities in J/K, needed
+                for time steps.
+            sigma (float): The Stefan-Boltzmann constant in the units used.
+            refactor_ratio (float): The Jacobian is refactorized when a Newton
+                iteration reduces the heat balance residual by less than this
+                factor.
+        """
+        self.radiation = laplacian(radks)
+        n = self.radiation.shape[0]
+        self.names = list(range(n)) if names is None else list(names)
+        self.index = {name : i for i, name in enumerate(self.names)}
+        self.conduction = None if conductances is None else laplacian(conductances)
+        self.capacities = None if capacities is None else np.asarray(capacities, dtype=np.float64)
+        self.sigma = sigma
+        self.refactor_ratio = refactor_ratio
+
+        self.fixed = np.zeros(n, dtype=bool)
+        self.fixed_temperatures = np.zeros(n)
+        self.heat_loads = np.zeros(n)
+        self._reset_factorizations()
+
+    @classmethod
+    def from_network(cls, tn, conductances=None, capacities=None, **kwargs):
+        """
+        Args:
+            tn (ThermalNetwork): Provides the radks and the node names.
+            capacities (dict or array): Surface name -> heat capacity, or an
+                array in the order of the surfaces.
+        """
+        names = list(tn.surfaces)
+        if isinstance(capacities, dict):
+            capacities = [capacities.get(name, 0.0) for name in names]
+        return cls(tn.get_radk_matrix(), names=names, conductances=conductances,
+                   capacities=capacities, **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _reset_factorizations(self):
+        self._free = np.flatnonzero(~self.fixed)
+        self._radiation_lu = None
+        self._step_lu = None
+        self._step_dt = None
+
+    def set_temperature(self, name, temperature):
+        i = self.index[name]
+        self.fixed[i] = True
+        self.fixed_temperatures[i] = temperature
+        self._reset_factorizations()
+
+    def set_heat_load(self, name, heat_load):
+        """
+        Sets the heat (W) put into a node which does not have a fixed
+        temperature.
+        """
+        i = self.index[name]
+        if self.fixed[i]:
+            self.fixed[i] = False
+            self._reset_factorizations()
+        self.heat_loads[i] = heat_load
+
+    def heat_flows(self, temperatures):
+        """
+        Returns:
+            array: (N,) net heat leaving every node by radiation and
+                conduction, in W.
+        """
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        flows = self.sigma * (self.radiation @ temperatures**4)
+        if self.conduction is not None:
+            flows += self.conduction @ temperatures
+        return flows
+
+    def _full(self, free_temperatures):
+        temperatures = self.fixed_temperatures.copy()
+        temperatures[self._free] = free_temperatures
+        return temperatures
+
+    def _jacobian(self, free_temperatures, dt=None):
+        free = self._free
+        radiation = self.radiation[free][:, free]
+        jacobian = radiation @ sparse.diags(4.0 * self.sigma * free_temperatures**3)
+        if self.conduction is not None:
+            jacobian = jacobian + self.conduction[free][:, free]
+        if dt is not None:
+            jacobian = jacobian + sparse.diags(self.capacities[free] / dt)
+        return jacobian.tocsc()
+
+    def _factorize(self, matrix):
+        instrumentation.count("temperature/factorizations")
+        try:
+            return splu(sparse.csc_matrix(matrix))
+        except RuntimeError:
+            raise SingularNetworkException()
+
+    def _newton(self, residual, initial, solve_step, tol, max_iter):
+        """
+        Args:
+            residual (callable): Heat balance of the free nodes.
+            solve_step (callable): Called with (temperatures, residual,
+                residual reduction), returns the Newton update.
+        """
+        temperatures = initial.copy()
+        previous_norm = None
+        change = np.inf
+        for iteration in range(max_iter):
+            r = residual(temperatures)
+            norm = np.abs(r).max() if len(r) else 0.0
+            reduction = None if previous_norm in (None, 0.0) else norm / previous_norm
+            previous_norm = norm
+
+            delta = solve_step(temperatures, r, reduction)
+            if not np.all(np.isfinite(delta)):
+                raise SingularNetworkException()
+            # don't step through zero, T^4 has a second root there
+            updated = np.maximum(temperatures - delta, 0.5 * temperatures)
+            change = np.abs(updated - temperatures).max() if len(r) else 0.0
+            temperatures = updated
+            instrumentation.count("temperature/newton_iterations")
+            if change <= tol * max(1.0, np.abs(temperatures).max() if len(r) else 0.0):
+                return temperatures
+        raise NoConvergenceException(max_iter, change)
+
+    def _initial_guess(self, initial):
+        if initial is not None:
+            initial = np.asarray(initial, dtype=np.float64)
+            return (initial if len(initial) == len(self._free) else initial[self._free]).copy()
+        guess = self.fixed_temperatures[self.fixed].mean() if self.fixed.any() else 300.0
+        return np.full(len(self._free), guess)
+
+    def solve_steady(self, initial=None, tol=1.0E-10, max_iter=100):
+        """
+        Args:
+            initial (array): Starting temperatures of all (or only the free)
+                nodes. Defaults to the mean fixed temperature.
+            tol (float): Relative temperature change at convergence.
+
+        Returns:
+            array: (N,) temperatures of all nodes.
+        """
+        free = self._free
+
+        def residual(free_temperatures):
+            temperatures = self._full(free_temperatures)
+            return self.heat_flows(temperatures)[free] - self.heat_loads[free]
+
+        if self.conduction is None:
+            def solve_step(free_temperatures, r, reduction):
+                # J = L_ff diag(4 sigma T^3), so J^-1 r = (L_ff^-1 r) / (4 sigma T^3)
+                if self._radiation_lu is None:
+                    self._radiation_lu = self._factorize(self.radiation[free][:, free])
+                return self._radiation_lu.solve(r) / (4.0 * self.sigma * free_temperatures**3)
+        else:
+            lu = [None]
+            def solve_step(free_temperatures, r, reduction):
+                if lu[0] is None or (reduction is not None and reduction > self.refactor_ratio):
+                    lu[0] = self._factorize(self._jacobian(free_temperatures))
+                return lu[0].solve(r)
+
+        with instrumentation.stage("temperature_steady"):
+            return self._full(self._newton(residual, self._initial_guess(initial), solve_step,
+                                           tol, max_iter))
+
+    def step(self, temperatures, dt, tol=1.0E-10, max_iter=100):
+        """
+        One implicit Euler step of C dT/dt = heat loads - heat flows.
+
+        Args:
+            temperatures (array): (N,) temperatures at the start of the step.
+            dt (float): Time step in s.
+
+        Returns:
+            array: (N,) temperatures at the end of the step.
+        """
+        if self.capacities is None:
+            raise ValueError("Heat capacities are needed for time steps.")
+        free = self._free
+        start = np.asarray(temperatures, dtype=np.float64)[free]
+        capacities = self.capacities[free]
+
+        def residual(free_temperatures):
+            temperatures = self._full(free_temperatures)
+            return (capacities * (free_temperatures - start) / dt
+                    + self.heat_flows(temperatures)[free] - self.heat_loads[free])
+
+        def solve_step(free_temperatures, r, reduction):
+            stale = reduction is not None and reduction > self.refactor_ratio
+            if self._step_lu is None or self._step_dt != dt or stale:
+                self._step_lu = self._factorize(self._jacobian(free_temperatures, dt))
+                self._step_dt = dt
+            return self._step_lu.solve(r)
+
+        with instrumentation.stage("temperature_step"):
+            return self._full(self._newton(residual, start, solve_step, tol, max_iter))
+
+    def run_transient(self, initial, dt, n_steps, tol=1.0E-10):
+        """
+        Returns:
+            (array, array): (n_steps + 1,) times and (n_steps + 1, N)
+                temperatures, the initial state first.
+        """
+        temperatures = np.empty((n_steps + 1, len(self)))
+        temperatures[0] = initial
+        temperatures[0][self.fixed] = self.fixed_temperatures[self.fixed]
+        for k in range(n_steps):
+            temperatures[k + 1] = self.step(temperatures[k], dt, tol=tol)
+        return dt * np.arange(n_steps + 1), temperatures